@@ -1,8 +1,14 @@
 """API Server for receiving and forwarding system metrics to InfluxDB."""
 
 import os
+import hmac
 import json
+import argparse
+import queue
+import math
 import logging
+import threading
+import time
 from datetime import datetime, timezone
 from collections import deque
 from logging.handlers import RotatingFileHandler
@@ -10,8 +16,19 @@ from logging.handlers import RotatingFileHandler
 import yaml
 import requests
 from flask import Flask, request, jsonify
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+
+import payload_codec
+from payload_codec import NDJSON_TYPES, MSGPACK_TYPES, PayloadTooLarge, UnsupportedPayload
+from admission import AdmissionController
+from asgi_app import AsgiApp
+from influx_client import InfluxClient
+from line_protocol import PRECISION, LineProtocolEncoder, escape_tag, parse_time
+from spool import DiskSpool, SpoolDrainer
+from device_index import DeviceIndex
+from instrumentation import CONTENT_TYPE, IngestMetrics
+from structured_log import EventSampler, JsonMessage, queued
+from sessions import PREFIX_FIELDS, STATIC_FIELDS, SessionStore
+from timeseries_store import TimeSeriesStore
 
 
 class ConfigLoader:
@@ -26,12 +43,149 @@ class ConfigLoader:
             return yaml.safe_load(f)
 
 
+class InfluxBatchWriter:
+    """Background writer that groups line-protocol lines into multi-line InfluxDB writes.
+
+    Lines are placed on a bounded queue by the request handlers and flushed by a
+    single worker thread once ``batch_size`` lines are pending or ``flush_interval``
+    seconds have passed since the first line of the batch was queued. Each line
+    carries its sample's timestamp, so samples from one device in the same
+    flush stay separate points.
+
+    ``write_func(lines)`` returns "failed" when the write may succeed later
+    (InfluxDB unreachable or 5xx), "rejected" when InfluxDB refused the batch
+    for good (4xx), or anything else once the lines are stored or spooled. A
+    failed batch is retried up to ``max_retries`` times with exponential
+    backoff from ``retry_delay`` seconds; after that it is counted as failed
+    and lost, as is a rejected one.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, write_func, queue_size=10000, batch_size=500, flush_interval=1.0,
+                 max_retries=3, retry_delay=1.0):
+        self.write_func = write_func
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.stats = {"enqueued": 0, "rejected": 0, "written": 0, "failed": 0, "batches": 0,
+                      "retries": 0, "refused": 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="influx-writer", daemon=True)
+
+    def start(self):
+        """Start the background flush thread."""
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the flush thread once it has written out anything still queued.
+
+        Returns False if the thread is still writing after ``timeout`` seconds;
+        it then finishes the queue on its own and nothing else drains it.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        if self._thread.ident is None:
+            # Never started: nothing else will drain the queue.
+            self._flush_remaining()
+        return True
+
+    def submit(self, line):
+        """Queue a line for writing. Returns False when the queue is full."""
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("enqueued")
+        return True
+
+    def _count(self, key, amount=1):
+        """Add to a counter shared by the request threads and the flush thread."""
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def depth(self):
+        """Return the number of lines waiting to be written."""
+        return self.queue.qsize()
+
+    def _drain(self, limit):
+        """Pull up to ``limit`` lines off the queue without blocking."""
+        lines = []
+        while len(lines) < limit:
+            try:
+                lines.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return lines
+
+    def _run(self):
+        """Collect lines into batches and flush on size or time threshold."""
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            self._flush(batch)
+        self._flush_remaining()
+
+    def _flush_remaining(self):
+        """Write out everything still queued."""
+        while not self.queue.empty():
+            self._flush(self._drain(self.batch_size))
+
+    def _flush(self, batch):
+        """Write one batch, retrying failed writes with backoff, and update counters."""
+        if not batch:
+            return
+        self._count("batches")
+        outcome = self.write_func(batch)
+        delay = self.retry_delay
+        for _ in range(self.max_retries):
+            if outcome != "failed":
+                break
+            self._count("retries")
+            # Returns at once on shutdown, so stop() is not held up by the backoff.
+            self._stop.wait(delay)
+            delay *= 2
+            outcome = self.write_func(batch)
+        if outcome == "failed":
+            self._count("failed", len(batch))
+        elif outcome == "rejected":
+            self._count("refused", len(batch))
+        else:
+            self._count("written", len(batch))
+
+
 class ApiServer:
     """Flask-based API server that receives metrics and pushes them to InfluxDB."""
 
     CONFIG_PATH = "config.yaml"
     LOG_PATH = "logs/api.log"
     MAX_HISTORY = 10
+    REQUIRED_FIELDS = ["device_id", "hostname", "cpu_total", "memory_percent", "disk_percent"]
+    DELIVERY_ERRORS = {
+        "queue_full": "Ingest queue full",
+        "spool_full": "Spool full",
+        "write_failed": "Failed to write to InfluxDB",
+        "unreachable": "Failed to reach InfluxDB",
+    }
 
     def __init__(self):
         self.config_loader = ConfigLoader(self.CONFIG_PATH)
@@ -39,103 +193,576 @@ class ApiServer:
         influx = self.config.get("influxdb", {})
         influx_url = os.getenv("INFLUX_URL") or influx.get("url", "http://localhost:8086")
         influx_db = os.getenv("INFLUX_DB") or influx.get("database", "metrics")
-        self.influx_url = f"{influx_url}/write?db={influx_db}"
+        pool = influx.get("pool", {})
+        self.influx = InfluxClient(
+            influx_url,
+            influx_db,
+            pool_size=pool.get("size", 10),
+            pool_block=pool.get("block", False),
+            connect_timeout=pool.get("connect_timeout", 2.0),
+            read_timeout=pool.get("read_timeout", 5.0),
+            health_check_interval=pool.get("health_check_interval", 30.0),
+            precision=PRECISION,
+        )
+        self.influx_url = self.influx.write_url
+
+        line_protocol = self.config.get("line_protocol", {})
+        self.encoder = LineProtocolEncoder(max_cached=line_protocol.get("tag_cache_size", 10000))
+
+        batch_ingest = self.config.get("batch_ingest", {})
+        self.batch_max_items = batch_ingest.get("max_items", 1000)
+        admission = self.config.get("admission", {})
+        self.admission = AdmissionController(
+            rate=admission.get("rate", 0.5),
+            burst=admission.get("burst", 10),
+            max_devices=admission.get("max_devices", 100000),
+            shed_queue_ratio=admission.get("shed_queue_ratio", 0.9),
+            shed_latency_ms=admission.get("shed_latency_ms", 2000),
+        )
+        payloads = self.config.get("payloads", {})
+        self.max_decoded_bytes = payloads.get(
+            "max_decoded_bytes", payload_codec.DEFAULT_MAX_DECODED_BYTES
+        )
 
         self.app = Flask(__name__)
-        self.limiter = Limiter(key_func=get_remote_address)
-        self.limiter.init_app(self.app)
 
         self.metrics_buffer = deque(maxlen=self.MAX_HISTORY)
         self.latest_metrics = {}
+        device_index = self.config.get("device_index", {})
+        self.devices = DeviceIndex(
+            max_devices=device_index.get("max_devices", 10000),
+            stale_after=device_index.get("stale_after", 86400),
+        )
+        sessions = self.config.get("sessions", {})
+        self.sessions = SessionStore(
+            max_sessions=sessions.get("max_sessions", 100000),
+            ttl=sessions.get("ttl", 86400),
+        )
+        history = self.config.get("history", {})
+        self.history = TimeSeriesStore(
+            capacity=history.get("capacity", 1440),
+            max_devices=history.get("max_devices", 1000),
+            max_cores=history.get("max_cores", 64),
+        )
 
+        self.full_detail = False
+        self.setup_instrumentation()
         self.setup_logging()
+        self.setup_spool(self.config.get("spool", {}))
+        self.setup_writer(influx.get("batch", {}))
         self.setup_routes()
 
     def setup_logging(self):
-        """Configure structured logging."""
+        """Configure structured logging.
+
+        Successful events listed under logging.sample are kept one in N, and
+        with logging.queue.enabled records are written (and serialized) by a
+        listener thread instead of the request handler.
+        """
         os.makedirs(os.path.dirname(self.LOG_PATH), exist_ok=True)
+        log_config = self.config.get("logging", {})
         self.logger = logging.getLogger("ApiServer")
         log_level = os.getenv("LOG_LEVEL", "INFO").upper()
-        self.logger.setLevel(getattr(logging, log_level, logging.INFO))
+        self.log_level = getattr(logging, log_level, logging.INFO)
+        self.logger.setLevel(self.log_level)
+        self.sampler = EventSampler(log_config.get("sample", {}))
+        self.admin_token = os.getenv("ADMIN_TOKEN") or log_config.get("admin_token")
+        self.log_listener = None
         handler = RotatingFileHandler(self.LOG_PATH, maxBytes=5 * 1024 * 1024, backupCount=3)
+        queue_config = log_config.get("queue", {})
+        if queue_config.get("enabled", False):
+            handler, self.log_listener = queued(handler, queue_config.get("size", 10000))
         self.logger.addHandler(handler)
 
-    def log_action(self, action, data=None, status="OK"):
-        """Log a structured JSON message."""
+    def set_full_detail(self, enabled):
+        """Switch full-detail logging on (DEBUG level, no sampling) or back to the defaults."""
+        self.full_detail = bool(enabled)
+        self.logger.setLevel(logging.DEBUG if self.full_detail else self.log_level)
+        return {
+            "full_detail": self.full_detail,
+            "level": logging.getLevelName(self.logger.level)
+        }, 200
+
+    def admin_allowed(self, remote_addr, token=None):
+        """Return True if a caller may change server settings at runtime.
+
+        With an admin token (ADMIN_TOKEN or logging.admin_token) the request's
+        X-Admin-Token header must match it; without one only loopback clients
+        are allowed.
+        """
+        if self.admin_token:
+            return token is not None and hmac.compare_digest(token, self.admin_token)
+        return remote_addr in ("127.0.0.1", "::1")
+
+    def logging_settings(self):
+        """Answer GET /internal/logging with the current logging settings."""
+        return {
+            "full_detail": self.full_detail,
+            "level": logging.getLevelName(self.logger.level),
+            "sample": self.sampler.rates,
+            "dropped": sum(getattr(h, "dropped", 0) for h in self.logger.handlers)
+        }, 200
+
+    def update_logging(self, body, remote_addr, token=None):
+        """Answer POST /internal/logging for an admin caller; 403 for anyone else."""
+        if not self.admin_allowed(remote_addr, token):
+            self.log_action("POST /internal/logging", {"remote_addr": remote_addr},
+                            status="FORBIDDEN")
+            return {"error": "Forbidden"}, 403
+        if not isinstance(body, dict):
+            body = {}
+        return self.set_full_detail(body.get("full_detail", False))
+
+    def setup_instrumentation(self):
+        """Create the ingest-path counters and histograms behind GET /internal/metrics."""
+        self.instruments = IngestMetrics()
+        registry = self.instruments.registry
+        registry.gauge("api_writer_queue_depth", "Lines waiting in the batch writer queue.",
+                       lambda: self.writer.depth() if self.writer else 0)
+        registry.gauge("api_spool_pending_bytes", "Bytes waiting in the InfluxDB spool.",
+                       lambda: self.spool.pending_bytes() if self.spool else 0)
+        registry.gauge("api_sessions", "Live agent sessions.", lambda: len(self.sessions))
+        registry.gauge("api_devices", "Devices in the latest-sample index.",
+                       lambda: len(self.devices))
+
+    def setup_writer(self, batch_config):
+        """Start the batched background writer when enabled in config."""
+        self.writer = None
+        if not batch_config.get("enabled", False):
+            return
+        self.writer = InfluxBatchWriter(
+            self.write_batch,
+            queue_size=batch_config.get("queue_size", 10000),
+            batch_size=batch_config.get("batch_size", 500),
+            flush_interval=batch_config.get("flush_interval", 1.0),
+            max_retries=batch_config.get("max_retries", 3),
+            retry_delay=batch_config.get("retry_delay", 1.0),
+        )
+        self.writer.start()
+
+    def setup_spool(self, spool_config):
+        """Open the on-disk spool and start its drainer when enabled in config."""
+        self.spool = None
+        self.drainer = None
+        if not spool_config.get("enabled", False):
+            return
+        self.spool = DiskSpool(
+            spool_config.get("directory", "spool"),
+            segment_bytes=spool_config.get("segment_bytes", 16 * 1024 * 1024),
+            max_bytes=spool_config.get("max_bytes", 1024 * 1024 * 1024),
+            fsync=spool_config.get("fsync", False),
+        )
+        self.drainer = SpoolDrainer(
+            self.spool,
+            self.write_spooled,
+            batch_size=spool_config.get("drain_batch_size", 5000),
+            rate=spool_config.get("drain_rate", 20000),
+            retry_interval=spool_config.get("retry_interval", 5.0),
+        )
+        self.drainer.start()
+
+    def shutdown(self):
+        """Flush pending writes before the process exits."""
+        if self.writer:
+            self.writer.stop()
+        if self.drainer:
+            self.drainer.stop()
+            self.spool.close()
+        self.influx.close()
+        if self.log_listener:
+            self.log_listener.stop()
+
+    def log_action(self, action, data=None, status="OK", level=logging.INFO):
+        """Log a structured JSON message.
+
+        Nothing is built when ``level`` is disabled or the event is sampled
+        out; only "OK" events are sampled, and kept entries record the factor
+        as ``sampled``. ``data`` may be a callable evaluated only when the entry
+        is kept, and the JSON is produced when the handler formats the record.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        sampled = 1 if status != "OK" or self.full_detail else self.sampler.keep(action)
+        if not sampled:
+            return
         log_entry = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "event": action,
             "status": status,
-            "data": data
+            "data": data() if callable(data) else data
         }
-        self.logger.info(json.dumps(log_entry))
+        if sampled > 1:
+            log_entry["sampled"] = sampled
+        self.logger.log(level, JsonMessage(log_entry))
 
     def escape_influx_tag(self, val):
         """Escape special characters in InfluxDB tags."""
-        return str(val).replace(" ", "\\ ").replace(",", "\\,").replace("=", "\\=")
+        return escape_tag(val)
 
-    def receive_metrics(self):
-        """Process incoming metrics POST request."""
+    def build_line(self, metrics, prefix=None):
+        """Convert a metrics payload into a single InfluxDB line-protocol line."""
+        start = time.perf_counter()
+        line = self.encoder.encode(metrics, prefix)
+        self.instruments.encode_seconds.observe(time.perf_counter() - start)
+        return line
+
+    def write_to_influx(self, data):
+        """POST line-protocol data to InfluxDB over the pooled client and return the response."""
+        start = time.perf_counter()
         try:
-            if not request.is_json:
-                return jsonify({"error": "Invalid JSON format"}), 400
+            res = self.influx.write(data)
+        except requests.RequestException:
+            self.instruments.influx_failures.labels("unreachable").inc()
+            raise
+        finally:
+            self.instruments.influx_write_seconds.observe(time.perf_counter() - start)
+        if res.status_code != 204:
+            self.instruments.influx_failures.labels("http_status").inc()
+        return res
 
-            metrics = request.get_json()
-            required_fields = ["device_id", "hostname", "cpu_total", "memory_percent", "disk_percent"]
-            if not all(k in metrics for k in required_fields):
-                self.log_action("POST /metrics", metrics, status="INVALID")
-                return jsonify({"error": "Missing fields"}), 400
-
-            tags = metrics.get("tags", {})
-            if not isinstance(tags, dict):
-                tags = {}
-            tags["device_id"] = metrics["device_id"]
-            tags["host"] = metrics["hostname"]
-            tags["device_type"] = metrics.get("device_type", "unknown")
-
-            tag_str = ",".join(
-                f"{self.escape_influx_tag(k)}={self.escape_influx_tag(v)}"
-                for k, v in tags.items()
-            )
+    def write_batch(self, lines):
+        """Write a batch of lines from the background writer.
 
-            field_parts = [
-                f"cpu={metrics['cpu_total']}",
-                f"memory={metrics['memory_percent']}",
-                f"disk={metrics['disk_percent']}",
-                f"memory_total={metrics.get('memory_total', 0)}",
-                f"memory_used={metrics.get('memory_used', 0)}",
-                f"disk_total={metrics.get('disk_total', 0)}",
-                f"disk_used={metrics.get('disk_used', 0)}",
-                f"heartbeat={metrics.get('heartbeat', 1)}"
-            ]
-
-            cpu_per_core = metrics.get("cpu_per_core")
-            if isinstance(cpu_per_core, list):
-                field_parts.extend(
-                    f"cpu_core_{i}={core}" for i, core in enumerate(cpu_per_core)
-                )
+        Returns "stored", "spooled" (InfluxDB unreachable or 5xx with the
+        spool enabled), "rejected" for a 4xx, or "failed" so the writer
+        retries the batch.
+        """
+        try:
+            res = self.write_to_influx("\n".join(lines))
+        except requests.RequestException as e:
+            self.log_action("INFLUX BATCH", {"lines": len(lines), "error": str(e)}, status="FAIL")
+            return self.spool_batch(lines)
+        if res.status_code != 204:
+            self.log_action("INFLUX BATCH", {
+                "lines": len(lines),
+                "status_code": res.status_code,
+                "text": res.text
+            }, status="FAIL")
+            if res.status_code < 500:
+                return "rejected"
+            return self.spool_batch(lines)
+        self.log_action("INFLUX BATCH", {"lines": len(lines), "status_code": res.status_code})
+        return "stored"
 
-            field_str = ",".join(field_parts)
-            line = f"system_metrics,{tag_str} {field_str}"
+    def spool_batch(self, lines):
+        """Spool a batch the writer could not write; "failed" (retry) if that is impossible."""
+        if self.spool and self.spool_lines(lines) == "spooled":
+            return "spooled"
+        return "failed"
 
-            self.log_action("INFLUX LINE", {"line": line})
+    def write_spooled(self, lines):
+        """Replay a batch of spooled lines to InfluxDB.
 
-            try:
-                res = requests.post(self.influx_url, data=line, timeout=5)
-                self.log_action("INFLUX RESPONSE", {
-                    "status_code": res.status_code,
-                    "text": res.text
-                })
-                if res.status_code != 204:
-                    return jsonify({"error": "Failed to write to InfluxDB"}), 500
-            except requests.RequestException as e:
-                self.log_action("InfluxDB error", str(e), status="FAIL")
-                return jsonify({"error": "Failed to reach InfluxDB"}), 500
+        Returns "stored", "rejected" for a 4xx (InfluxDB will never accept the
+        batch, so the drainer drops it) or "failed" to retry it later.
+        """
+        try:
+            res = self.write_to_influx("\n".join(lines))
+        except requests.RequestException as e:
+            self.log_action("SPOOL DRAIN", {"lines": len(lines), "error": str(e)}, status="FAIL")
+            return "failed"
+        if res.status_code != 204:
+            rejected = 400 <= res.status_code < 500
+            self.log_action("SPOOL DRAIN", {
+                "lines": len(lines),
+                "status_code": res.status_code,
+                "text": res.text
+            }, status="REJECTED" if rejected else "FAIL")
+            return "rejected" if rejected else "failed"
+        self.log_action("SPOOL DRAIN", {
+            "lines": len(lines),
+            "pending_bytes": self.spool.pending_bytes()
+        })
+        return "stored"
+
+    def spool_lines(self, lines):
+        """Append lines to the disk spool. Returns "spooled" or "spool_full"."""
+        if self.spool.append(lines):
+            return "spooled"
+        self.log_action("SPOOL", {"lines": len(lines)}, status="FULL")
+        return "spool_full"
+
+    def deliver(self, lines):
+        """Send lines towards InfluxDB and return how they were handled.
+
+        Returns "queued" when the batch writer took them, "stored" after a
+        synchronous write, "spooled" when they went to the disk spool, or one
+        of the DELIVERY_ERRORS keys.
+        """
+        if self.writer:
+            for line in lines:
+                if not self.writer.submit(line):
+                    return "queue_full"
+            return "queued"
 
+        if self.spool and self.spool.has_pending():
+            # InfluxDB is still recovering; keep ordering by spooling behind the backlog.
+            return self.spool_lines(lines)
+
+        try:
+            res = self.write_to_influx("\n".join(lines))
+        except requests.RequestException as e:
+            self.log_action("InfluxDB error", str(e), status="FAIL")
+            return self.spool_lines(lines) if self.spool else "unreachable"
+
+        self.log_action("INFLUX RESPONSE", lambda: {
+            "status_code": res.status_code,
+            "text": res.text
+        }, status="OK" if res.status_code == 204 else "FAIL")
+        if res.status_code == 204:
+            return "stored"
+        if res.status_code >= 500 and self.spool:
+            return self.spool_lines(lines)
+        return "write_failed"
+
+    def has_required_fields(self, metrics):
+        """Return True if a sample carries every field needed to build a line."""
+        return all(k in metrics for k in self.REQUIRED_FIELDS)
+
+    def register_session(self, descriptor):
+        """Answer POST /sessions: store an agent's static fields and return a session id."""
+        if not isinstance(descriptor, dict) or not all(
+            k in descriptor for k in ("device_id", "hostname")
+        ):
+            return {"error": "Missing fields"}, 400
+        descriptor = {k: descriptor[k] for k in STATIC_FIELDS if k in descriptor}
+        try:
+            prefix = self.encoder.build_prefix(descriptor)
+        except (TypeError, ValueError, AttributeError):
+            return {"error": "Invalid data format"}, 400
+        # Each registration costs a token from the device's bucket, so a
+        # looping agent cannot churn the session cache.
+        wait = self.admission.admit(descriptor["device_id"])
+        if wait:
+            return self.rate_limited(descriptor["device_id"], wait)
+        session_id = self.sessions.register(descriptor, prefix)
+        self.log_action("POST /sessions", {
+            "device_id": descriptor["device_id"],
+            "session_id": session_id
+        })
+        return {"session_id": session_id, "ttl": self.sessions.ttl}, 201
+
+    def resolve_session(self, metrics):
+        """Rehydrate a sample sent against a session.
+
+        Returns ``(metrics, prefix)``: the sample merged over the session's
+        static fields and the session's tag prefix (None when the sample sets
+        any tag field itself). Samples without ``session_id`` are returned
+        unchanged with no prefix; an unknown or expired session returns None.
+        """
+        session_id = metrics.get("session_id")
+        if session_id is None:
+            return metrics, None
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        merged = {**session.descriptor, **metrics}
+        del merged["session_id"]
+        overrides_tags = any(k in metrics for k in PREFIX_FIELDS)
+        return merged, None if overrides_tags else session.prefix
+
+    def record_sample(self, metrics):
+        """Keep an accepted sample for the /history, /status and /devices endpoints.
+
+        Runs after the sample was delivered, so a failure here is logged and
+        never changes the response the client gets.
+        """
+        try:
+            try:
+                sample_time = self.parse_time(metrics.get("timestamp"))
+            except (TypeError, ValueError):
+                sample_time = None
             self.metrics_buffer.append(metrics)
             self.latest_metrics = metrics
+            self.devices.record(metrics["device_id"], metrics, sample_time=sample_time)
+            if sample_time is not None:
+                self.history.append(metrics["device_id"], sample_time, metrics)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.log_action("RECORD SAMPLE", {
+                "device_id": metrics.get("device_id"),
+                "error": str(e)
+            }, status="ERROR")
+
+    @staticmethod
+    def parse_time(value, default=None):
+        """Parse epoch seconds or an ISO-8601 string into epoch seconds.
+
+        Returns ``default`` (or the current time when no default is given) for
+        missing values; raises ValueError for unparseable ones.
+        """
+        return parse_time(value, default)
 
-            self.log_action("POST /metrics", {
+    def query_history(self, args):
+        """Answer GET /history?device=...&start=...&end=...&step=... from the in-memory store."""
+        device_id = args.get("device")
+        if not device_id:
+            if any(k in args for k in ("start", "end", "step")):
+                return {"error": "device is required for range queries"}, 400
+            return list(self.metrics_buffer), 200
+        try:
+            start = self.parse_time(args.get("start"), default=-math.inf)
+            end = self.parse_time(args.get("end"), default=math.inf)
+            step = float(args.get("step", 0))
+        except ValueError:
+            return {"error": "Invalid start, end or step"}, 400
+        if step < 0:
+            return {"error": "Invalid start, end or step"}, 400
+
+        points = self.history.query(device_id, start=start, end=end, step=step or None)
+        if points is None:
+            return {"error": "Unknown device"}, 404
+        return {"device_id": device_id, "step": step or None, "points": points}, 200
+
+    def status(self):
+        """Return the GET /status payload."""
+        return {
+            "status": "ok",
+            "last_updated": self.latest_metrics.get("timestamp"),
+            "devices": len(self.devices)
+        }
+
+    def list_devices(self):
+        """Return the GET /devices payload."""
+        devices = self.devices.devices()
+        return {"count": len(devices), "devices": devices}
+
+    def device_latest(self, device_id):
+        """Answer GET /devices/<device_id>/latest."""
+        state = self.devices.get(device_id)
+        if state is None:
+            return {"error": "Unknown device"}, 404
+        return state, 200
+
+    @staticmethod
+    def respond(result):
+        """Turn a (payload, status[, headers]) result into a Flask response."""
+        payload, *rest = result
+        return (jsonify(payload), *rest)
+
+    def decode_body(self, body, mimetype, content_encoding=None, batch=False):
+        """Decompress and decode an ingest body according to its headers.
+
+        Single samples may be JSON or MessagePack; batches may also be NDJSON,
+        and are returned as an iterator of samples. Raises UnsupportedPayload,
+        PayloadTooLarge or ValueError.
+        """
+        allowed = payload_codec.is_json_type(mimetype) or mimetype in MSGPACK_TYPES or (
+            batch and mimetype in NDJSON_TYPES
+        )
+        if not allowed:
+            raise ValueError(f"Unsupported Content-Type: {mimetype}")
+        start = time.perf_counter()
+        try:
+            body = payload_codec.decompress(body, content_encoding, self.max_decoded_bytes)
+            if not batch:
+                return payload_codec.decode(body, mimetype)
+            if mimetype in NDJSON_TYPES:
+                # Lines are decoded lazily while the batch is ingested.
+                return self.iter_ndjson(body.splitlines())
+            return self.iter_json_array(payload_codec.decode(body, mimetype))
+        finally:
+            self.instruments.parse_seconds.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def payload_error(error, mimetype):
+        """Map a decode_body exception to a (payload, status) result."""
+        if isinstance(error, UnsupportedPayload):
+            return {"error": str(error)}, 415
+        if isinstance(error, PayloadTooLarge):
+            return {"error": str(error)}, 413
+        if mimetype in MSGPACK_TYPES:
+            return {"error": "Invalid MessagePack format"}, 400
+        return {"error": "Invalid JSON format"}, 400
+
+    def check_load(self):
+        """Return a 503 result when the InfluxDB backend is saturated, else None."""
+        # While the spool holds a backlog it absorbs writes, so InfluxDB
+        # latency is not a reason to shed.
+        spooling = self.spool is not None and self.spool.has_pending()
+        reason = self.admission.shed_reason(self.writer, None if spooling else self.influx)
+        if reason is None:
+            return None
+        self.instruments.rejections.labels("load_shed").inc()
+        self.log_action("LOAD SHED", {"reason": reason}, status="REJECTED")
+        return {"error": reason}, 503, {"Retry-After": "5"}
+
+    def rate_limited(self, device_id, wait):
+        """Build the 429 result for a device that exceeded its token bucket."""
+        self.devices.record_rejection(device_id)
+        self.instruments.rejections.labels("rate_limit").inc()
+        self.log_action("RATE LIMIT", {"device_id": device_id}, status="REJECTED")
+        return {"error": "Rate limit exceeded"}, 429, {"Retry-After": str(max(1, round(wait)))}
+
+    def count_request(self, route, result, start):
+        """Record a finished ingest request, whatever answered it, and return its result.
+
+        Load shedding and body errors are counted like any other response.
+        Batches that reached per-item validation have their samples counted by
+        ingest_batch(); any other response counts as one sample with the
+        outcome of its status code.
+        """
+        instruments = self.instruments
+        instruments.requests.labels(route).inc()
+        instruments.request_seconds.labels(route).observe(time.perf_counter() - start)
+        if "results" not in result[0]:
+            instruments.samples.labels(instruments.STATUS_OUTCOMES.get(result[1], "failed")).inc()
+        return result
+
+    def receive_metrics(self):
+        """Process incoming metrics POST request."""
+        start = time.perf_counter()
+        result = self.check_load()
+        if not result:
+            try:
+                metrics = self.decode_body(
+                    request.get_data(), request.mimetype, request.headers.get("Content-Encoding")
+                )
+            except ValueError as e:
+                result = self.payload_error(e, request.mimetype)
+            else:
+                result = self.ingest(metrics)
+        return self.respond(self.count_request("/metrics", result, start))
+
+    def ingest(self, metrics):
+        """Validate, encode and deliver one decoded sample.
+
+        Returns a (payload, status[, headers]) tuple shared by the Flask and
+        asyncio serving modes.
+        """
+        try:
+            prefix = None
+            if isinstance(metrics, dict):
+                resolved = self.resolve_session(metrics)
+                if resolved is None:
+                    self.log_action("POST /metrics", {"session_id": metrics["session_id"]},
+                                    status="UNKNOWN_SESSION")
+                    return {"error": "Unknown session"}, 409
+                metrics, prefix = resolved
+            if not self.has_required_fields(metrics):
+                self.log_action("POST /metrics", metrics, status="INVALID")
+                return {"error": "Missing fields"}, 400
+
+            wait = self.admission.admit(metrics["device_id"])
+            if wait:
+                return self.rate_limited(metrics["device_id"], wait)
+
+            line = self.build_line(metrics, prefix)
+            self.log_action("INFLUX LINE", {"line": line}, level=logging.DEBUG)
+
+            outcome = self.deliver([line])
+            if outcome in self.DELIVERY_ERRORS:
+                self.devices.record_rejection(metrics["device_id"])
+            if outcome in ("queue_full", "spool_full"):
+                self.instruments.rejections.labels(outcome).inc()
+                self.log_action("POST /metrics", {"device_id": metrics["device_id"]},
+                                status="REJECTED")
+                return {"error": self.DELIVERY_ERRORS[outcome]}, 503, {"Retry-After": "1"}
+            if outcome in self.DELIVERY_ERRORS:
+                return {"error": self.DELIVERY_ERRORS[outcome]}, 500
+
+            self.record_sample(metrics)
+
+            self.log_action("POST /metrics", lambda: {
                 "device_id": metrics["device_id"],
                 "hostname": metrics["hostname"],
                 "cpu_total": metrics["cpu_total"],
@@ -145,31 +772,229 @@ class ApiServer:
                 "tags": metrics.get("tags", {})
             })
 
-            return jsonify({"message": "Metrics stored successfully"}), 200
+            if outcome == "queued":
+                return {"message": "Metrics accepted"}, 202
+            if outcome == "spooled":
+                return {"message": "Metrics spooled"}, 202
+            return {"message": "Metrics stored successfully"}, 200
 
         except (KeyError, TypeError, ValueError) as e:
             self.log_action("POST /metrics", status="ERROR", data={"error": str(e)})
-            return jsonify({"error": "Invalid data format"}), 400
+            return {"error": "Invalid data format"}, 400
         except Exception as e:
             self.log_action("POST /metrics", status="ERROR", data={"error": str(e)})
-            return jsonify({"error": "Internal server error"}), 500
+            return {"error": "Internal server error"}, 500
+
+    @staticmethod
+    def iter_ndjson(lines):
+        """Yield decoded samples from NDJSON lines.
+
+        A malformed line is yielded as a ``ValueError`` instance so it is
+        reported for that item only.
+        """
+        for raw in lines:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                yield json.loads(raw)
+            except ValueError as e:
+                yield e
+
+    @staticmethod
+    def iter_json_array(samples):
+        """Yield the items of a decoded JSON array body."""
+        if not isinstance(samples, list):
+            raise ValueError("Batch body must be a JSON array or NDJSON")
+        yield from samples
+
+    def receive_session(self):
+        """Process a POST /sessions registration request."""
+        try:
+            descriptor = self.decode_body(
+                request.get_data(), request.mimetype, request.headers.get("Content-Encoding")
+            )
+        except ValueError as e:
+            return self.respond(self.payload_error(e, request.mimetype))
+        return self.respond(self.register_session(descriptor))
+
+    def receive_batch(self):
+        """Process a POST /metrics/batch request holding many samples."""
+        start = time.perf_counter()
+        result = self.check_load()
+        if not result:
+            encoding = request.headers.get("Content-Encoding")
+            if request.mimetype in NDJSON_TYPES and encoding in (None, "", "identity"):
+                # Read an uncompressed body line by line from the request stream.
+                result = self.ingest_batch(self.iter_ndjson(request.stream))
+            else:
+                try:
+                    samples = self.decode_body(
+                        request.get_data(), request.mimetype, encoding, batch=True
+                    )
+                except ValueError as e:
+                    result = self.payload_error(e, request.mimetype)
+                else:
+                    result = self.ingest_batch(samples)
+        return self.respond(self.count_request("/metrics/batch", result, start))
+
+    def ingest_batch(self, samples):
+        """Validate, encode and deliver an iterable of decoded samples.
+
+        Returns a (payload, status) tuple with a result for every item.
+        """
+        results = []
+        accepted = []
+        waits = {}
+        try:
+            for index, metrics in enumerate(samples):
+                if index >= self.batch_max_items:
+                    return {"error": f"Batch exceeds {self.batch_max_items} items"}, 413
+                if isinstance(metrics, ValueError):
+                    results.append({"index": index, "status": "invalid", "error": "Invalid JSON"})
+                    continue
+                prefix = None
+                if isinstance(metrics, dict):
+                    resolved = self.resolve_session(metrics)
+                    if resolved is None:
+                        results.append({"index": index, "status": "unknown_session",
+                                        "error": "Unknown session"})
+                        continue
+                    metrics, prefix = resolved
+                if not isinstance(metrics, dict) or not self.has_required_fields(metrics):
+                    results.append({"index": index, "status": "invalid", "error": "Missing fields"})
+                else:
+                    # One token per device per request, however many samples it carries.
+                    device_id = metrics["device_id"]
+                    if device_id not in waits:
+                        waits[device_id] = self.admission.admit(device_id)
+                    if waits[device_id]:
+                        self.instruments.rejections.labels("rate_limit").inc()
+                        results.append({"index": index, "status": "rejected",
+                                        "error": "Rate limit exceeded"})
+                        continue
+                    try:
+                        line = self.build_line(metrics, prefix)
+                    except (KeyError, TypeError, ValueError):
+                        results.append({"index": index, "status": "invalid",
+                                        "error": "Invalid data format"})
+                        continue
+                    results.append({"index": index, "status": "ok"})
+                    accepted.append((results[-1], metrics, line))
+        except ValueError as e:
+            self.log_action("POST /metrics/batch", status="INVALID", data={"error": str(e)})
+            return {"error": str(e)}, 400
+
+        if self.writer:
+            outcomes = [self.deliver([line]) for _, _, line in accepted]
+        elif accepted:
+            outcomes = [self.deliver([line for _, _, line in accepted])] * len(accepted)
+        else:
+            outcomes = []
+
+        stored = True
+        for (result, metrics, _), outcome in zip(accepted, outcomes):
+            if outcome in self.DELIVERY_ERRORS:
+                self.devices.record_rejection(metrics["device_id"])
+            if outcome in ("queue_full", "spool_full"):
+                self.instruments.rejections.labels(outcome).inc()
+                result.update(status="rejected", error=self.DELIVERY_ERRORS[outcome])
+            elif outcome in self.DELIVERY_ERRORS:
+                result.update(status="failed", error=self.DELIVERY_ERRORS[outcome])
+            else:
+                stored = stored and outcome == "stored"
+                self.record_sample(metrics)
+
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        for status, count in counts.items():
+            self.instruments.samples.labels(status).inc(count)
+        self.log_action("POST /metrics/batch", counts,
+                        status="OK" if counts.get("ok") == len(results) else "PARTIAL")
+
+        if counts.get("ok", 0) == len(results) and results:
+            status_code = 200 if stored else 202
+        elif counts.get("ok"):
+            status_code = 207
+        elif counts.get("unknown_session"):
+            status_code = 409
+        elif counts.get("rejected"):
+            status_code = 503
+        elif counts.get("failed"):
+            status_code = 500
+        else:
+            status_code = 400
+        return {
+            "accepted": counts.get("ok", 0),
+            "rejected": len(results) - counts.get("ok", 0),
+            "results": results
+        }, status_code
 
     def setup_routes(self):
         """Define API endpoints."""
         @self.app.route("/metrics", methods=["POST"])
-        @self.limiter.limit("10/minute")
         def receive_metrics_wrapper():
             return self.receive_metrics()
 
+        @self.app.route("/metrics/batch", methods=["POST"])
+        def receive_batch_wrapper():
+            return self.receive_batch()
+
+        @self.app.route("/sessions", methods=["POST"])
+        def receive_session_wrapper():
+            return self.receive_session()
+
         @self.app.route("/history", methods=["GET"])
         def get_history():
-            return jsonify(list(self.metrics_buffer))
+            return self.respond(self.query_history(request.args))
 
         @self.app.route("/status", methods=["GET"])
         def get_status():
+            return jsonify(self.status())
+
+        @self.app.route("/devices", methods=["GET"])
+        def list_devices():
+            return jsonify(self.list_devices())
+
+        @self.app.route("/devices/<device_id>/latest", methods=["GET"])
+        def device_latest(device_id):
+            return self.respond(self.device_latest(device_id))
+
+        @self.app.route("/internal/pool", methods=["GET"])
+        def pool_stats():
+            return jsonify(self.influx.pool_stats())
+
+        @self.app.route("/internal/admission", methods=["GET"])
+        def admission_stats():
+            return jsonify(self.admission.stats)
+
+        @self.app.route("/internal/sessions", methods=["GET"])
+        def session_stats():
+            return jsonify({"sessions": len(self.sessions), **self.sessions.stats})
+
+        @self.app.route("/internal/metrics", methods=["GET"])
+        def prometheus_metrics():
+            return self.instruments.registry.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+        @self.app.route("/internal/logging", methods=["GET", "POST"])
+        def logging_detail():
+            if request.method == "POST":
+                return self.respond(self.update_logging(
+                    request.get_json(silent=True), request.remote_addr,
+                    request.headers.get("X-Admin-Token")
+                ))
+            return self.respond(self.logging_settings())
+
+        @self.app.route("/internal/spool", methods=["GET"])
+        def spool_stats():
+            if not self.spool:
+                return jsonify({"enabled": False})
             return jsonify({
-                "status": "ok",
-                "last_updated": self.latest_metrics.get("timestamp")
+                "enabled": True,
+                "pending_bytes": self.spool.pending_bytes(),
+                "checkpoint": list(self.spool.checkpoint),
+                **self.drainer.stats
             })
 
         @self.app.route("/health", methods=["GET"])
@@ -181,7 +1006,24 @@ class ApiServer:
             return "Metric receiver is running!"
 
 
+def create_app():
+    """Build an ApiServer and wrap it for ASGI servers (``uvicorn --factory``)."""
+    return AsgiApp(ApiServer())
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics ingest API server")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="serve with the asyncio (ASGI) app under uvicorn instead of Flask")
+    cli_args = parser.parse_args()
+
     server = ApiServer()
     print("API server running at http://0.0.0.0:5001")
-    server.app.run(host="0.0.0.0", port=5001)
+    if cli_args.async_mode:
+        import uvicorn
+        uvicorn.run(AsgiApp(server), host="0.0.0.0", port=5001, lifespan="on")
+    else:
+        try:
+            server.app.run(host="0.0.0.0", port=5001)
+        finally:
+            server.shutdown()
@@ -0,0 +1,230 @@
+"""ASGI (asyncio) serving mode for the ingest API.
+
+Serves the same routes as the Flask app from a single event loop, so thousands
+of mostly idle agent connections do not each hold a thread. Run with:
+
+    python api_server.py --async
+or
+    uvicorn --factory api_server:create_app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote
+
+from instrumentation import CONTENT_TYPE
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+
+class ClientDisconnect(Exception):
+    """Raised when the client goes away before the request body is complete."""
+
+
+class AsgiApp:
+    """ASGI application wrapping an ``ApiServer`` instance.
+
+    Bodies are read on the event loop. Everything that can block, body
+    decompression and decoding, the InfluxDB write and the synchronous file
+    logging done on every ingest and shed decision, runs on a small executor
+    sized to the connection pool, so neither large bodies, slow writes nor log
+    I/O stall the loop. A request whose client disconnects mid-body is dropped
+    without being processed.
+    """
+
+    def __init__(self, server, max_body_bytes=MAX_BODY_BYTES, workers=None):
+        self.server = server
+        self.max_body_bytes = max_body_bytes
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or server.influx.pool_size,
+            thread_name_prefix="influx-write"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            await self.handle(scope, receive, send)
+        except ClientDisconnect:
+            return
+
+    async def handle(self, scope, receive, send):
+        """Route one HTTP request and send its response."""
+        method, path = scope["method"], scope["path"]
+        if method == "POST" and path in ("/metrics", "/metrics/batch"):
+            start = time.perf_counter()
+            result = await self.run_blocking(self.server.check_load)
+            if not result:
+                if path == "/metrics":
+                    result = await self.receive_metrics(scope, receive)
+                else:
+                    result = await self.receive_batch(scope, receive)
+            await self.send_json(send, *self.server.count_request(path, result, start))
+            return
+
+        if method == "POST" and path == "/sessions":
+            result = await self.receive_session(scope, receive)
+        elif method == "GET" and path == "/history":
+            args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+            result = self.server.query_history(args)
+        elif method == "GET" and path == "/status":
+            result = self.server.status(), 200
+        elif method == "GET" and path == "/devices":
+            result = self.server.list_devices(), 200
+        elif method == "GET" and path.startswith("/devices/") and path.endswith("/latest"):
+            result = self.server.device_latest(unquote(path[len("/devices/"):-len("/latest")]))
+        elif method == "GET" and path == "/internal/logging":
+            result = self.server.logging_settings()
+        elif method == "POST" and path == "/internal/logging":
+            result = await self.update_logging(scope, receive)
+        elif method == "GET" and path == "/internal/metrics":
+            await self.send_text(send, 200, self.server.instruments.registry.render(), CONTENT_TYPE)
+            return
+        elif method == "GET" and path == "/health":
+            await self.send_text(send, 200, "OK")
+            return
+        elif method == "GET" and path == "/":
+            await self.send_text(send, 200, "Metric receiver is running!")
+            return
+        else:
+            result = {"error": "Not found"}, 404
+        await self.send_json(send, *result)
+
+    async def lifespan(self, receive, send):
+        """Handle ASGI startup and shutdown events."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                self.server.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_body(self, receive):
+        """Read the request body, returning None if it exceeds ``max_body_bytes``.
+
+        Raises ClientDisconnect if the client goes away first, so a truncated
+        body is never processed.
+        """
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnect()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def run_blocking(self, func, *args):
+        """Run a server call that may write to InfluxDB or the log file on the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def decode_and_handle(self, handler, scope, body, batch=False):
+        """Decode a request body and pass it to ``handler``.
+
+        Runs on the executor: decompressing and parsing a body of up to
+        ``max_body_bytes`` would otherwise stall every connection on the loop.
+        """
+        mimetype = content_type(scope)
+        try:
+            decoded = self.server.decode_body(
+                body, mimetype, header(scope, b"content-encoding"), batch=batch
+            )
+        except ValueError as e:
+            return self.server.payload_error(e, mimetype)
+        return handler(decoded)
+
+    async def receive_metrics(self, scope, receive):
+        """Handle POST /metrics."""
+        body = await self.read_body(receive)
+        if body is None:
+            return {"error": "Request body too large"}, 413
+        return await self.run_blocking(self.decode_and_handle, self.server.ingest, scope, body)
+
+    async def receive_session(self, scope, receive):
+        """Handle POST /sessions."""
+        body = await self.read_body(receive)
+        if body is None:
+            return {"error": "Request body too large"}, 413
+        return await self.run_blocking(
+            self.decode_and_handle, self.server.register_session, scope, body
+        )
+
+    async def update_logging(self, scope, receive):
+        """Handle POST /internal/logging (admin token or loopback clients only)."""
+        body = await self.read_body(receive)
+        if body is None:
+            return {"error": "Request body too large"}, 413
+        try:
+            settings = json.loads(body) if body else None
+        except ValueError:
+            settings = None
+        client = scope.get("client")
+        return await self.run_blocking(
+            self.server.update_logging, settings, client[0] if client else None,
+            header(scope, b"x-admin-token")
+        )
+
+    async def receive_batch(self, scope, receive):
+        """Handle POST /metrics/batch."""
+        body = await self.read_body(receive)
+        if body is None:
+            return {"error": "Request body too large"}, 413
+        return await self.run_blocking(
+            self.decode_and_handle, self.server.ingest_batch, scope, body, True
+        )
+
+    @staticmethod
+    async def send_json(send, payload, status, headers=None):
+        """Send a JSON response from a (payload, status[, headers]) result."""
+        body = json.dumps(payload).encode("utf-8")
+        raw_headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        for key, value in (headers or {}).items():
+            raw_headers.append((key.lower().encode("latin-1"), str(value).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def send_text(send, status, text, mimetype="text/html; charset=utf-8"):
+        """Send a plain-text response."""
+        body = text.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", mimetype.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def header(scope, name):
+    """Return a request header value, or None."""
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def content_type(scope):
+    """Return the request mimetype without parameters."""
+    return (header(scope, b"content-type") or "").split(";")[0].strip().lower()
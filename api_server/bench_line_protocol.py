@@ -0,0 +1,100 @@
+"""Micro-benchmark: line-protocol encoding throughput, legacy path vs LineProtocolEncoder.
+
+Run with:
+    python bench_line_protocol.py [--samples N] [--devices N] [--cores N]
+"""
+
+import argparse
+import time
+
+from line_protocol import LineProtocolEncoder, escape_tag
+
+
+def legacy_build_line(metrics):
+    """The original per-request encoding from ApiServer.receive_metrics."""
+    tags = metrics.get("tags", {})
+    if not isinstance(tags, dict):
+        tags = {}
+    tags["device_id"] = metrics["device_id"]
+    tags["host"] = metrics["hostname"]
+    tags["device_type"] = metrics.get("device_type", "unknown")
+
+    tag_str = ",".join(f"{escape_tag(k)}={escape_tag(v)}" for k, v in tags.items())
+
+    field_parts = [
+        f"cpu={metrics['cpu_total']}",
+        f"memory={metrics['memory_percent']}",
+        f"disk={metrics['disk_percent']}",
+        f"memory_total={metrics.get('memory_total', 0)}",
+        f"memory_used={metrics.get('memory_used', 0)}",
+        f"disk_total={metrics.get('disk_total', 0)}",
+        f"disk_used={metrics.get('disk_used', 0)}",
+        f"heartbeat={metrics.get('heartbeat', 1)}"
+    ]
+
+    cpu_per_core = metrics.get("cpu_per_core")
+    if isinstance(cpu_per_core, list):
+        field_parts.extend(f"cpu_core_{i}={core}" for i, core in enumerate(cpu_per_core))
+
+    return f"system_metrics,{tag_str} {','.join(field_parts)}"
+
+
+def make_samples(count, devices, cores):
+    """Build ``count`` realistic payloads spread over ``devices`` devices."""
+    samples = []
+    for i in range(count):
+        device = i % devices
+        samples.append({
+            "device_id": f"edge-{device:012x}",
+            "hostname": f"store-{device} gateway",
+            "device_type": "edge-node",
+            "cpu_total": 27.8 + (i % 50),
+            "cpu_per_core": [round(10.0 + c * 1.5 + (i % 7), 1) for c in range(cores)],
+            "memory_percent": 81.1,
+            "memory_used": 3232989184,
+            "memory_total": 8589934592,
+            "disk_percent": 38.1,
+            "disk_used": 14836686848,
+            "disk_total": 245107195904,
+            "heartbeat": 1,
+            "tags": {"location": f"store-{device % 100}", "zone": "east"},
+        })
+    return samples
+
+
+def bench(name, func, samples, repeat):
+    """Time ``func`` over every sample and print the best lines/sec."""
+    best = float("inf")
+    for _ in range(repeat):
+        batch = [dict(s, tags=dict(s["tags"])) for s in samples]
+        start = time.perf_counter()
+        for metrics in batch:
+            func(metrics)
+        best = min(best, time.perf_counter() - start)
+    rate = len(samples) / best
+    print(f"{name:<10} {rate:>12,.0f} lines/sec")
+    return rate
+
+
+def main():
+    """Parse arguments, verify both encoders agree, and print throughput."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--cores", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples, args.devices, args.cores)
+    encoder = LineProtocolEncoder()
+    for s in samples[:args.devices]:
+        legacy = legacy_build_line(dict(s, tags=dict(s["tags"])))
+        assert encoder.encode(s, timestamp=0) == legacy + " 0"
+
+    legacy = bench("legacy", legacy_build_line, samples, args.repeat)
+    cached = bench("encoder", encoder.encode, samples, args.repeat)
+    print(f"speedup    {cached / legacy:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""In-memory index of the most recent sample and ingest counters for every device."""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class DeviceState:
+    """Latest sample and counters for one device."""
+
+    __slots__ = ("latest", "latest_time", "first_seen", "last_seen", "samples", "rejected")
+
+    def __init__(self, now):
+        self.latest = None
+        self.latest_time = None
+        self.first_seen = now
+        self.last_seen = now
+        self.samples = 0
+        self.rejected = 0
+
+    def summary(self, device_id):
+        """Return a JSON-ready summary without the full sample."""
+        latest = self.latest or {}
+        return {
+            "device_id": device_id,
+            "hostname": latest.get("hostname"),
+            "device_type": latest.get("device_type", "unknown"),
+            "first_seen": _isoformat(self.first_seen),
+            "last_seen": _isoformat(self.last_seen),
+            "samples": self.samples,
+            "rejected": self.rejected,
+        }
+
+
+def _isoformat(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class DeviceIndex:
+    """Per-device latest-state index with O(1) lookups.
+
+    Entries are kept in last-seen order, so devices that stopped reporting sit
+    at the front and are evicted first, either when they have been silent for
+    ``stale_after`` seconds or when more than ``max_devices`` are tracked.
+    """
+
+    def __init__(self, max_devices=10000, stale_after=86400):
+        self.max_devices = max_devices
+        self.stale_after = stale_after
+        self.evicted = 0
+        self._devices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._devices)
+
+    def record(self, device_id, metrics, now=None, sample_time=None):
+        """Count a sample for ``device_id`` and keep it as the latest one.
+
+        A sample whose ``sample_time`` (epoch seconds) is older than the stored
+        latest one, e.g. a backfilled or late batch sample, is counted but does
+        not replace it.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None:
+                state = self._devices[device_id] = DeviceState(now)
+            else:
+                self._devices.move_to_end(device_id)
+            if sample_time is None or state.latest_time is None or sample_time >= state.latest_time:
+                state.latest = metrics
+                state.latest_time = sample_time
+            state.last_seen = now
+            state.samples += 1
+            self._evict(now)
+
+    def record_rejection(self, device_id):
+        """Count a rejected sample for a device that is already known."""
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is not None:
+                state.rejected += 1
+
+    def _evict(self, now):
+        """Drop stale devices and trim to ``max_devices``. Caller holds the lock."""
+        while self._devices:
+            device_id, state = next(iter(self._devices.items()))
+            if len(self._devices) <= self.max_devices and now - state.last_seen <= self.stale_after:
+                break
+            del self._devices[device_id]
+            self.evicted += 1
+
+    def get(self, device_id):
+        """Return the latest sample and counters for one device, or None."""
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None or time.time() - state.last_seen > self.stale_after:
+                return None
+            return {**state.summary(device_id), "metrics": state.latest}
+
+    def devices(self):
+        """Return summaries for every tracked device, most recently seen first."""
+        with self._lock:
+            self._evict(time.time())
+            return [
+                state.summary(device_id) for device_id, state in reversed(self._devices.items())
+            ]
@@ -0,0 +1,146 @@
+"""Pooled keep-alive HTTP client for writing line protocol to InfluxDB."""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class InfluxClient:
+    """Keeps a persistent connection pool to the InfluxDB write endpoint.
+
+    Connections are reused across requests instead of being opened per sample.
+    The pool is health-checked against ``/ping`` when it has gone longer than
+    ``health_check_interval`` without a check, and rebuilt after a connection
+    error so stale sockets are not handed out again.
+    """
+
+    LATENCY_ALPHA = 0.2
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        base_url,
+        database,
+        pool_size=10,
+        pool_block=False,
+        connect_timeout=2.0,
+        read_timeout=5.0,
+        health_check_interval=30.0,
+        precision=None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.write_url = f"{self.base_url}/write?db={database}"
+        if precision:
+            # Unit of the timestamps on written lines (InfluxDB assumes ns otherwise).
+            self.write_url += f"&precision={precision}"
+        self.ping_url = f"{self.base_url}/ping"
+        self.pool_size = pool_size
+        self.pool_block = pool_block
+        self.timeout = (connect_timeout, read_timeout)
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_health_check = time.monotonic()
+        self.healthy = True
+        self.latency_ewma_ms = 0.0
+        self.last_write_at = None
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "resets": 0,
+            "health_checks": 0,
+            "max_in_flight": 0,
+            "last_latency_ms": None,
+        }
+        self.session, self._adapter = self._new_session()
+
+    def _new_session(self):
+        """Create a session with a single bounded keep-alive pool for InfluxDB."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=self.pool_block,
+            max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session, adapter
+
+    def reset(self):
+        """Drop every pooled connection and start with a fresh pool."""
+        with self._lock:
+            old = self.session
+            self.session, self._adapter = self._new_session()
+            self.stats["resets"] += 1
+        old.close()
+
+    def check_health(self):
+        """Ping InfluxDB over the pool and record whether it answered."""
+        self._last_health_check = time.monotonic()
+        self.stats["health_checks"] += 1
+        try:
+            res = self.session.get(self.ping_url, timeout=self.timeout)
+            self.healthy = res.status_code == 204
+        except requests.RequestException:
+            self.healthy = False
+        if not self.healthy:
+            self.reset()
+        return self.healthy
+
+    def write(self, data):
+        """POST line-protocol data over a pooled connection and return the response."""
+        if time.monotonic() - self._last_health_check > self.health_check_interval:
+            self.check_health()
+
+        with self._lock:
+            self._in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        start = time.monotonic()
+        try:
+            res = self.session.post(self.write_url, data=data, timeout=self.timeout)
+        except requests.ConnectionError:
+            self.stats["errors"] += 1
+            self.healthy = False
+            self.reset()
+            raise
+        except requests.RequestException:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self.last_write_at = time.monotonic()
+            latency_ms = (self.last_write_at - start) * 1000
+            self.stats["last_latency_ms"] = round(latency_ms, 3)
+            self.latency_ewma_ms += self.LATENCY_ALPHA * (latency_ms - self.latency_ewma_ms)
+        self.healthy = True
+        return res
+
+    def pool_stats(self):
+        """Return counters and urllib3 pool occupancy for sizing the pool."""
+        connections_opened = 0
+        idle_connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            connections_opened += pool.num_connections
+            idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return {
+            **self.stats,
+            "pool_size": self.pool_size,
+            "pool_block": self.pool_block,
+            "in_flight": self._in_flight,
+            "connections_opened": connections_opened,
+            "idle_connections": idle_connections,
+            "healthy": self.healthy,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 3),
+        }
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
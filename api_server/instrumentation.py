@@ -0,0 +1,201 @@
+"""Low-overhead counters and latency histograms for the ingest path.
+
+Histograms use fixed buckets: an observation is a bisect over the bucket
+bounds and an integer increment, with nothing stored per observation.
+``MetricsRegistry.render`` produces the Prometheus text exposition format
+served at GET /internal/metrics.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Seconds, from 10us (line encoding) up to 10s (slow InfluxDB writes).
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """Monotonically increasing count."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add ``amount`` to the counter."""
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Distribution of observations over fixed, preallocated buckets."""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # One slot per bound plus the +Inf overflow slot; counts are not cumulative.
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation."""
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        """Return ``(cumulative bucket counts, sum, count)``."""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Family:
+    """A named metric and its children, one per combination of label values."""
+
+    def __init__(self, name, help_text, kind, label_names, factory):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.children = {}
+        self._factory = factory
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the child for these label values, creating it on first use."""
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, self._factory())
+        return child
+
+    def render(self):
+        """Return the exposition lines for this family."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            if self.kind == "counter":
+                lines.append(f"{self.name}{_format_labels(self.label_names, values)} {child.value}")
+                continue
+            cumulative, total, count = child.snapshot()
+            for bound, running in zip(child.bounds + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.label_names, values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and gauges and renders them for Prometheus."""
+
+    def __init__(self):
+        self._families = []
+        self._gauges = []
+
+    def counter(self, name, help_text, labels=()):
+        """Register a counter; returns the Counter itself when it has no labels."""
+        return self._register(Family(name, help_text, "counter", labels, Counter))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        """Register a histogram; returns the Histogram itself when it has no labels."""
+        family = Family(name, help_text, "histogram", labels, lambda: Histogram(buckets))
+        return self._register(family)
+
+    def gauge(self, name, help_text, func):
+        """Register a gauge whose value is read from ``func()`` at scrape time."""
+        self._gauges.append((name, help_text, func))
+
+    def _register(self, family):
+        self._families.append(family)
+        return family.labels() if not family.label_names else family
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for name, help_text, func in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(func())}")
+        return "\n".join(lines) + "\n"
+
+
+class IngestMetrics:
+    """The ingest-path instruments exposed by the API server."""
+
+    # Sample outcome recorded for each POST /metrics response status (and for
+    # batches refused as a whole).
+    STATUS_OUTCOMES = {
+        200: "ok", 202: "ok", 400: "invalid", 409: "unknown_session",
+        413: "invalid", 415: "invalid", 429: "rejected", 500: "failed", 503: "rejected",
+    }
+
+    def __init__(self, registry=None):
+        reg = self.registry = registry or MetricsRegistry()
+        self.requests = reg.counter(
+            "api_ingest_requests_total", "Ingest requests handled.", ("route",)
+        )
+        self.request_seconds = reg.histogram(
+            "api_ingest_request_seconds", "Time to answer an ingest request, load check included.",
+            ("route",)
+        )
+        self.parse_seconds = reg.histogram(
+            "api_ingest_parse_seconds", "Time to decompress and decode a request body."
+        )
+        self.encode_seconds = reg.histogram(
+            "api_line_encode_seconds", "Time to encode one sample as line protocol."
+        )
+        self.influx_write_seconds = reg.histogram(
+            "api_influx_write_seconds", "Duration of InfluxDB write requests."
+        )
+        self.samples = reg.counter(
+            "api_ingest_samples_total", "Ingested samples by outcome.", ("outcome",)
+        )
+        self.rejections = reg.counter(
+            "api_ingest_rejections_total", "Requests or samples turned away, by reason.",
+            ("reason",)
+        )
+        self.influx_failures = reg.counter(
+            "api_influx_write_failures_total", "Failed InfluxDB writes, by reason.", ("reason",)
+        )
+        # Create the children up front so every series is exported from the first scrape.
+        for route in ("/metrics", "/metrics/batch"):
+            self.requests.labels(route)
+            self.request_seconds.labels(route)
+        for outcome in set(self.STATUS_OUTCOMES.values()):
+            self.samples.labels(outcome)
+        for reason in ("rate_limit", "load_shed", "queue_full", "spool_full"):
+            self.rejections.labels(reason)
+        for reason in ("unreachable", "http_status"):
+            self.influx_failures.labels(reason)
@@ -0,0 +1,236 @@
+"""InfluxDB line-protocol encoding for system_metrics samples."""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+MEASUREMENT = "system_metrics"
+# Every line carries the sample's own time in milliseconds; writes must pass precision=ms.
+PRECISION = "ms"
+# Sample times (epoch seconds) outside 1970-01-01..2100-01-01 are rejected: InfluxDB
+# refuses them, and a value already in milliseconds would land ~50,000 years ahead.
+MIN_TIMESTAMP = 0.0
+MAX_TIMESTAMP = 4102444800.0
+
+# The eight fixed fields written for every sample, formatted in one call.
+FIXED_FIELDS_FORMAT = (
+    "cpu={},memory={},disk={},memory_total={},memory_used={},"
+    "disk_total={},disk_used={},heartbeat={}"
+)
+
+# Per-GPU readings sent by the agent's streaming GPU collector, written as gpu_<index>_<key>.
+GPU_FIELDS = (
+    "utilization", "memory_utilization", "memory_used", "memory_total", "temperature", "power_draw",
+)
+
+# Windowed summaries from the agent's aggregation stage are written as <field>_<stat>, using
+# the same field names as the raw values (cpu_total -> cpu_min, cpu_core_0 -> cpu_core_0_p95).
+SUMMARY_STATS = ("min", "max", "mean", "p95")
+SUMMARY_FIELD_NAMES = {"cpu_total": "cpu", "memory_percent": "memory", "disk_percent": "disk"}
+SUMMARY_FIELD_RE = re.compile(r"[a-z][a-z0-9_]{0,63}")
+
+# The agent's self-telemetry ("agent": {"collect_ms": ..., "rss_bytes": ...}) is written as
+# agent_<key>; keys must match SUMMARY_FIELD_RE.
+MAX_AGENT_FIELDS = 64
+
+
+def parse_time(value, default=None):
+    """Parse epoch seconds or an ISO-8601 string into epoch seconds.
+
+    Returns ``default`` (or the current time when no default is given) for
+    missing values; raises ValueError for unparseable ones.
+    """
+    if value is None or value == "":
+        return time.time() if default is None else default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def escape_tag(val):
+    """Escape special characters in InfluxDB tag keys and values."""
+    return str(val).replace(" ", "\\ ").replace(",", "\\,").replace("=", "\\=")
+
+
+class LineProtocolEncoder:
+    """Encodes metrics payloads into line protocol.
+
+    The escaped ``measurement,tags`` prefix rarely changes for a device, so it is
+    built once per (device_id, hostname, device_type, tags) set and kept in a
+    bounded LRU cache. Field names for per-core CPU values are precomputed.
+    Optional per-GPU readings (``gpus``) become ``gpu_<index>_<key>`` fields and
+    windowed ``summary`` statistics become ``<field>_<stat>`` fields.
+    """
+
+    def __init__(self, max_cached=10000):
+        self.max_cached = max_cached
+        self.hits = 0
+        self.misses = 0
+        self._prefixes = OrderedDict()
+        self._lock = threading.Lock()
+        self._core_keys = []
+
+    @staticmethod
+    def build_prefix(metrics):
+        """Build the escaped ``measurement,tag=value,...`` prefix for a sample."""
+        tags = metrics.get("tags", {})
+        tags = dict(tags) if isinstance(tags, dict) else {}
+        tags["device_id"] = metrics["device_id"]
+        tags["host"] = metrics["hostname"]
+        tags["device_type"] = metrics.get("device_type", "unknown")
+        tag_str = ",".join(f"{escape_tag(k)}={escape_tag(v)}" for k, v in tags.items())
+        return f"{MEASUREMENT},{tag_str}"
+
+    def tag_prefix(self, metrics):
+        """Return the cached tag prefix for a sample, building it on a miss."""
+        tags = metrics.get("tags")
+        try:
+            key = (
+                metrics["device_id"],
+                metrics["hostname"],
+                metrics.get("device_type", "unknown"),
+                tuple(tags.items()) if isinstance(tags, dict) else None,
+            )
+            hash(key)
+        except TypeError:
+            # Unhashable tag values cannot be cached; encode them directly.
+            return self.build_prefix(metrics)
+
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return prefix
+
+        prefix = self.build_prefix(metrics)
+        with self._lock:
+            self.misses += 1
+            self._prefixes[key] = prefix
+            if len(self._prefixes) > self.max_cached:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def core_keys(self, count):
+        """Return precomputed ``cpu_core_N=`` field keys for ``count`` cores."""
+        keys = self._core_keys
+        if len(keys) < count:
+            keys = self._core_keys = [f"cpu_core_{i}=" for i in range(count)]
+        return keys
+
+    @staticmethod
+    def encode_gpus(gpus):
+        """Encode ``gpus`` readings as ``gpu_<index>_<key>=value`` fields, skipping bad entries."""
+        parts = []
+        for gpu in gpus:
+            if not isinstance(gpu, dict):
+                continue
+            index = gpu.get("index")
+            if not isinstance(index, int) or isinstance(index, bool) or index < 0:
+                continue
+            for key in GPU_FIELDS:
+                value = gpu.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    parts.append(f"gpu_{index}_{key}={value}")
+        return ",".join(parts)
+
+    @staticmethod
+    def encode_summary(summary, window_samples=None):
+        """Encode ``summary`` statistics as ``<field>_<stat>=value`` fields.
+
+        Malformed entries are skipped.
+        """
+        parts = []
+        for field, stats in summary.items():
+            if not isinstance(stats, dict) or not isinstance(field, str):
+                continue
+            name = SUMMARY_FIELD_NAMES.get(field, field)
+            if not SUMMARY_FIELD_RE.fullmatch(name):
+                continue
+            for stat in SUMMARY_STATS:
+                value = stats.get(stat)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    parts.append(f"{name}_{stat}={value}")
+        if parts and isinstance(window_samples, int) and not isinstance(window_samples, bool):
+            parts.append(f"window_samples={window_samples}")
+        return ",".join(parts)
+
+    @staticmethod
+    def encode_agent(agent):
+        """Encode agent self-telemetry as ``agent_<key>=value`` fields, skipping bad entries."""
+        parts = []
+        for key, value in agent.items():
+            if len(parts) >= MAX_AGENT_FIELDS:
+                break
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and isinstance(key, str) and SUMMARY_FIELD_RE.fullmatch(key)):
+                parts.append(f"agent_{key}={value}")
+        return ",".join(parts)
+
+    def encode_fields(self, metrics):
+        """Encode the field set of a sample."""
+        fields = FIXED_FIELDS_FORMAT.format(
+            metrics["cpu_total"],
+            metrics["memory_percent"],
+            metrics["disk_percent"],
+            metrics.get("memory_total", 0),
+            metrics.get("memory_used", 0),
+            metrics.get("disk_total", 0),
+            metrics.get("disk_used", 0),
+            metrics.get("heartbeat", 1),
+        )
+        cpu_per_core = metrics.get("cpu_per_core")
+        if isinstance(cpu_per_core, list) and cpu_per_core:
+            keys = self.core_keys(len(cpu_per_core))
+            fields += "," + ",".join([k + str(v) for k, v in zip(keys, cpu_per_core)])
+        gpus = metrics.get("gpus")
+        if isinstance(gpus, list) and gpus:
+            gpu_fields = self.encode_gpus(gpus)
+            if gpu_fields:
+                fields += "," + gpu_fields
+        summary = metrics.get("summary")
+        if isinstance(summary, dict) and summary:
+            summary_fields = self.encode_summary(summary, metrics.get("window_samples"))
+            if summary_fields:
+                fields += "," + summary_fields
+        agent = metrics.get("agent")
+        if isinstance(agent, dict) and agent:
+            agent_fields = self.encode_agent(agent)
+            if agent_fields:
+                fields += "," + agent_fields
+        return fields
+
+    def encode(self, metrics, prefix=None, timestamp=None):
+        """Convert a metrics payload into a single line-protocol line.
+
+        ``prefix`` is a tag prefix already built for this sample, e.g. the one
+        kept with an agent session; the cache is consulted when it is None.
+        The line is stamped with ``timestamp`` (epoch seconds), by default the
+        sample's own ``timestamp`` or the current time when it has none, so
+        spooled, backfilled and batched samples keep their own point in time.
+        Raises ValueError for an unparseable timestamp or one that is not
+        finite and between MIN_TIMESTAMP and MAX_TIMESTAMP.
+        """
+        if timestamp is None:
+            timestamp = parse_time(metrics.get("timestamp"))
+        # Also false for NaN; inf and 1e400 would overflow round().
+        if not MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP:
+            raise ValueError(f"Timestamp out of range: {timestamp}")
+        line_time = round(timestamp * 1000)
+        return f"{prefix or self.tag_prefix(metrics)} {self.encode_fields(metrics)} {line_time}"
+
+    def cache_stats(self):
+        """Return tag prefix cache counters."""
+        return {
+            "size": len(self._prefixes),
+            "max_size": self.max_cached,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,112 @@
+"""Decoding of compressed and binary ingest request bodies.
+
+Bodies may be sent with ``Content-Encoding: gzip`` or ``zstd`` and as JSON or
+MessagePack, negotiated by ``Content-Type``. zstd and MessagePack need the
+optional ``zstandard`` and ``msgpack`` packages.
+"""
+
+import json
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson")
+DEFAULT_MAX_DECODED_BYTES = 10 * 1024 * 1024
+
+
+class UnsupportedPayload(ValueError):
+    """Raised for a Content-Encoding or Content-Type the server cannot decode."""
+
+
+class PayloadTooLarge(ValueError):
+    """Raised when a body decompresses to more than the allowed size."""
+
+
+def is_json_type(mimetype):
+    """Return True for application/json and application/*+json."""
+    return mimetype == "application/json" or (
+        mimetype.startswith("application/") and mimetype.endswith("+json")
+    )
+
+
+def decompress(body, content_encoding, max_bytes=DEFAULT_MAX_DECODED_BYTES):
+    """Undo ``Content-Encoding`` on a request body, refusing output over ``max_bytes``.
+
+    Output is produced incrementally and cut off at ``max_bytes``, whatever
+    size the compressed stream claims, so a small body cannot expand into a
+    large allocation.
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        return _inflate(body, encoding, max_bytes)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedPayload("zstd encoding requires the zstandard package")
+        return _unzstd(body, max_bytes)
+    raise UnsupportedPayload(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _inflate(body, encoding, max_bytes):
+    """Decode a gzip (every member, as concatenated by e.g. ``cat a.gz b.gz``) or deflate body."""
+    wbits = 16 + zlib.MAX_WBITS if encoding != "deflate" else zlib.MAX_WBITS
+    chunks = []
+    total = 0
+    while True:
+        decompressor = zlib.decompressobj(wbits)
+        try:
+            chunk = decompressor.decompress(body, max_bytes + 1 - total)
+        except zlib.error as e:
+            raise ValueError(f"Invalid {encoding} body: {e}") from e
+        total += len(chunk)
+        if total > max_bytes or decompressor.unconsumed_tail:
+            raise PayloadTooLarge(f"Decoded body exceeds {max_bytes} bytes")
+        if not decompressor.eof:
+            raise ValueError(f"Invalid {encoding} body: truncated stream")
+        chunks.append(chunk)
+        body = decompressor.unused_data
+        if not body:
+            return b"".join(chunks)
+        if encoding == "deflate":
+            raise ValueError("Invalid deflate body: trailing data")
+
+
+def _unzstd(body, max_bytes):
+    """Decode every zstd frame in a body, reading at most ``max_bytes + 1`` bytes of output."""
+    chunks = []
+    total = 0
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True) as reader:
+            while total <= max_bytes:
+                chunk = reader.read(max_bytes + 1 - total)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                total += len(chunk)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Invalid zstd body: {e}") from e
+    if total > max_bytes:
+        raise PayloadTooLarge(f"Decoded body exceeds {max_bytes} bytes")
+    return b"".join(chunks)
+
+
+def decode(body, mimetype):
+    """Decode a (decompressed) JSON or MessagePack body into Python objects."""
+    if mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedPayload("MessagePack bodies require the msgpack package")
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise ValueError(f"Invalid MessagePack body: {e}") from e
+    return json.loads(body)
@@ -0,0 +1,177 @@
+"""Segmented append-only record log with a crash-safe drain checkpoint.
+
+Shared by the server's InfluxDB spool (api_server/spool.py) and the agent's
+store-and-forward spool (edge_device/store_forward.py). The server and the
+agent are deployed as separate bundles with flat imports, so each carries
+this file; the two copies must stay byte-identical, which both test suites
+check.
+"""
+
+import json
+import os
+import threading
+
+CHECKPOINT_FILE = "checkpoint.json"
+SEGMENT_PREFIX = "segment-"
+
+
+class SegmentLog:
+    """Newline-terminated records split across numbered segment files.
+
+    Records are appended to the newest (active) segment, which is rolled over
+    once it reaches ``segment_bytes``. Readers consume from the (segment,
+    offset) position stored in ``checkpoint.json``; ``commit`` advances it with
+    a single atomic write and deletes segments that are fully drained.
+
+    Subclasses build their append and read methods on ``_append`` and
+    ``_read``, which expect ``_lock`` to be held.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, directory, suffix, segment_bytes, fsync=False):
+        self.directory = directory
+        self.suffix = suffix
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint = self._load_checkpoint()
+        segments = self._segments()
+        self._active_id = segments[-1] if segments else max(self.checkpoint[0], 1)
+        self._active = self._open_segment(self._active_id)
+        for old in segments:
+            if old < self.checkpoint[0] and old != self._active_id:
+                os.remove(self._segment_path(old))
+        self._size = sum(os.path.getsize(self._segment_path(s)) for s in self._segments())
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_id:08d}{self.suffix}")
+
+    def _open_segment(self, segment_id):
+        # Stays open for appends until _roll() or close(), so it cannot be a with block.
+        return open(self._segment_path(segment_id), "ab")  # pylint: disable=consider-using-with
+
+    def _segments(self):
+        """Return the ids of every segment on disk, oldest first."""
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(self.suffix):
+                ids.append(int(name[len(SEGMENT_PREFIX):-len(self.suffix)]))
+        return sorted(ids)
+
+    def _load_checkpoint(self):
+        """Read the (segment, offset) drain position, defaulting to the oldest segment."""
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["segment"], data["offset"]
+        except (OSError, ValueError, KeyError):
+            segments = self._segments()
+            return (segments[0] if segments else 1), 0
+
+    def _write_checkpoint(self):
+        """Persist the drain position atomically."""
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": self.checkpoint[0], "offset": self.checkpoint[1]}, f)
+        os.replace(tmp, path)
+
+    def _roll(self):
+        """Close the active segment and start a new one."""
+        self._active.close()
+        self._active_id += 1
+        self._active = self._open_segment(self._active_id)
+
+    def _remove_segment(self, segment_id):
+        """Delete a non-active segment, moving the checkpoint past it if needed.
+
+        Returns the bytes it held that had not been drained yet.
+        """
+        path = self._segment_path(segment_id)
+        size = os.path.getsize(path)
+        pending = size - (self.checkpoint[1] if self.checkpoint[0] == segment_id else 0)
+        os.remove(path)
+        self._size -= size
+        if self.checkpoint[0] <= segment_id:
+            self.checkpoint = (segment_id + 1, 0)
+            self._write_checkpoint()
+        return max(0, pending)
+
+    def size_bytes(self):
+        """Return the bytes held on disk by segments that are not yet deleted."""
+        return self._size
+
+    def pending_bytes(self):
+        """Return the bytes not yet drained past the checkpoint."""
+        with self._lock:
+            return self._size - self.checkpoint[1]
+
+    def has_pending(self):
+        """Return True while records are waiting to be drained."""
+        return self.pending_bytes() > 0
+
+    def _append(self, data):
+        """Append encoded, newline-terminated records to the active segment."""
+        if self._active.tell() >= self.segment_bytes:
+            self._roll()
+        self._active.write(data)
+        self._active.flush()
+        self._size += len(data)
+        if self.fsync:
+            os.fsync(self._active.fileno())
+
+    def _read(self, max_records, decode):
+        """Read up to ``max_records`` records from the checkpoint.
+
+        ``decode`` turns one raw line (without its newline) into a record and
+        raises ValueError for a corrupt one, which is skipped. A torn last line
+        is left for a later read. Returns the records and the position to pass
+        to ``commit`` once they have been drained.
+        """
+        segment_id, offset = self.checkpoint
+        records = []
+        while len(records) < max_records:
+            path = self._segment_path(segment_id)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break
+                        offset += len(raw)
+                        try:
+                            records.append(decode(raw[:-1]))
+                        except ValueError:
+                            continue
+                        if len(records) >= max_records:
+                            break
+            if len(records) >= max_records or segment_id >= self._active_id:
+                break
+            segment_id, offset = segment_id + 1, 0
+        return records, (segment_id, offset)
+
+    def commit(self, position):
+        """Advance the checkpoint and delete segments that are fully drained.
+
+        A position behind the checkpoint (already moved by a subclass evicting
+        segments) is ignored. When everything has been drained the log moves on
+        to a fresh segment instead of truncating the active one, so the
+        checkpoint never points past the end of a file.
+        """
+        with self._lock:
+            position = max(tuple(position), self.checkpoint)
+            if position[0] == self._active_id and position[1] >= self._active.tell():
+                self._roll()
+                position = (self._active_id, 0)
+            self.checkpoint = position
+            self._write_checkpoint()
+            for segment_id in self._segments():
+                if segment_id < position[0]:
+                    self._remove_segment(segment_id)
+
+    def close(self):
+        """Close the active segment."""
+        with self._lock:
+            self._active.close()
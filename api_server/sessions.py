@@ -0,0 +1,73 @@
+"""Agent sessions holding the static part of a device's payload.
+
+An agent registers its descriptor (device_id, hostname, device_type, tags and
+the memory/disk totals) once and then sends only ``session_id`` plus the
+fields that change. The server rehydrates samples from the session and reuses
+the tag prefix encoded at registration.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+STATIC_FIELDS = ("device_id", "hostname", "device_type", "tags", "memory_total", "disk_total")
+# Fields that make up the line-protocol tag prefix.
+PREFIX_FIELDS = ("device_id", "hostname", "device_type", "tags")
+
+
+class Session:
+    """A registered descriptor and its encoded tag prefix."""
+
+    __slots__ = ("descriptor", "prefix", "last_seen")
+
+    def __init__(self, descriptor, prefix, now):
+        self.descriptor = descriptor
+        self.prefix = prefix
+        self.last_seen = now
+
+
+class SessionStore:
+    """In-memory sessions in an LRU bounded to ``max_sessions``.
+
+    Sessions unused for ``ttl`` seconds expire. Nothing is persisted: after a
+    restart (or eviction) agents get an unknown-session error and register again.
+    """
+
+    def __init__(self, max_sessions=100000, ttl=86400):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.stats = {"registered": 0, "hits": 0, "unknown": 0, "evicted": 0}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def register(self, descriptor, prefix, now=None):
+        """Store a descriptor and its tag prefix and return the new session id."""
+        now = time.time() if now is None else now
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = Session(descriptor, prefix, now)
+            self.stats["registered"] += 1
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+        return session_id
+
+    def get(self, session_id, now=None):
+        """Return the live Session for an id, or None if unknown or expired."""
+        now = time.time() if now is None else now
+        with self._lock:
+            session = self._sessions.get(session_id) if isinstance(session_id, str) else None
+            if session is not None and now - session.last_seen > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                self.stats["unknown"] += 1
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            self.stats["hits"] += 1
+            return session
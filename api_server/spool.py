@@ -0,0 +1,108 @@
+"""Append-only, segmented on-disk spool for line-protocol lines that could not reach InfluxDB."""
+
+import threading
+import time
+
+from segment_log import SegmentLog
+
+SEGMENT_SUFFIX = ".log"
+
+
+class DiskSpool(SegmentLog):
+    """Write-ahead spool of line-protocol lines split into fixed-size segment files.
+
+    Lines are appended to the newest segment. Readers consume from the position
+    stored in ``checkpoint.json``; once a batch is written to InfluxDB the
+    checkpoint is advanced and fully drained segments are deleted. The segment
+    and checkpoint handling lives in segment_log.py.
+    """
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, max_bytes=1024 * 1024 * 1024,
+                 fsync=False):
+        super().__init__(directory, SEGMENT_SUFFIX, segment_bytes, fsync)
+        self.max_bytes = max_bytes
+
+    def append(self, lines):
+        """Append lines to the active segment. Returns False if the spool is full."""
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            if self._size + len(data) > self.max_bytes:
+                return False
+            self._append(data)
+        return True
+
+    def read_batch(self, max_lines):
+        """Read up to ``max_lines`` lines from the checkpoint.
+
+        Returns the lines and the position to pass to ``commit`` once they
+        have been written.
+        """
+        with self._lock:
+            return self._read(max_lines, lambda raw: raw.decode("utf-8"))
+
+
+class SpoolDrainer:
+    """Background thread that replays spooled lines to InfluxDB at a bounded rate.
+
+    ``write_func(lines)`` returns "stored" when the batch was written,
+    "rejected" when InfluxDB refused it for good (a 4xx: it will never be
+    accepted, so it is dropped and counted instead of blocking the spool), or
+    "failed" to retry the same batch later.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, spool, write_func, batch_size=5000, rate=20000, retry_interval=5.0,
+                 idle_interval=1.0):
+        self.spool = spool
+        self.write_func = write_func
+        self.batch_size = batch_size
+        self.rate = rate
+        self.retry_interval = retry_interval
+        self.idle_interval = idle_interval
+        self.stats = {"drained": 0, "batches": 0, "failures": 0, "rejected": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spool-drainer", daemon=True)
+
+    def start(self):
+        """Start draining in the background."""
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the drain thread."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def drain_once(self):
+        """Write one batch from the spool.
+
+        Returns the number of lines taken off the spool (written or rejected),
+        or -1 when the batch must be retried.
+        """
+        lines, position = self.spool.read_batch(self.batch_size)
+        if not lines:
+            return 0
+        outcome = self.write_func(lines)
+        if outcome == "failed":
+            self.stats["failures"] += 1
+            return -1
+        self.spool.commit(position)
+        if outcome == "rejected":
+            self.stats["rejected"] += len(lines)
+        else:
+            self.stats["drained"] += len(lines)
+            self.stats["batches"] += 1
+        return len(lines)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            drained = self.drain_once()
+            if drained == 0:
+                self._stop.wait(self.idle_interval)
+            elif drained < 0:
+                self._stop.wait(self.retry_interval)
+            else:
+                # Pace batches so the drain stays under ``rate`` lines per second.
+                elapsed = time.monotonic() - start
+                self._stop.wait(max(0.0, drained / self.rate - elapsed))
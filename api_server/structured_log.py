@@ -0,0 +1,72 @@
+"""Helpers that keep structured request logging off the ingest hot path."""
+
+import itertools
+import json
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonMessage:
+    """Log message that is only serialized to JSON when a handler formats it."""
+
+    __slots__ = ("entry",)
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __str__(self):
+        return json.dumps(self.entry)
+
+
+class EventSampler:
+    """Keeps one in N occurrences of each configured event.
+
+    ``rates`` maps event names to N; events not listed are always kept.
+    """
+
+    def __init__(self, rates=None):
+        self.rates = {event: int(n) for event, n in (rates or {}).items() if int(n) > 1}
+        self._counters = {event: itertools.count() for event in self.rates}
+
+    def keep(self, event):
+        """Return the sampling factor when this occurrence is kept, else 0."""
+        rate = self.rates.get(event)
+        if rate is None:
+            return 1
+        return rate if next(self._counters[event]) % rate == 0 else 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that drops records when it is full.
+
+    Records are queued unformatted, so JSON serialization happens on the
+    listener thread instead of in the request handler.
+    """
+
+    def __init__(self, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+def queued(handler, maxsize=10000):
+    """Wrap ``handler`` behind a DroppingQueueHandler and start its listener.
+
+    Returns ``(queue_handler, listener)``; stop the listener on shutdown to
+    flush what is still queued.
+    """
+    queue_handler = DroppingQueueHandler(maxsize)
+    listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    listener.start()
+    return queue_handler, listener
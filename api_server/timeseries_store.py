@@ -0,0 +1,184 @@
+"""Compact per-device ring buffers of recent samples for /history lookbacks."""
+
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+NAN = float("nan")
+
+
+def _number(value):
+    """Return ``value`` as a float, or NaN if it is not a finite real number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return NAN
+
+
+class DeviceSeries:
+    """Fixed-capacity ring buffer of array-backed numeric columns for one device.
+
+    Timestamps are stored as float64 epoch seconds; cpu, memory, disk and
+    per-core values as float32, so a sample costs 8 + 4 * (3 + cores) bytes.
+    Samples are kept in timestamp order, which lets range queries bisect.
+    """
+
+    COLUMNS = ("cpu", "memory", "disk")
+
+    def __init__(self, capacity, max_cores=64):
+        self.capacity = capacity
+        self.max_cores = max_cores
+        self.timestamps = array("d", [0.0]) * capacity
+        self.columns = {name: array("f", [0.0]) * capacity for name in self.COLUMNS}
+        self.cores = []
+        self.head = 0
+        self.count = 0
+        self.out_of_order = 0
+
+    def _index(self, logical):
+        """Map a position counted from the oldest sample to its slot in the ring."""
+        return (self.head - self.count + logical) % self.capacity
+
+    def _core_column(self, core):
+        while len(self.cores) <= core:
+            self.cores.append(array("f", [NAN]) * self.capacity)
+        return self.cores[core]
+
+    def append(self, timestamp, values, cpu_per_core=None):
+        """Add one sample. Samples older than the newest one stored are dropped.
+
+        Values that are not finite real numbers (None, strings, bools, inf) are
+        stored as NaN, i.e. as missing.
+        """
+        if self.count and timestamp < self.timestamps[self._index(self.count - 1)]:
+            self.out_of_order += 1
+            return False
+
+        slot = self.head
+        self.timestamps[slot] = timestamp
+        for name in self.COLUMNS:
+            self.columns[name][slot] = _number(values.get(name))
+
+        cores = cpu_per_core[:self.max_cores] if isinstance(cpu_per_core, list) else []
+        for core, value in enumerate(cores):
+            self._core_column(core)[slot] = _number(value)
+        for column in self.cores[len(cores):]:
+            column[slot] = NAN
+
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def _bisect(self, timestamp):
+        """Return the first logical position whose timestamp is >= ``timestamp``."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._index(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _row(self, slot):
+        return (
+            self.timestamps[slot],
+            [self.columns[name][slot] for name in self.COLUMNS],
+            [column[slot] for column in self.cores],
+        )
+
+    def query(self, start=None, end=None, step=None):
+        """Return points in [start, end], averaged into ``step``-second buckets when given."""
+        first = 0 if start is None else self._bisect(start)
+        last = self.count if end is None else self._bisect(math.nextafter(end, math.inf))
+        rows = (self._row(self._index(i)) for i in range(first, last))
+        if step:
+            rows = self._downsample(rows, step)
+        return [self._point(ts, values, cores) for ts, values, cores in rows]
+
+    @staticmethod
+    def _downsample(rows, step):
+        """Average rows into fixed ``step``-second buckets, ignoring missing values."""
+        bucket = None
+        sums = counts = None
+        for ts, values, cores in rows:
+            key = ts - ts % step
+            if key != bucket:
+                if bucket is not None:
+                    yield bucket, *DeviceSeries._means(sums, counts)
+                bucket = key
+                sums = [[0.0] * len(values), [0.0] * len(cores)]
+                counts = [[0] * len(values), [0] * len(cores)]
+            for group, row in enumerate((values, cores)):
+                if len(row) > len(sums[group]):
+                    sums[group].extend([0.0] * (len(row) - len(sums[group])))
+                    counts[group].extend([0] * (len(row) - len(counts[group])))
+                for i, value in enumerate(row):
+                    if not math.isnan(value):
+                        sums[group][i] += value
+                        counts[group][i] += 1
+        if bucket is not None:
+            yield bucket, *DeviceSeries._means(sums, counts)
+
+    @staticmethod
+    def _means(sums, counts):
+        return [
+            [s / c if c else NAN for s, c in zip(group_sums, group_counts)]
+            for group_sums, group_counts in zip(sums, counts)
+        ]
+
+    def _point(self, timestamp, values, cores):
+        point = {"timestamp": timestamp}
+        for name, value in zip(self.COLUMNS, values):
+            point[name] = None if math.isnan(value) else round(value, 2)
+        while cores and math.isnan(cores[-1]):
+            cores = cores[:-1]
+        if cores:
+            point["cpu_per_core"] = [None if math.isnan(v) else round(v, 2) for v in cores]
+        return point
+
+    def memory_bytes(self):
+        """Return the bytes held by the column arrays."""
+        columns = [self.timestamps, *self.columns.values(), *self.cores]
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+class TimeSeriesStore:
+    """Per-device ring buffers, bounded to ``max_devices`` least-recently-updated devices."""
+
+    def __init__(self, capacity=1440, max_devices=1000, max_cores=64):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.max_cores = max_cores
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, device_id, timestamp, metrics):
+        """Store the numeric fields of one sample for a device."""
+        values = {
+            "cpu": metrics.get("cpu_total"),
+            "memory": metrics.get("memory_percent"),
+            "disk": metrics.get("disk_percent"),
+        }
+        with self._lock:
+            series = self._series.get(device_id)
+            if series is None:
+                series = self._series[device_id] = DeviceSeries(self.capacity, self.max_cores)
+                if len(self._series) > self.max_devices:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(device_id)
+            return series.append(timestamp, values, metrics.get("cpu_per_core"))
+
+    def query(self, device_id, start=None, end=None, step=None):
+        """Return points for a device, or None if nothing is stored for it."""
+        with self._lock:
+            series = self._series.get(device_id)
+            if series is None:
+                return None
+            return series.query(start, end, step)
+
+    def memory_bytes(self):
+        """Return the bytes held by every device's column arrays."""
+        with self._lock:
+            return sum(series.memory_bytes() for series in self._series.values())
@@ -1,7 +1,26 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch
-from api_server import ApiServer
-import json
+import requests
+from api_server import ApiServer, InfluxBatchWriter
+from asgi_app import AsgiApp
+import payload_codec
+from line_protocol import LineProtocolEncoder
+from spool import DiskSpool, SpoolDrainer
+from admission import AdmissionController
+from device_index import DeviceIndex
+from sessions import SessionStore
+from instrumentation import Histogram, MetricsRegistry
+from structured_log import EventSampler, JsonMessage, queued
+from timeseries_store import DeviceSeries
+from bench_line_protocol import legacy_build_line
 
 
 class TestApiServerExtended(unittest.TestCase):
@@ -11,7 +30,7 @@ class TestApiServerExtended(unittest.TestCase):
         self.app.testing = True
         self.client = self.app.test_client()
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_receive_metrics_valid(self, mock_post):
         mock_post.return_value.status_code = 204
         mock_post.return_value.text = ""
@@ -32,7 +51,7 @@ class TestApiServerExtended(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn("Invalid JSON format", response.get_data(as_text=True))
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_influx_failure(self, mock_post):
         mock_post.return_value.status_code = 500
         mock_post.return_value.text = "Internal Server Error"
@@ -52,7 +71,7 @@ class TestApiServerExtended(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.get_json(), [])
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_history_after_push(self, mock_post):
         mock_post.return_value.status_code = 204
         mock_post.return_value.text = ""
@@ -87,6 +106,917 @@ class TestApiServerExtended(unittest.TestCase):
             self.assertEqual(last_log["status"], "PASS")
             self.assertEqual(last_log["data"], {"key": "value"})
 
+    def test_log_sampling_and_full_detail(self):
+        self.server.sampler = EventSampler({"sampled_event": 3})
+        with patch.object(self.server.logger, "log") as mock_log:
+            for _ in range(6):
+                self.server.log_action("sampled_event", {"n": 1})
+            self.server.log_action("sampled_event", {"n": 1}, status="FAIL")
+            self.server.log_action("debug_event", lambda: self.fail("built while disabled"),
+                                   level=logging.DEBUG)
+            self.assertEqual(mock_log.call_count, 3)
+            self.assertEqual(mock_log.call_args_list[0].args[1].entry["sampled"], 3)
+
+            response = self.client.post("/internal/logging", json={"full_detail": True})
+            self.assertEqual(response.get_json()["level"], "DEBUG")
+            self.server.log_action("sampled_event", {"n": 1})
+            self.server.log_action("debug_event", {"n": 1}, level=logging.DEBUG)
+            self.assertEqual(mock_log.call_count, 5)
+        self.client.post("/internal/logging", json={"full_detail": False})
+        self.assertEqual(self.server.logger.level, self.server.log_level)
+
+    def test_logging_switch_requires_loopback_or_admin_token(self):
+        remote = {"REMOTE_ADDR": "10.0.0.5"}
+        response = self.client.post("/internal/logging", json={"full_detail": True},
+                                    environ_base=remote)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.server.full_detail)
+
+        self.server.admin_token = "secret"
+        response = self.client.post("/internal/logging", json={"full_detail": True},
+                                    headers={"X-Admin-Token": "wrong"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post("/internal/logging", json={"full_detail": True},
+                                    headers={"X-Admin-Token": "secret"}, environ_base=remote)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.server.full_detail)
+        self.server.set_full_detail(False)
+
+    def test_queued_log_handler_serializes_on_listener(self):
+        records = []
+
+        class Capture(logging.Handler):
+            def emit(self, record):
+                records.append(self.format(record))
+
+        handler, listener = queued(Capture(), maxsize=1)
+        logger = logging.getLogger("queued-test")
+        logger.addHandler(handler)
+        listener.stop()  # stop draining so the queue fills up
+        logger.warning(JsonMessage({"event": "a"}))
+        logger.warning(JsonMessage({"event": "b"}))
+        self.assertEqual(handler.dropped, 1)
+        listener.start()
+        listener.stop()
+        logger.removeHandler(handler)
+        self.assertEqual(records, ['{"event": "a"}'])
+
+    def test_batch_writer_flushes_multi_line_batches(self):
+        batches = []
+        writer = InfluxBatchWriter(lambda lines: batches.append(lines) or "stored",
+                                   batch_size=3, flush_interval=0.05)
+        writer.start()
+        for i in range(7):
+            self.assertTrue(writer.submit(f"system_metrics,device_id=d{i} cpu=1"))
+        writer.stop()
+        self.assertEqual(sum(len(b) for b in batches), 7)
+        self.assertTrue(all(len(b) <= 3 for b in batches))
+        self.assertEqual(writer.stats["written"], 7)
+
+    def test_batch_writer_stop_leaves_queue_to_a_busy_flusher(self):
+        release = threading.Event()
+        batches = []
+
+        def write(lines):
+            release.wait(5)
+            batches.append(lines)
+            return "stored"
+
+        writer = InfluxBatchWriter(write, batch_size=1, flush_interval=0.01)
+        writer.start()
+        writer.submit("m cpu=1 1")
+        time.sleep(0.05)  # the flusher is now blocked writing the first line
+        writer.submit("m cpu=2 2")
+        self.assertFalse(writer.stop(timeout=0.05))
+        self.assertEqual(writer.depth(), 1)
+        release.set()
+        writer._thread.join(5)
+        self.assertEqual(batches, [["m cpu=1 1"], ["m cpu=2 2"]])
+        self.assertEqual(writer.stats["written"], 2)
+
+    def test_batch_writer_retries_failed_writes_with_backoff(self):
+        outcomes = ["failed", "failed", "stored", "rejected", "failed", "failed", "failed"]
+        batches = []
+
+        def write(lines):
+            batches.append(lines)
+            return outcomes.pop(0)
+
+        writer = InfluxBatchWriter(write, max_retries=2, retry_delay=0.01)
+        for line in ("a", "b", "c"):
+            writer._flush([line])
+        self.assertEqual(batches, [["a"]] * 3 + [["b"]] + [["c"]] * 3)
+        self.assertEqual(writer.stats["written"], 1)
+        self.assertEqual(writer.stats["refused"], 1)
+        self.assertEqual(writer.stats["failed"], 1)
+        self.assertEqual(writer.stats["retries"], 4)
+
+    @patch("requests.Session.post")
+    def test_batched_samples_from_one_device_keep_their_timestamps(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        self.server.writer = InfluxBatchWriter(self.server.write_batch)
+        for second in range(2):
+            response = self.client.post("/metrics", json={
+                "device_id": "test-device-007", "hostname": "host", "cpu_total": 10.0,
+                "memory_percent": 20.0, "disk_percent": 30.0, "timestamp": 1748883600 + second
+            })
+            self.assertEqual(response.status_code, 202)
+        self.assertTrue(self.server.writer.stop())
+        lines = mock_post.call_args.kwargs["data"].split("\n")
+        self.assertEqual([line.rsplit(" ", 1)[1] for line in lines],
+                         ["1748883600000", "1748883601000"])
+
+    @patch("requests.Session.post")
+    def test_batched_ingest_accepts_and_applies_backpressure(self, mock_post):
+        self.server.writer = InfluxBatchWriter(self.server.write_batch, queue_size=1)
+        payload = {
+            "device_id": "test-device-003",
+            "hostname": "host",
+            "cpu_total": 10.0,
+            "memory_percent": 20.0,
+            "disk_percent": 30.0
+        }
+        response = self.client.post("/metrics", json=payload)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.post("/metrics", json=payload)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        mock_post.assert_not_called()
+
+        mock_post.return_value.status_code = 204
+        self.server.writer.stop()
+        mock_post.assert_called_once()
+
+
+    @patch("requests.Session.post")
+    def test_influx_writes_reuse_pooled_session(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        payload = {
+            "device_id": "test-device-004",
+            "hostname": "host",
+            "cpu_total": 10.0,
+            "memory_percent": 20.0,
+            "disk_percent": 30.0
+        }
+        session = self.server.influx.session
+        for _ in range(3):
+            self.client.post("/metrics", json=payload)
+        self.assertIs(self.server.influx.session, session)
+        self.assertEqual(mock_post.call_count, 3)
+
+        stats = self.client.get("/internal/pool").get_json()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["pool_size"], 10)
+        self.assertTrue(stats["healthy"])
+
+    @patch("requests.Session.get", side_effect=requests.ConnectionError("down"))
+    def test_failed_health_check_resets_pool(self, _mock_get):
+        session = self.server.influx.session
+        self.assertFalse(self.server.influx.check_health())
+        self.assertIsNot(self.server.influx.session, session)
+        self.assertEqual(self.server.influx.pool_stats()["resets"], 1)
+
+
+    @patch("requests.Session.post")
+    def test_batch_endpoint_json_array(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        samples = [
+            {"device_id": f"dev-{i}", "hostname": "host", "cpu_total": 1.0,
+             "memory_percent": 2.0, "disk_percent": 3.0}
+            for i in range(3)
+        ]
+        response = self.client.post("/metrics/batch", json=samples)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["accepted"], 3)
+        mock_post.assert_called_once()
+        self.assertEqual(len(mock_post.call_args.kwargs["data"].split("\n")), 3)
+        self.assertEqual(len(self.client.get("/history").get_json()), 3)
+
+    @patch("requests.Session.post")
+    def test_batch_endpoint_ndjson_per_item_results(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        body = "\n".join([
+            json.dumps({"device_id": "a", "hostname": "h", "cpu_total": 1.0,
+                        "memory_percent": 2.0, "disk_percent": 3.0}),
+            json.dumps({"device_id": "b", "hostname": "h"}),
+            "{not json",
+        ])
+        response = self.client.post("/metrics/batch", data=body,
+                                    content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 207)
+        results = response.get_json()["results"]
+        self.assertEqual([r["status"] for r in results], ["ok", "invalid", "invalid"])
+        self.assertEqual(results[1]["error"], "Missing fields")
+
+    def test_batch_endpoint_rejects_non_array(self):
+        response = self.client.post("/metrics/batch", json={"device_id": "a"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/metrics/batch", data="[{not json",
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Invalid JSON format")
+
+    @patch("requests.Session.post")
+    def test_batch_samples_from_one_device_keep_their_timestamps(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        samples = [
+            {"device_id": "dev-1", "hostname": "host", "cpu_total": float(i),
+             "memory_percent": 2.0, "disk_percent": 3.0, "timestamp": 1748883600 + 10 * i}
+            for i in range(3)
+        ]
+        response = self.client.post("/metrics/batch", json=samples)
+        self.assertEqual(response.status_code, 200)
+        lines = mock_post.call_args.kwargs["data"].split("\n")
+        self.assertEqual([line.rsplit(" ", 1)[1] for line in lines],
+                         ["1748883600000", "1748883610000", "1748883620000"])
+
+    @patch("requests.Session.post")
+    def test_out_of_range_timestamps_are_rejected_per_item(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        sample = {"device_id": "dev-1", "hostname": "host", "cpu_total": 1.0,
+                  "memory_percent": 2.0, "disk_percent": 3.0}
+        for timestamp in ("inf", "1e400", "nan", 1e300, 1748883600000, -5):
+            response = self.client.post("/metrics", json=dict(sample, timestamp=timestamp))
+            self.assertEqual(response.status_code, 400, timestamp)
+        mock_post.assert_not_called()
+
+        response = self.client.post("/metrics/batch", json=[
+            dict(sample, timestamp="1e400"),
+            dict(sample, timestamp=1748883600000),
+            dict(sample, timestamp=1748883600),
+        ])
+        self.assertEqual(response.status_code, 207)
+        statuses = [r["status"] for r in response.get_json()["results"]]
+        self.assertEqual(statuses, ["invalid", "invalid", "ok"])
+        self.assertEqual(mock_post.call_args.kwargs["data"].rsplit(" ", 1)[1], "1748883600000")
+
+    @patch("requests.Session.post")
+    def test_store_failure_does_not_change_the_response(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        sample = {"device_id": "dev-1", "hostname": "host", "cpu_total": 1.0,
+                  "memory_percent": 2.0, "disk_percent": 3.0, "cpu_per_core": [None, 5.0]}
+        with patch.object(self.server.history, "append", side_effect=TypeError("boom")):
+            self.assertEqual(self.client.post("/metrics", json=sample).status_code, 200)
+            response = self.client.post("/metrics/batch", json=[sample])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch("requests.Session.post", side_effect=requests.ConnectionError("refused"))
+    def test_influx_outage_spools_and_acks(self, mock_post):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            self.server.spool = DiskSpool(spool_dir)
+            payload = {
+                "device_id": "test-device-005",
+                "hostname": "host",
+                "cpu_total": 10.0,
+                "memory_percent": 20.0,
+                "disk_percent": 30.0
+            }
+            response = self.client.post("/metrics", json=payload)
+            self.assertEqual(response.status_code, 202)
+            self.assertIn("Metrics spooled", response.get_data(as_text=True))
+
+            # While the backlog drains, new samples queue behind it without touching InfluxDB.
+            response = self.client.post("/metrics", json=payload)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(mock_post.call_count, 1)
+
+            mock_post.side_effect = None
+            mock_post.return_value.status_code = 204
+            drainer = SpoolDrainer(self.server.spool, self.server.write_spooled)
+            self.assertEqual(drainer.drain_once(), 2)
+            self.assertFalse(self.server.spool.has_pending())
+            self.server.spool.close()
+
+    @patch("requests.Session.post", side_effect=requests.ConnectionError("refused"))
+    def test_spool_drain_keeps_sample_timestamps(self, mock_post):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            self.server.spool = DiskSpool(spool_dir)
+            for second in range(3):
+                response = self.client.post("/metrics", json={
+                    "device_id": "test-device-006",
+                    "hostname": "host",
+                    "cpu_total": 10.0 + second,
+                    "memory_percent": 20.0,
+                    "disk_percent": 30.0,
+                    "timestamp": f"2025-06-02T17:00:0{second}+00:00"
+                })
+                self.assertEqual(response.status_code, 202)
+
+            mock_post.side_effect = None
+            mock_post.return_value.status_code = 204
+            drainer = SpoolDrainer(self.server.spool, self.server.write_spooled)
+            self.assertEqual(drainer.drain_once(), 3)
+            lines = mock_post.call_args.kwargs["data"].split("\n")
+            self.assertEqual([line.rsplit(" ", 1)[1] for line in lines],
+                             ["1748883600000", "1748883601000", "1748883602000"])
+            self.assertTrue(mock_post.call_args.args[0].endswith("&precision=ms"))
+            self.server.spool.close()
+
+    @patch("requests.Session.post", side_effect=requests.ConnectionError("refused"))
+    def test_spool_drops_batch_influx_rejects(self, mock_post):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            self.server.spool = DiskSpool(spool_dir)
+            self.server.spool.append(['system_metrics,device_id=d cpu_total="bogus" 0'])
+            drainer = SpoolDrainer(self.server.spool, self.server.write_spooled)
+
+            mock_post.side_effect = None
+            mock_post.return_value.status_code = 503
+            mock_post.return_value.text = "busy"
+            self.assertEqual(drainer.drain_once(), -1)
+            self.assertTrue(self.server.spool.has_pending())
+
+            mock_post.return_value.status_code = 400
+            mock_post.return_value.text = "field type conflict"
+            self.assertEqual(drainer.drain_once(), 1)
+            self.assertFalse(self.server.spool.has_pending())
+            self.assertEqual(drainer.stats["rejected"], 1)
+            self.assertEqual(drainer.stats["failures"], 1)
+
+            mock_post.return_value.status_code = 204
+            response = self.client.post("/metrics", json={
+                "device_id": "d", "hostname": "h", "cpu_total": 1.0,
+                "memory_percent": 2.0, "disk_percent": 3.0
+            })
+            self.assertEqual(response.status_code, 200)
+            self.server.spool.close()
+
+
+    @patch("requests.Session.post")
+    def test_devices_endpoints_track_each_device(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        for device_id, cpu in (("dev-a", 10.0), ("dev-b", 20.0), ("dev-a", 30.0)):
+            self.client.post("/metrics", json={
+                "device_id": device_id, "hostname": "host", "cpu_total": cpu,
+                "memory_percent": 1.0, "disk_percent": 2.0
+            })
+        devices = self.client.get("/devices").get_json()
+        self.assertEqual(devices["count"], 2)
+        self.assertEqual(devices["devices"][0]["device_id"], "dev-a")
+
+        latest = self.client.get("/devices/dev-a/latest").get_json()
+        self.assertEqual(latest["samples"], 2)
+        self.assertEqual(latest["metrics"]["cpu_total"], 30.0)
+        self.assertEqual(self.client.get("/devices/missing/latest").status_code, 404)
+        self.assertEqual(self.client.get("/status").get_json()["devices"], 2)
+
+
+    @patch("requests.Session.post")
+    def test_history_device_range_and_downsample(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        for second, cpu in ((0, 10.0), (5, 20.0), (10, 30.0), (15, 50.0)):
+            self.client.post("/metrics", json={
+                "device_id": "dev-h", "hostname": "host", "cpu_total": cpu,
+                "cpu_per_core": [cpu, cpu / 2], "memory_percent": 1.0, "disk_percent": 2.0,
+                "timestamp": f"2025-06-02T17:00:{second:02d}+00:00"
+            })
+        start = ApiServer.parse_time("2025-06-02T17:00:05+00:00")
+        response = self.client.get(f"/history?device=dev-h&start={start}")
+        points = response.get_json()["points"]
+        self.assertEqual([p["cpu"] for p in points], [20.0, 30.0, 50.0])
+
+        response = self.client.get("/history?device=dev-h&step=10")
+        points = response.get_json()["points"]
+        self.assertEqual([p["cpu"] for p in points], [15.0, 40.0])
+        self.assertEqual(points[1]["cpu_per_core"], [40.0, 20.0])
+
+        self.assertEqual(self.client.get("/history?device=nope").status_code, 404)
+        self.assertEqual(self.client.get("/history?step=10").status_code, 400)
+
+
+    @patch("requests.Session.post")
+    def test_gzip_json_body_accepted(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        body = gzip.compress(json.dumps({
+            "device_id": "gz", "hostname": "h", "cpu_total": 1.0,
+            "memory_percent": 2.0, "disk_percent": 3.0
+        }).encode())
+        response = self.client.post("/metrics", data=body, content_type="application/json",
+                                    headers={"Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("device_id=gz", mock_post.call_args.kwargs["data"])
+
+    def test_unsupported_encoding_and_oversized_body(self):
+        response = self.client.post("/metrics", data=b"{}", content_type="application/json",
+                                    headers={"Content-Encoding": "br"})
+        self.assertEqual(response.status_code, 415)
+
+        self.server.max_decoded_bytes = 100
+        body = gzip.compress(b"[" + b" " * 1000 + b"]")
+        response = self.client.post("/metrics/batch", data=body, content_type="application/json",
+                                    headers={"Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 413)
+
+    @unittest.skipIf(payload_codec.zstandard is None, "zstandard not installed")
+    def test_zstd_frame_declaring_its_size_is_capped(self):
+        body = payload_codec.zstandard.ZstdCompressor().compress(b" " * (50 * 1024 * 1024))
+        with self.assertRaises(payload_codec.PayloadTooLarge):
+            payload_codec.decompress(body, "zstd", max_bytes=1024)
+        frames = b"".join(payload_codec.zstandard.ZstdCompressor().compress(part)
+                          for part in (b"[1,", b"2]"))
+        self.assertEqual(payload_codec.decompress(frames, "zstd"), b"[1,2]")
+
+    def test_multi_member_gzip_body_is_fully_decoded(self):
+        body = gzip.compress(b"[1,") + gzip.compress(b"2]")
+        self.assertEqual(payload_codec.decompress(body, "gzip"), b"[1,2]")
+        with self.assertRaises(payload_codec.PayloadTooLarge):
+            payload_codec.decompress(body, "gzip", max_bytes=4)
+        with self.assertRaises(ValueError):
+            payload_codec.decompress(body[:-4], "gzip")
+
+    @unittest.skipIf(payload_codec.msgpack is None, "msgpack not installed")
+    @patch("requests.Session.post")
+    def test_msgpack_batch_body(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        body = payload_codec.msgpack.packb([{
+            "device_id": "mp", "hostname": "h", "cpu_total": 1.0,
+            "memory_percent": 2.0, "disk_percent": 3.0
+        }])
+        response = self.client.post("/metrics/batch", data=body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["accepted"], 1)
+
+
+    @patch("requests.Session.post")
+    def test_rate_limit_is_per_device(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        self.server.admission = AdmissionController(rate=0.001, burst=2)
+        payload = {
+            "device_id": "noisy", "hostname": "h", "cpu_total": 1.0,
+            "memory_percent": 2.0, "disk_percent": 3.0
+        }
+        statuses = [self.client.post("/metrics", json=payload).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.post("/metrics", json=dict(payload, device_id="quiet"))
+        self.assertEqual(response.status_code, 200)
+
+    @patch("requests.Session.post")
+    def test_sheds_load_when_writer_queue_saturated(self, mock_post):
+        self.server.writer = InfluxBatchWriter(self.server.write_batch, queue_size=2)
+        self.server.writer.submit("m cpu=1")
+        self.server.writer.submit("m cpu=2")
+        response = self.client.post("/metrics", json={"device_id": "d"})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(self.server.admission.stats["shed"], 1)
+        mock_post.assert_not_called()
+        instruments = self.server.instruments
+        self.assertEqual(instruments.requests.labels("/metrics").value, 1)
+        self.assertEqual(instruments.samples.labels("rejected").value, 1)
+
+    def test_rejected_bodies_are_counted(self):
+        response = self.client.post("/metrics/batch", data=b"[]", content_type="application/json",
+                                    headers={"Content-Encoding": "br"})
+        self.assertEqual(response.status_code, 415)
+        response = self.client.post("/metrics", data=b"{not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        instruments = self.server.instruments
+        self.assertEqual(instruments.requests.labels("/metrics/batch").value, 1)
+        self.assertEqual(instruments.requests.labels("/metrics").value, 1)
+        self.assertEqual(instruments.samples.labels("invalid").value, 2)
+
+
+    @patch("requests.Session.post")
+    def test_session_samples_are_rehydrated(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        response = self.client.post("/sessions", json={
+            "device_id": "sess-1", "hostname": "host", "device_type": "edge",
+            "tags": {"env": "prod"}, "memory_total": 8192, "disk_total": 65536
+        })
+        self.assertEqual(response.status_code, 201)
+        session_id = response.get_json()["session_id"]
+
+        response = self.client.post("/metrics", json={
+            "session_id": session_id, "cpu_total": 5.0, "memory_percent": 6.0, "disk_percent": 7.0,
+            "timestamp": 1748883600
+        })
+        self.assertEqual(response.status_code, 200)
+        line = mock_post.call_args.kwargs["data"]
+        self.assertEqual(line, self.server.build_line({
+            "device_id": "sess-1", "hostname": "host", "device_type": "edge",
+            "tags": {"env": "prod"}, "memory_total": 8192, "disk_total": 65536,
+            "cpu_total": 5.0, "memory_percent": 6.0, "disk_percent": 7.0, "timestamp": 1748883600
+        }))
+        self.assertEqual(self.server.devices.get("sess-1")["metrics"]["memory_total"], 8192)
+
+        response = self.client.post("/metrics", json={
+            "session_id": "restarted", "cpu_total": 5.0, "memory_percent": 6.0, "disk_percent": 7.0
+        })
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post("/metrics/batch", json=[
+            {"session_id": session_id, "cpu_total": 1.0, "memory_percent": 2.0,
+             "disk_percent": 3.0},
+            {"session_id": "restarted", "cpu_total": 1.0, "memory_percent": 2.0,
+             "disk_percent": 3.0},
+        ])
+        self.assertEqual(response.status_code, 207)
+        statuses = [r["status"] for r in response.get_json()["results"]]
+        self.assertEqual(statuses, ["ok", "unknown_session"])
+
+    def test_session_registration_is_rate_limited(self):
+        self.server.admission = AdmissionController(rate=0.001, burst=2)
+        descriptor = {"device_id": "looping", "hostname": "host"}
+        statuses = [self.client.post("/sessions", json=descriptor).status_code for _ in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(len(self.server.sessions), 2)
+
+    def test_session_registration_requires_identity(self):
+        response = self.client.post("/sessions", json={"hostname": "host"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestSessionStore(unittest.TestCase):
+    def test_evicts_least_recent_and_expires_idle_sessions(self):
+        store = SessionStore(max_sessions=2, ttl=100)
+        a = store.register({"device_id": "a"}, "p,a", now=0)
+        b = store.register({"device_id": "b"}, "p,b", now=0)
+        self.assertEqual(store.get(a, now=50).prefix, "p,a")
+        store.register({"device_id": "c"}, "p,c", now=60)
+        self.assertIsNone(store.get(b, now=60))
+        self.assertIsNotNone(store.get(a, now=140))
+        self.assertIsNone(store.get(a, now=241))
+        self.assertEqual(store.stats["evicted"], 1)
+        self.assertEqual(len(store), 1)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), ([2, 3, 4], 3.65, 4))
+
+    def test_renders_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests.", ("route",)).labels('/a"b').inc(2)
+        registry.histogram("latency_seconds", "Latency.", buckets=(0.5,)).observe(0.25)
+        registry.gauge("depth", "Depth.", lambda: 7)
+        text = registry.render()
+        self.assertIn('requests_total{route="/a\\"b"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="0.5"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("latency_seconds_count 1", text)
+        self.assertIn("# TYPE depth gauge\ndepth 7", text)
+
+    @patch("requests.Session.post")
+    def test_ingest_path_is_instrumented(self, mock_post):
+        server = ApiServer()
+        client = server.app.test_client()
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        client.post("/metrics", json={"device_id": "inst", "hostname": "h", "cpu_total": 1.0,
+                                      "memory_percent": 2.0, "disk_percent": 3.0})
+        client.post("/metrics", json={"device_id": "inst"})
+        mock_post.side_effect = requests.ConnectionError("down")
+        client.post("/metrics", json={"device_id": "inst", "hostname": "h", "cpu_total": 1.0,
+                                      "memory_percent": 2.0, "disk_percent": 3.0})
+
+        response = client.get("/internal/metrics")
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.get_data(as_text=True)
+        self.assertIn('api_ingest_requests_total{route="/metrics"} 3', text)
+        self.assertIn('api_ingest_samples_total{outcome="ok"} 1', text)
+        self.assertIn('api_ingest_samples_total{outcome="invalid"} 1', text)
+        self.assertIn('api_influx_write_failures_total{reason="unreachable"} 1', text)
+        self.assertIn("api_influx_write_seconds_count 2", text)
+        self.assertIn("api_line_encode_seconds_count 2", text)
+        self.assertIn("api_ingest_parse_seconds_count 3", text)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_bucket_refills_over_time(self):
+        now = [0.0]
+        controller = AdmissionController(rate=1.0, burst=1, clock=lambda: now[0])
+        self.assertEqual(controller.admit("a"), 0.0)
+        self.assertAlmostEqual(controller.admit("a"), 1.0)
+        now[0] = 1.0
+        self.assertEqual(controller.admit("a"), 0.0)
+
+    def test_latency_shedding_ignores_stale_signal(self):
+        now = [100.0]
+        controller = AdmissionController(shed_latency_ms=500, latency_window=10,
+                                          clock=lambda: now[0])
+        influx = type("Influx", (), {"last_write_at": 95.0, "latency_ewma_ms": 900.0})()
+        self.assertIsNotNone(controller.shed_reason(influx=influx))
+        now[0] = 200.0
+        self.assertIsNone(controller.shed_reason(influx=influx))
+
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        self.server = ApiServer()
+        self.app = AsgiApp(self.server)
+
+    def request(self, method, path, body=b"", content_type="application/json", query=b"",
+                client=("127.0.0.1", 50000), headers=()):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query,
+            "headers": [(b"content-type", content_type.encode()), *headers],
+            "client": client,
+        }
+        asyncio.run(self.app(scope, receive, send))
+        status = messages[0]["status"]
+        return status, messages[1]["body"]
+
+    @patch("requests.Session.post")
+    def test_metrics_and_history_routes(self, mock_post):
+        mock_post.return_value.status_code = 204
+        mock_post.return_value.text = ""
+        payload = {
+            "device_id": "asgi-device",
+            "hostname": "host",
+            "cpu_total": 12.0,
+            "memory_percent": 34.0,
+            "disk_percent": 56.0
+        }
+        status, body = self.request("POST", "/metrics", json.dumps(payload).encode())
+        self.assertEqual(status, 200)
+        self.assertIn("Metrics stored successfully", body.decode())
+        mock_post.assert_called_once()
+
+        status, body = self.request("GET", "/history")
+        self.assertEqual(len(json.loads(body)), 1)
+        status, body = self.request("GET", "/status")
+        self.assertEqual(json.loads(body)["devices"], 1)
+        self.assertEqual(self.request("GET", "/health"), (200, b"OK"))
+
+    def test_invalid_json_rejected(self):
+        status, body = self.request("POST", "/metrics", b"not json", content_type="text/plain")
+        self.assertEqual(status, 400)
+        self.assertIn("Invalid JSON format", body.decode())
+        status, body = self.request("POST", "/metrics/batch", b"[{not json")
+        self.assertEqual(status, 400)
+        self.assertIn("Invalid JSON format", body.decode())
+
+    @patch("requests.Session.post")
+    def test_batch_route_with_queued_writer(self, mock_post):
+        self.server.writer = InfluxBatchWriter(self.server.write_batch)
+        body = b"\n".join(json.dumps({
+            "device_id": f"d{i}", "hostname": "h", "cpu_total": 1.0,
+            "memory_percent": 2.0, "disk_percent": 3.0
+        }).encode() for i in range(2))
+        status, response = self.request("POST", "/metrics/batch", body,
+                                        content_type="application/x-ndjson")
+        self.assertEqual(status, 202)
+        self.assertEqual(json.loads(response)["accepted"], 2)
+        mock_post.assert_not_called()
+
+
+    @patch("requests.Session.post")
+    def test_disconnect_mid_body_drops_the_request(self, mock_post):
+        messages = [
+            {"type": "http.request", "body": b'{"device_id": "asgi-device", ', "more_body": True},
+            {"type": "http.disconnect"},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/metrics", "query_string": b"",
+                 "headers": [(b"content-type", b"application/json")]}
+        asyncio.run(self.app(scope, receive, send))
+        self.assertEqual(sent, [])
+        mock_post.assert_not_called()
+        self.assertEqual(self.server.instruments.requests.labels("/metrics").value, 0)
+
+    def test_bodies_are_decoded_off_the_event_loop(self):
+        threads = []
+        decode_body = self.server.decode_body
+
+        def recording_decode(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return decode_body(*args, **kwargs)
+
+        with patch.object(self.server, "decode_body", side_effect=recording_decode):
+            self.request("POST", "/metrics", b"{}")
+            self.request("POST", "/metrics/batch", b"[]")
+            self.request("POST", "/sessions", b"{}")
+        self.assertEqual(len(threads), 3)
+        self.assertTrue(all(name.startswith("influx-write") for name in threads))
+
+    def test_shed_and_rejected_requests_are_counted(self):
+        self.server.writer = InfluxBatchWriter(self.server.write_batch, queue_size=1)
+        self.server.writer.submit("m cpu=1")
+        status, _ = self.request("POST", "/metrics", b"{}")
+        self.assertEqual(status, 503)
+        self.server.writer = None
+        status, _ = self.request("POST", "/metrics/batch", b"[]",
+                                 headers=[(b"content-encoding", b"br")])
+        self.assertEqual(status, 415)
+        instruments = self.server.instruments
+        self.assertEqual(instruments.requests.labels("/metrics").value, 1)
+        self.assertEqual(instruments.requests.labels("/metrics/batch").value, 1)
+        self.assertEqual(instruments.samples.labels("rejected").value, 1)
+        self.assertEqual(instruments.samples.labels("invalid").value, 1)
+
+    def test_logging_route_is_admin_only(self):
+        body = json.dumps({"full_detail": True}).encode()
+        status, _ = self.request("POST", "/internal/logging", body, client=("10.0.0.5", 50000))
+        self.assertEqual(status, 403)
+        self.assertFalse(self.server.full_detail)
+
+        status, response = self.request("POST", "/internal/logging", body)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(response)["level"], "DEBUG")
+        status, response = self.request("GET", "/internal/logging")
+        self.assertTrue(json.loads(response)["full_detail"])
+        self.server.set_full_detail(False)
+
+    def test_session_route(self):
+        status, body = self.request("POST", "/sessions", json.dumps({
+            "device_id": "asgi-device", "hostname": "host"
+        }).encode())
+        self.assertEqual(status, 201)
+        self.assertIsNotNone(self.server.sessions.get(json.loads(body)["session_id"]))
+
+
+class TestDeviceSeries(unittest.TestCase):
+    def test_ring_buffer_wraps_and_stays_ordered(self):
+        series = DeviceSeries(capacity=3)
+        for ts in range(5):
+            series.append(float(ts), {"cpu": ts, "memory": 1.0, "disk": 2.0})
+        self.assertEqual([p["timestamp"] for p in series.query()], [2.0, 3.0, 4.0])
+        self.assertEqual([p["timestamp"] for p in series.query(start=3, end=3)], [3.0])
+        self.assertFalse(series.append(1.0, {"cpu": 1.0}))
+        self.assertEqual(series.memory_bytes(), 3 * (8 + 3 * 4))
+
+    def test_non_numeric_values_are_stored_as_missing(self):
+        series = DeviceSeries(capacity=2)
+        self.assertTrue(series.append(1.0, {"cpu": "50", "memory": True, "disk": 2.0},
+                                      cpu_per_core=[None, 10.0, "x"]))
+        self.assertEqual(series.query(), [{
+            "timestamp": 1.0, "cpu": None, "memory": None, "disk": 2.0,
+            "cpu_per_core": [None, 10.0]
+        }])
+
+
+class TestDeviceIndex(unittest.TestCase):
+    def test_evicts_stale_and_excess_devices(self):
+        index = DeviceIndex(max_devices=2, stale_after=100)
+        index.record("a", {"cpu_total": 1}, now=0)
+        index.record("b", {"cpu_total": 1}, now=10)
+        index.record("c", {"cpu_total": 1}, now=20)
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.get("a"))
+        index.record("d", {"cpu_total": 1}, now=115)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.evicted, 2)
+
+    def test_older_sample_does_not_replace_latest(self):
+        index = DeviceIndex()
+        index.record("a", {"cpu_total": 2}, sample_time=200.0)
+        index.record("a", {"cpu_total": 1}, sample_time=100.0)  # backfilled
+        state = index.get("a")
+        self.assertEqual(state["metrics"], {"cpu_total": 2})
+        self.assertEqual(state["samples"], 2)
+        index.record("a", {"cpu_total": 3}, sample_time=300.0)
+        self.assertEqual(index.get("a")["metrics"], {"cpu_total": 3})
+
+
+class TestDiskSpool(unittest.TestCase):
+    def test_segments_checkpoint_and_reopen(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = DiskSpool(spool_dir, segment_bytes=32)
+            for i in range(10):
+                self.assertTrue(spool.append([f"m,device_id=d{i} cpu={i}"]))
+            lines, position = spool.read_batch(4)
+            self.assertEqual(lines[0], "m,device_id=d0 cpu=0")
+            spool.commit(position)
+            spool.close()
+
+            reopened = DiskSpool(spool_dir, segment_bytes=32)
+            lines, position = reopened.read_batch(100)
+            self.assertEqual(len(lines), 6)
+            self.assertEqual(lines[0], "m,device_id=d4 cpu=4")
+            reopened.commit(position)
+            self.assertFalse(reopened.has_pending())
+            reopened.close()
+
+    def test_full_drain_moves_checkpoint_to_a_fresh_segment(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = DiskSpool(spool_dir)
+            spool.append(["m cpu=1 1", "m cpu=2 2"])
+            _, position = spool.read_batch(10)
+            with patch("segment_log.os.remove", side_effect=OSError("crashed")):
+                with self.assertRaises(OSError):
+                    spool.commit(position)  # dies after the checkpoint, before cleanup
+            spool.close()
+
+            reopened = DiskSpool(spool_dir)
+            self.assertEqual(reopened.pending_bytes(), 0)
+            reopened.append(["m cpu=3 3"])
+            lines, position = reopened.read_batch(10)
+            self.assertEqual(lines, ["m cpu=3 3"])
+            reopened.commit(position)
+            self.assertEqual(reopened.pending_bytes(), 0)
+            reopened.close()
+
+    def test_append_refused_when_full(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = DiskSpool(spool_dir, max_bytes=20)
+            self.assertTrue(spool.append(["m cpu=1"]))
+            self.assertFalse(spool.append(["m cpu=2", "m cpu=3"]))
+            spool.close()
+
+    def test_segment_log_matches_the_agent_copy(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        agent_copy = os.path.join(here, "..", "edge_device", "segment_log.py")
+        if not os.path.exists(agent_copy):
+            self.skipTest("edge_device bundle not present")
+        with open(os.path.join(here, "segment_log.py"), "rb") as ours, open(agent_copy, "rb") as theirs:
+            self.assertEqual(ours.read(), theirs.read())
+
+
+class TestLineProtocolEncoder(unittest.TestCase):
+    SAMPLE = {
+        "device_id": "edge-1",
+        "hostname": "My Host",
+        "cpu_total": 27.8,
+        "cpu_per_core": [33.3, 0.0],
+        "memory_percent": 81.1,
+        "memory_total": 8589934592,
+        "disk_percent": 38.1,
+        "tags": {"location": "store 101", "zone": "a,b"}
+    }
+
+    def test_matches_legacy_encoding(self):
+        encoder = LineProtocolEncoder()
+        expected = legacy_build_line(dict(self.SAMPLE, tags=dict(self.SAMPLE["tags"])))
+        sample = dict(self.SAMPLE, timestamp="2025-06-02T17:00:05.250000+00:00")
+        self.assertEqual(encoder.encode(sample), expected + " 1748883605250")
+        self.assertEqual(encoder.encode(self.SAMPLE, timestamp=1.5), expected + " 1500")
+        self.assertEqual(encoder.cache_stats()["hits"], 1)
+        self.assertNotIn("device_id", self.SAMPLE["tags"])
+
+    def test_tag_cache_is_bounded(self):
+        encoder = LineProtocolEncoder(max_cached=2)
+        for i in range(5):
+            encoder.encode(dict(self.SAMPLE, device_id=f"edge-{i}"))
+        self.assertEqual(encoder.cache_stats()["size"], 2)
+        self.assertEqual(encoder.cache_stats()["misses"], 5)
+
+    def test_encodes_per_gpu_fields(self):
+        encoder = LineProtocolEncoder()
+        sample = dict(self.SAMPLE, gpus=[
+            {"index": 0, "utilization": 87.0, "memory_used": 2048.0, "temperature": 71.0},
+            {"index": 1, "utilization": "high"},
+            {"index": "x; drop", "utilization": 1.0},
+        ])
+        line = encoder.encode(sample)
+        self.assertTrue(line.rsplit(" ", 1)[0].endswith(
+            ",cpu_core_1=0.0,gpu_0_utilization=87.0,gpu_0_memory_used=2048.0,gpu_0_temperature=71.0"
+        ))
+        self.assertNotIn("gpu_1", line)
+
+    def test_encodes_agent_self_telemetry_fields(self):
+        line = LineProtocolEncoder().encode(dict(self.SAMPLE, agent={
+            "collector_cpu_ms": 0.42, "log_ms": 0.05, "rss_bytes": 31457280,
+            "Bad Key": 1, "flag": True, "note": "x",
+        }))
+        self.assertTrue(line.rsplit(" ", 1)[0].endswith(
+            ",agent_collector_cpu_ms=0.42,agent_log_ms=0.05,agent_rss_bytes=31457280"
+        ))
+
+    def test_encodes_window_summary_fields(self):
+        encoder = LineProtocolEncoder()
+        sample = dict(self.SAMPLE, window_samples=60, summary={
+            "cpu_total": {"min": 3.0, "max": 97.5, "mean": 20.1, "p95": 88.0},
+            "cpu_core_0": {"max": 100.0},
+            "bad name=1": {"max": 1.0},
+        })
+        line = encoder.encode(sample)
+        self.assertIn(",cpu_min=3.0,cpu_max=97.5,cpu_mean=20.1,cpu_p95=88.0,cpu_core_0_max=100.0,"
+                      "window_samples=60", line)
+        self.assertNotIn("bad", line)
+
 
 if __name__ == "__main__":
     unittest.main()
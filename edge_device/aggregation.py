@@ -0,0 +1,228 @@
+"""
+aggregation.py
+
+Windowed aggregation between collection and push: sample fast, send one
+summary per window. Each numeric field keeps a running min, max and mean and
+an approximate p95 (P-squared estimator), all in constant memory, so short
+spikes survive even though only one payload per window is pushed.
+"""
+
+import math
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Scalar payload fields summarised by default; per-core CPU and per-GPU readings
+# are summarised as cpu_core_<i> and gpu_<index>_<key>.
+DEFAULT_FIELDS = (
+    "cpu_total", "memory_percent", "memory_used", "disk_percent", "disk_used", "battery_percent",
+)
+GPU_FIELDS = ("utilization", "memory_utilization", "memory_used", "temperature", "power_draw")
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate with the P-squared algorithm (Jain & Chlamtac,
+    1985): five markers whose heights are adjusted with piecewise-parabolic
+    interpolation, so memory and per-observation cost are constant.
+    """
+
+    def __init__(self, quantile: float = 0.95):
+        self.quantile = quantile
+        self._heights: List[float] = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0.0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4.0]
+        self._increments = [0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0]
+
+    def add(self, value: float):
+        """
+        Add one observation.
+        """
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if ((delta >= 1 and positions[i + 1] - positions[i] > 1)
+                    or (delta <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if delta > 0 else -1
+                candidate = self._parabolic(i, step)
+                if heights[i - 1] < candidate < heights[i + 1]:
+                    heights[i] = candidate
+                else:
+                    heights[i] += step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i]
+                    )
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        """
+        Return the current estimate (exact nearest-rank for fewer than five observations).
+        """
+        heights = self._heights
+        if not heights:
+            return None
+        if len(heights) < 5:
+            return heights[max(0, math.ceil(self.quantile * len(heights)) - 1)]
+        return heights[2]
+
+
+class FieldSummary:
+    """
+    Running min/max/mean and p95 for one field.
+    """
+
+    __slots__ = ("minimum", "maximum", "total", "count", "p95")
+
+    def __init__(self):
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+        self.count = 0
+        self.p95 = P2Quantile(0.95)
+
+    def add(self, value: float):
+        """
+        Fold one observation into the summary.
+        """
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.total += value
+        self.count += 1
+        self.p95.add(value)
+
+    def result(self) -> Dict[str, float]:
+        """
+        Return the summary statistics, rounded to two decimals.
+        """
+        return {
+            "min": round(self.minimum, 2),
+            "max": round(self.maximum, 2),
+            "mean": round(self.total / self.count, 2),
+            "p95": round(self.p95.value(), 2),
+        }
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class WindowAggregator:
+    """
+    Folds every collected sample into per-field summaries and emits one payload
+    per window: the last sample (so the raw fields carry each field's last value)
+    plus a `summary` {field: {min, max, mean, p95}} and the number of samples in
+    the window.
+
+    A window closes after `window_samples` samples or, with `window_seconds`,
+    on the first sample at least that many seconds after the window opened, so
+    its length does not depend on how often the agent ticks or how many ticks
+    it missed.
+    """
+
+    def __init__(
+        self,
+        window_samples: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        window_seconds: Optional[float] = None,
+        clock=time.monotonic
+    ):
+        """
+        :param window_samples: Samples folded into each pushed summary
+        :param fields: Scalar payload fields to summarise (defaults to DEFAULT_FIELDS)
+        :param window_seconds: Elapsed time covered by each pushed summary
+        :param clock: Monotonic clock used when add() is not given the sample time
+        """
+        if window_samples is None and window_seconds is None:
+            window_samples = 1
+        self.window_samples = max(1, int(window_samples)) if window_samples is not None else None
+        self.window_seconds = window_seconds
+        self.fields = tuple(fields or DEFAULT_FIELDS)
+        self.clock = clock
+        self._summaries: Dict[str, FieldSummary] = {}
+        self._count = 0
+        self._opened: Optional[float] = None
+
+    def _values(self, metrics: Dict):
+        """
+        Yield (summary key, value) for every numeric value to summarise.
+        """
+        for field in self.fields:
+            value = metrics.get(field)
+            if _is_number(value):
+                yield field, value
+        per_core = metrics.get("cpu_per_core")
+        if isinstance(per_core, list):
+            for index, value in enumerate(per_core):
+                if _is_number(value):
+                    yield f"cpu_core_{index}", value
+        gpus = metrics.get("gpus")
+        if isinstance(gpus, list):
+            for gpu in gpus:
+                for key in GPU_FIELDS:
+                    if _is_number(gpu.get(key)):
+                        yield f"gpu_{gpu['index']}_{key}", gpu[key]
+
+    def _complete(self, now: float) -> bool:
+        """
+        Whether the window closes with the sample just added at `now`.
+        """
+        if self.window_samples is not None and self._count >= self.window_samples:
+            return True
+        if self.window_seconds is not None and self._opened is not None:
+            # Tolerate float error in tick deadlines such as 0.1 * 600.
+            return now - self._opened >= self.window_seconds - 1e-6
+        return False
+
+    def add(self, metrics: Dict, now: Optional[float] = None) -> Optional[Dict]:
+        """
+        Fold a sample into the window.
+        :param now: Monotonic time of the sample (defaults to the clock)
+        :return: The summary payload when the window is complete, otherwise None
+        """
+        if now is None:
+            now = self.clock()
+        if self._opened is None:
+            self._opened = now
+        for key, value in self._values(metrics):
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = FieldSummary()
+            summary.add(value)
+        self._count += 1
+        if not self._complete(now):
+            return None
+
+        result = dict(metrics)
+        result["summary"] = {key: s.result() for key, s in self._summaries.items()}
+        result["window_samples"] = self._count
+        self._summaries = {}
+        self._count = 0
+        self._opened = now
+        return result
@@ -1,6 +1,9 @@
 import yaml
 import os
 
+def _env_flag(name, default="false"):
+    return os.getenv(name, default).lower() == "true"
+
 def load_config(path="config/config.yaml"):
     config = {}
 
@@ -19,6 +22,19 @@ def load_config(path="config/config.yaml"):
     config.setdefault("metrics_interval", int(os.getenv("METRICS_INTERVAL", 10)))
     config.setdefault("thresholds", {})
     config.setdefault("device_type", os.getenv("DEVICE_TYPE", "unknown"))
+    config.setdefault("payload_encoding", os.getenv("PAYLOAD_ENCODING", "json"))
+    config.setdefault("compression", os.getenv("COMPRESSION", "none"))
+    config.setdefault("cpu_sampling", os.getenv("CPU_SAMPLING", "delta"))
+    config.setdefault("metric_source", os.getenv("METRIC_SOURCE", "auto"))
+    config.setdefault("collectors", {})
+    config.setdefault("capabilities", {"cache_path": os.getenv("CAPABILITY_CACHE")})
+    config.setdefault("scheduler", {"align": True, "jitter": float(os.getenv("TICK_JITTER", 0))})
+    config.setdefault("store_forward", {"enabled": _env_flag("STORE_FORWARD")})
+    config.setdefault("aggregation", {"enabled": False, "window": 60})
+    config.setdefault("self_telemetry", _env_flag("SELF_TELEMETRY", "true"))
+    config.setdefault("logging", {"queued": _env_flag("QUEUED_LOGGING")})
+    config.setdefault("session", {"enabled": _env_flag("SESSION_ENCODING")})
+    config.setdefault("sender", {"enabled": _env_flag("BACKGROUND_SENDER")})
     config.setdefault("tags", {
         "location": os.getenv("LOCATION", "unknown"),
         "zone": os.getenv("ZONE", "default")
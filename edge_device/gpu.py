@@ -0,0 +1,161 @@
+"""
+gpu.py
+
+Streams GPU telemetry from one long-lived `nvidia-smi --query-gpu ... --loop-ms`
+process instead of forking nvidia-smi per sample. A reader thread parses the
+CSV lines as they arrive and keeps the latest reading per GPU.
+"""
+
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+# nvidia-smi query columns and the payload keys they are reported under.
+QUERY_FIELDS = (
+    ("index", "index"),
+    ("utilization.gpu", "utilization"),
+    ("utilization.memory", "memory_utilization"),
+    ("memory.used", "memory_used"),
+    ("memory.total", "memory_total"),
+    ("temperature.gpu", "temperature"),
+    ("power.draw", "power_draw"),
+)
+
+
+def default_command(loop_ms: int = 1000) -> List[str]:
+    """
+    Return the nvidia-smi command line streaming QUERY_FIELDS every loop_ms.
+    """
+    return [
+        "nvidia-smi",
+        "--query-gpu=" + ",".join(field for field, _ in QUERY_FIELDS),
+        "--format=csv,noheader,nounits",
+        f"--loop-ms={loop_ms}",
+    ]
+
+
+def parse_line(line: str) -> Optional[Dict[str, float]]:
+    """
+    Parse one CSV line of QUERY_FIELDS into a reading. Columns reported as
+    "[N/A]" or "[Not Supported]" are left out; returns None for lines that are
+    not readings (headers, blank lines, error messages).
+    """
+    columns = [c.strip() for c in line.split(",")]
+    if len(columns) != len(QUERY_FIELDS):
+        return None
+    reading: Dict[str, float] = {}
+    for (_, key), value in zip(QUERY_FIELDS, columns):
+        try:
+            number = float(value)
+        except ValueError:
+            continue
+        reading[key] = int(number) if key == "index" else number
+    return reading if "index" in reading else None
+
+
+class GpuStream:
+    """
+    Owns the streaming nvidia-smi process and the latest reading per GPU.
+
+    The process is started on first use and restarted (at most once per
+    `restart_interval`) if it exits. Readings older than `stale_after` seconds
+    are not reported.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        command: Optional[List[str]] = None,
+        loop_ms: int = 1000,
+        stale_after: Optional[float] = None,
+        restart_interval: float = 30.0,
+        clock=time.monotonic
+    ):
+        """
+        :param command: Command printing QUERY_FIELDS as CSV lines in a loop (defaults to
+                        nvidia-smi); replaceable with a fake script for testing
+        :param loop_ms: Sampling period passed to nvidia-smi --loop-ms
+        :param stale_after: Seconds after which a GPU's last reading is dropped
+                            (defaults to three loop periods)
+        :param restart_interval: Minimum seconds between process restarts
+        :param clock: Monotonic clock, replaceable for tests
+        """
+        self.command = command or default_command(loop_ms)
+        self.stale_after = stale_after if stale_after is not None else max(3 * loop_ms / 1000, 5.0)
+        self.restart_interval = restart_interval
+        self.clock = clock
+        self.stats = {"starts": 0, "lines": 0, "bad_lines": 0}
+        self._readings: Dict[int, Dict] = {}
+        self._updated: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._last_start: Optional[float] = None
+
+    def _ensure_running(self):
+        """
+        Start the process if it is not running and the restart interval allows.
+        """
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        now = self.clock()
+        if self._last_start is not None and now - self._last_start < self.restart_interval:
+            return
+        self._last_start = now
+        try:
+            self._proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                self.command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1
+            )
+        except OSError:
+            self._proc = None
+            return
+        self.stats["starts"] += 1
+        threading.Thread(
+            target=self._read_loop, args=(self._proc,), name="gpu-stream", daemon=True
+        ).start()
+
+    def _read_loop(self, proc: subprocess.Popen):
+        """
+        Parse lines from the process until it exits.
+        """
+        for line in proc.stdout:
+            reading = parse_line(line)
+            if reading is not None:
+                index = int(reading["index"])
+                now = self.clock()
+                with self._lock:
+                    self._readings[index] = reading
+                    self._updated[index] = now
+                self.stats["lines"] += 1
+            else:
+                self.stats["bad_lines"] += 1
+        proc.stdout.close()
+
+    def latest(self) -> List[Dict]:
+        """
+        Return the freshest reading of every GPU, ordered by index.
+        """
+        self._ensure_running()
+        cutoff = self.clock() - self.stale_after
+        with self._lock:
+            return [
+                dict(self._readings[index])
+                for index in sorted(self._readings)
+                if self._updated[index] >= cutoff
+            ]
+
+    def close(self):
+        """
+        Stop the nvidia-smi process.
+        """
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._proc = None
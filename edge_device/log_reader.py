@@ -0,0 +1,71 @@
+"""
+log_reader.py
+
+Streams JSON log records back out of an agent log: every rotated segment
+(gzip-compressed or not), oldest first, then the live file. Records are read
+line by line, so arbitrarily long histories are never held in memory.
+
+Usage:
+    python log_reader.py logs/<device_id>.log [--since 2025-06-01T00:00:00+00:00] [--level WARN]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from typing import Dict, Iterator, Optional
+
+from log_rotation import rotated_segments
+
+
+def iter_records(
+    log_path: str,
+    since: Optional[str] = None,
+    level: Optional[str] = None
+) -> Iterator[Dict]:
+    """
+    Yield log records in write order.
+
+    :param log_path: Path of the live log file
+    :param since: Skip records whose ISO-8601 timestamp sorts before this one
+    :param level: Only yield records at this level
+    """
+    for path in rotated_segments(log_path) + [log_path]:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn line from a crash mid-write
+                    if since and record.get("timestamp", "") < since:
+                        continue
+                    if level and record.get("level") != level:
+                        continue
+                    yield record
+        except (OSError, EOFError):
+            # Segment removed by the budget while reading, or truncated archive.
+            continue
+
+
+def main(argv=None) -> int:
+    """
+    Print matching records as JSON lines.
+    """
+    parser = argparse.ArgumentParser(description="Stream records from a rotated agent log")
+    parser.add_argument("log_path")
+    parser.add_argument("--since", help="ISO-8601 UTC timestamp of the first record to print")
+    parser.add_argument("--level", help="Only print records at this level (INFO, WARN, ...)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.log_path) and not rotated_segments(args.log_path):
+        print(f"No log found at {args.log_path}", file=sys.stderr)
+        return 1
+    for record in iter_records(args.log_path, since=args.since, level=args.level):
+        print(json.dumps(record))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+log_rotation.py
+
+Size-budgeted, compressed log rotation. When the live log reaches max_bytes
+it is renamed to a timestamped segment and a new file is started; a
+background thread gzips the closed segment and then deletes the oldest
+segments until the live file (counted at max_bytes) plus all segments fit
+in total_bytes.
+"""
+
+import glob
+import gzip
+import os
+import queue
+import re
+import shutil
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import List
+
+
+def rotated_segments(log_path: str) -> List[str]:
+    """
+    Return the rotated segments of log_path, oldest first: compressed
+    `<log>.<UTC timestamp>.gz` files and any not yet compressed.
+    """
+    pattern = re.compile(re.escape(os.path.basename(log_path)) + r"\.\d{8}T\d{12}Z(\.gz)?$")
+    return sorted(
+        path for path in glob.glob(glob.escape(log_path) + ".*")
+        if pattern.match(os.path.basename(path))
+    )
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that keeps any number of gzip-compressed segments
+    within a total byte budget instead of backupCount plain-text files.
+
+    Rollover itself only renames the file, so the writing thread is never held
+    up by compression. Segments left uncompressed by an earlier run are
+    compressed at startup.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        filename,
+        max_bytes=1_000_000,
+        total_bytes=50_000_000,
+        compress_level=6,
+        encoding="utf-8"
+    ):
+        """
+        :param filename: Path of the live log file
+        :param max_bytes: Size at which the live file is rotated
+        :param total_bytes: Budget for the live file plus all rotated segments
+        :param compress_level: gzip compression level (1 fastest to 9 smallest)
+        :param encoding: Encoding of the live file
+        """
+        super().__init__(filename, maxBytes=max_bytes, encoding=encoding)
+        self.total_bytes = total_bytes
+        self.compress_level = compress_level
+        self.stats = {"rotations": 0, "compressed": 0, "deleted": 0}
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._compress_loop, name="log-compress", daemon=True
+        )
+        self._worker.start()
+        for stale in glob.glob(glob.escape(self.baseFilename) + ".*.gz.tmp"):
+            os.remove(stale)
+        for segment in rotated_segments(self.baseFilename):
+            if not segment.endswith(".gz"):
+                self._pending.put(segment)
+
+    def doRollover(self):
+        """
+        Rename the live file to a timestamped segment, reopen it, and queue the
+        segment for compression.
+        """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        segment = f"{self.baseFilename}.{stamp}"
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, segment)
+            self._pending.put(segment)
+        self.stream = self._open()
+        self.stats["rotations"] += 1
+
+    def _compress_loop(self):
+        while True:
+            segment = self._pending.get()
+            if segment is None:
+                return
+            try:
+                self._compress(segment)
+                self._enforce_budget()
+            except OSError:
+                pass  # retried at the next startup; logging must not fail here
+
+    def _compress(self, segment: str):
+        tmp = f"{segment}.gz.tmp"
+        with open(segment, "rb") as src, \
+                gzip.open(tmp, "wb", compresslevel=self.compress_level) as dst:
+            shutil.copyfileobj(src, dst, 64 * 1024)
+        os.replace(tmp, f"{segment}.gz")
+        os.remove(segment)
+        self.stats["compressed"] += 1
+
+    def _enforce_budget(self):
+        """
+        Delete the oldest segments until they fit in total_bytes, less max_bytes
+        reserved for the live file.
+        """
+        segments = [(path, os.path.getsize(path)) for path in rotated_segments(self.baseFilename)]
+        used = self.maxBytes + sum(size for _, size in segments)
+        for path, size in segments:
+            if used <= self.total_bytes:
+                break
+            os.remove(path)
+            used -= size
+            self.stats["deleted"] += 1
+
+    def close(self):
+        """
+        Close the live file and wait for queued compressions to finish.
+        """
+        super().close()
+        if self._worker.is_alive():
+            self._pending.put(None)
+            self._worker.join()
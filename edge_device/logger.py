@@ -1,27 +1,42 @@
 """
 Logging utility for the edge device monitoring agent.
 Supports JSON-formatted logs, rotating file handlers, and optional stdout printing.
+In queued mode, entries are only enqueued by the caller and serialized and
+written in batches by a background thread, so storage latency never reaches
+the collection loop.
 """
 
 import json
 import os
 import logging
+import queue
+import threading
+import time
 from datetime import datetime, timezone
 from logging.handlers import RotatingFileHandler
 
+from log_rotation import CompressingRotatingFileHandler
+
 class Logger:
     """
     A structured logger that writes logs to a rotating file and optionally prints to stdout.
     """
 
-    # pylint: disable=too-many-arguments,too-many-positional-args
+    # pylint: disable=too-many-arguments,too-many-positional-args,too-many-instance-attributes
     def __init__(
         self,
         log_path,
         device_id=None,
         print_stdout=False,
         max_bytes=1_000_000,
-        backup_count=3
+        backup_count=3,
+        queued=False,
+        queue_size=10000,
+        batch_size=256,
+        flush_interval=1.0,
+        fsync=False,
+        compress=False,
+        total_bytes=50_000_000
     ):
         """
         Initializes the logger with rotation and JSON formatting.
@@ -32,27 +47,60 @@ class Logger:
             print_stdout (bool): If True, also print logs to stdout.
             max_bytes (int): Maximum size per log file before rotation.
             backup_count (int): Number of rotated log files to keep.
+            queued (bool): If True, write from a background thread in batches.
+            queue_size (int): Entries held in memory in queued mode; further
+                entries are dropped and counted until the writer catches up.
+            batch_size (int): Maximum entries written per batch.
+            flush_interval (float): Seconds an entry may wait for a batch to fill.
+            fsync (bool): If True, fsync the file after every batch.
+            compress (bool): If True, gzip rotated files in the background and
+                keep as many as fit in total_bytes instead of backup_count.
+            total_bytes (int): On-disk budget for the log and its compressed segments.
         """
         self.device_id = device_id
         self.print_stdout = print_stdout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.stats = {"written": 0, "dropped": 0, "batches": 0, "failed": 0}
+
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+
+        def open_handler():
+            if compress:
+                return CompressingRotatingFileHandler(
+                    log_path, max_bytes=max_bytes, total_bytes=total_bytes
+                )
+            return RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
 
-        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self._handler = None
+        self._queue = None
+        if queued:
+            # Owned by the writer thread only; not attached to the logging module.
+            self._handler = open_handler()
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._reported_drops = 0
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+            return
 
         self.logger = logging.getLogger(f"AgentLogger-{device_id}")
         self.logger.setLevel(logging.INFO)
 
         if not self.logger.handlers:
-            handler = RotatingFileHandler(
-                log_path, maxBytes=max_bytes, backupCount=backup_count
-            )
+            self._handler = open_handler()
             formatter = logging.Formatter('%(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+            self._handler.setFormatter(formatter)
+            self.logger.addHandler(self._handler)
 
     def log(self, message, level="INFO"):
         """
         Logs a message with optional JSON structure and level.
 
+        In queued mode the entry is serialized later on the writer thread, so a
+        dict message must not be modified after it is logged.
+
         Args:
             message (str | dict): The log message or data.
             level (str): The log level, default is "INFO".
@@ -64,14 +112,123 @@ class Logger:
         }
 
         entry = {**base, **message} if isinstance(message, dict) else {**base, "message": message}
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                self.stats["dropped"] += 1
+            return
+
         log_line = json.dumps(entry)
         self.logger.info(log_line)
 
         if self.print_stdout:
-            print(f"[{level}] {entry['timestamp']}: {entry.get('message', '')}")
+            self._print(entry)
+
+    @staticmethod
+    def _print(entry):
+        print(f"[{entry['level']}] {entry['timestamp']}: {entry.get('message', '')}")
 
     def alert(self, message):
         """
         Logs a message at ALERT level.
         """
-        self.log(message, level="ALERT")
\ No newline at end of file
+        self.log(message, level="ALERT")
+
+    def _drain(self, batch):
+        """
+        Move queued entries into batch without blocking, up to batch_size.
+        """
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _run(self):
+        """
+        Writer thread: gather entries into batches and write on size or time threshold.
+        """
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                self._drain(batch)
+            try:
+                self._write(batch)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Never let one bad batch kill the writer thread.
+                self.stats["failed"] += len(batch)
+
+    def _write(self, batch):
+        """
+        Serialize a batch, roll the file over if it would exceed max_bytes, and
+        write it with one write call.
+        """
+        dropped = self.stats["dropped"] - self._reported_drops
+        if dropped:
+            self._reported_drops += dropped
+            batch.append({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "device_id": self.device_id,
+                "level": "WARN",
+                "message": f"Log queue full; dropped {dropped} entries",
+            })
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(json.dumps(entry) + "\n")
+            except (TypeError, ValueError):
+                # Not JSON-serializable; skip it so the rest of the batch is kept.
+                self.stats["failed"] += 1
+        text = "".join(lines)
+
+        handler = self._handler
+        try:
+            if 0 < handler.maxBytes <= handler.stream.tell() + len(text) and handler.stream.tell():
+                handler.doRollover()
+            handler.stream.write(text)
+            handler.stream.flush()
+            if self.fsync:
+                os.fsync(handler.stream.fileno())
+        except OSError:
+            self.stats["failed"] += len(lines)
+            return
+        self.stats["batches"] += 1
+        self.stats["written"] += len(lines)
+
+        if self.print_stdout:
+            for entry in batch:
+                self._print(entry)
+
+    def close(self):
+        """
+        Stop the writer thread after writing everything still queued, and close
+        the log file (waiting for any pending compression).
+        """
+        if self._queue is None:
+            if self._handler is not None:
+                self.logger.removeHandler(self._handler)
+                self._handler.close()
+                self._handler = None
+            return
+        self._stop.set()
+        self._thread.join()
+        batch = []
+        while True:
+            self._drain(batch)
+            if not batch:
+                break
+            self._write(batch)
+            batch = []
+        self._handler.close()
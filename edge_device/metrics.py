@@ -1,177 +1,430 @@
 """
 metrics.py
 
-Module for detecting system capabilities and collecting system metrics
-for edge device monitoring.
+Module for collecting system metrics for edge device monitoring through
+scheduled collector plugins. Capability detection lives in system_check.py.
 """
 
+import abc
 import platform
 import shutil
-import subprocess
 import sys
+import time
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 
 import psutil
 
+from gpu import GpuStream
+from procfs import ProcfsReader
+from system_check import SystemCapabilities
 
-class SystemCapabilities:
-    """
-    Detect available system capabilities, such as CPU, memory, disk, temperature,
-    battery, and GPU support.
+
+class CpuSampler:
     """
+    Compute total and per-core CPU utilisation from the change in CPU times
+    between calls, instead of sleeping inside psutil.cpu_percent().
 
-    def __init__(self):
-        self.capabilities = {
-            "cpu": True,
-            "memory": True,
-            "disk": True,
-            "temperature": False,
-            "battery": False,
-            "gpu": False,
-        }
+    One psutil.cpu_times(percpu=True) read is taken per sample, so total and
+    per-core figures cover the same window: the real time since the previous
+    sample. The first sample is measured against boot.
+    """
 
-    def detect(self) -> Dict[str, bool]:
+    def __init__(self, read_times: Optional[Callable[[], List[Tuple[float, float]]]] = None):
         """
-        Run all checks and return a dictionary indicating which metrics are supported.
+        :param read_times: Function returning (total, idle) per core, e.g.
+                           ProcfsReader.cpu_times; defaults to psutil.cpu_times
         """
-        self._check_cpu()
-        self._check_memory()
-        self._check_disk()
-        self._check_temperature()
-        self._check_battery()
-        self._check_gpu()
-        return self.capabilities
+        self._previous: Optional[List] = None
+        self.read_times = read_times or self._psutil_times
 
-    def _check_cpu(self):
+    @staticmethod
+    def _total_and_idle(times) -> Tuple[float, float]:
         """
-        Verify that CPU utilization metrics can be retrieved.
+        Return (total, idle) seconds for one scputimes tuple, matching psutil's
+        own accounting: guest time is already counted in user/nice, and iowait
+        is treated as idle.
         """
-        try:
-            psutil.cpu_percent()
-        except psutil.Error:
-            self.capabilities["cpu"] = False
+        total = sum(times)
+        total -= getattr(times, "guest", 0.0) + getattr(times, "guest_nice", 0.0)
+        idle = times.idle + getattr(times, "iowait", 0.0)
+        return total, idle
+
+    @classmethod
+    def _psutil_times(cls) -> List[Tuple[float, float]]:
+        return [cls._total_and_idle(t) for t in psutil.cpu_times(percpu=True)]
+
+    @staticmethod
+    def _percent(busy: float, total: float) -> float:
+        if total <= 0:
+            return 0.0
+        return round(min(100.0, max(0.0, busy / total * 100)), 1)
+
+    def sample(self) -> Tuple[float, List[float]]:
+        """
+        Return (cpu_total, cpu_per_core) percentages since the previous call.
+        """
+        current = self.read_times()
+        previous = self._previous
+        if previous is None or len(previous) != len(current):
+            previous = [(0.0, 0.0)] * len(current)
+        self._previous = current
+
+        per_core = []
+        sum_total = sum_busy = 0.0
+        for (total, idle), (prev_total, prev_idle) in zip(current, previous):
+            delta_total = total - prev_total
+            delta_busy = delta_total - (idle - prev_idle)
+            per_core.append(self._percent(delta_busy, delta_total))
+            sum_total += delta_total
+            sum_busy += delta_busy
+        return self._percent(sum_busy, sum_total), per_core
+
+
+class Collector(abc.ABC):
+    """
+    Base class for a metric collector plugin.
+
+    A plugin gathers one metric group and has its own interval and cost budget.
+    `interval` of None means the agent's metrics_interval. If a run takes longer
+    than `budget_ms`, MetricCollector stretches that plugin's interval until a
+    run fits the budget again. Plugins that have a Linux fast path read through
+    `procfs` and fall back to psutil for good if that read fails.
+    """
 
-    def _check_memory(self):
+    name = ""
+    default_interval: Optional[float] = None
+    default_budget_ms = 100.0
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        budget_ms: Optional[float] = None,
+        procfs: Optional[ProcfsReader] = None
+    ):
+        self.interval = interval
+        self.budget_ms = budget_ms if budget_ms is not None else self.default_budget_ms
+        self.procfs = procfs
+
+    def read_procfs(self, method: str):
         """
-        Verify that memory utilization metrics can be retrieved.
+        Call a ProcfsReader method, returning None (and disabling the fast path)
+        if there is no reader or the read fails.
         """
+        if self.procfs is None:
+            return None
         try:
-            psutil.virtual_memory()
-        except psutil.Error:
-            self.capabilities["memory"] = False
+            return getattr(self.procfs, method)()
+        except (OSError, ValueError, KeyError, IndexError):
+            self.procfs = None
+            return None
 
-    def _check_disk(self):
+    @abc.abstractmethod
+    def collect(self) -> Dict:
         """
-        Verify that disk usage metrics can be retrieved.
+        Return this plugin's metrics as a flat dictionary.
         """
-        try:
-            psutil.disk_usage("/")
-        except psutil.Error:
-            self.capabilities["disk"] = False
 
-    def _check_temperature(self):
+    def close(self):
         """
-        Check if temperature sensors are available.
+        Release anything the plugin keeps open (files, subprocesses).
         """
+
+
+COLLECTORS: Dict[str, type] = {}
+
+
+def register_collector(cls):
+    """
+    Class decorator adding a Collector subclass to the registry under cls.name.
+    """
+    COLLECTORS[cls.name] = cls
+    return cls
+
+
+@register_collector
+class CpuCollector(Collector):
+    """
+    Total and per-core CPU utilisation.
+    """
+
+    name = "cpu"
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, interval=None, budget_ms=None, procfs=None, cpu_sampling: str = "delta"):
+        if budget_ms is None and cpu_sampling == "blocking":
+            budget_ms = 1500.0
+        super().__init__(interval, budget_ms, procfs)
+        self.cpu_sampling = cpu_sampling
+        self.sampler = CpuSampler(procfs.cpu_times if procfs is not None else None)
+
+    def collect(self) -> Dict:
+        if self.cpu_sampling == "blocking":
+            # Seed baseline for accurate readings
+            psutil.cpu_percent(interval=None)
+            return {
+                "cpu_total": psutil.cpu_percent(interval=0.5),
+                "cpu_per_core": psutil.cpu_percent(interval=0.5, percpu=True),
+            }
+        try:
+            cpu_total, cpu_per_core = self.sampler.sample()
+        except (OSError, ValueError, IndexError):
+            # Fast path failed: restart the delta baseline on psutil.
+            self.procfs = None
+            self.sampler = CpuSampler()
+            cpu_total, cpu_per_core = self.sampler.sample()
+        return {"cpu_total": cpu_total, "cpu_per_core": cpu_per_core}
+
+
+@register_collector
+class MemoryCollector(Collector):
+    """
+    Virtual memory usage.
+    """
+
+    name = "memory"
+
+    def collect(self) -> Dict:
+        fast = self.read_procfs("memory")
+        if fast is not None:
+            return fast
+        mem = psutil.virtual_memory()
+        return {
+            "memory_percent": mem.percent,
+            "memory_used": mem.used,
+            "memory_total": mem.total,
+        }
+
+
+@register_collector
+class DiskCollector(Collector):
+    """
+    Usage of the root filesystem; changes slowly, so sampled once a minute.
+    """
+
+    name = "disk"
+    default_interval = 60.0
+
+    def collect(self) -> Dict:
+        fast = self.read_procfs("disk")
+        if fast is not None:
+            return fast
+        disk = psutil.disk_usage("/")
+        return {
+            "disk_percent": disk.percent,
+            "disk_used": disk.used,
+            "disk_total": disk.total,
+        }
+
+
+@register_collector
+class TemperatureCollector(Collector):
+    """
+    Current reading of every temperature sensor, grouped by chip.
+    """
+
+    name = "temperature"
+
+    def collect(self) -> Dict:
+        fast = self.read_procfs("temperatures")
+        if fast:
+            return {"temperature": fast}
         try:
             temps = psutil.sensors_temperatures()
-            if temps and any(temps.values()):
-                self.capabilities["temperature"] = True
+            return {
+                "temperature": {
+                    name: [sensor.current for sensor in readings]
+                    for name, readings in temps.items()
+                }
+            }
         except (AttributeError, NotImplementedError, psutil.Error):
-            self.capabilities["temperature"] = False
+            return {}
 
-    def _check_battery(self):
-        """
-        Check if battery information is available.
-        """
+
+@register_collector
+class BatteryCollector(Collector):
+    """
+    Battery charge and whether mains power is connected.
+    """
+
+    name = "battery"
+    default_interval = 60.0
+
+    def collect(self) -> Dict:
         try:
             batt = psutil.sensors_battery()
-            if batt is not None:
-                self.capabilities["battery"] = True
+            if batt:
+                return {"battery_percent": batt.percent, "power_plugged": batt.power_plugged}
         except (AttributeError, NotImplementedError, psutil.Error):
-            self.capabilities["battery"] = False
+            pass
+        return {}
 
-    def _check_gpu(self):
-        """
-        Check if NVIDIA GPU is available by running 'nvidia-smi'.
-        """
-        try:
-            gpu_proc = subprocess.run(
-                ["nvidia-smi"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=False
-            )
-            if gpu_proc.returncode == 0:
-                self.capabilities["gpu"] = True
-        except FileNotFoundError:
-            self.capabilities["gpu"] = False
+
+@register_collector
+class GpuCollector(Collector):
+    """
+    Per-GPU utilisation, memory, temperature and power draw, read from one
+    long-lived streaming nvidia-smi process (see gpu.py).
+    """
+
+    name = "gpu"
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, interval=None, budget_ms=None, procfs=None,
+                 command: Optional[List[str]] = None, loop_ms: int = 1000):
+        super().__init__(interval, budget_ms, procfs)
+        self.stream = GpuStream(command=command, loop_ms=loop_ms)
+
+    def collect(self) -> Dict:
+        gpus = self.stream.latest()
+        return {"gpus": gpus} if gpus else {}
+
+    def close(self):
+        self.stream.close()
 
 
 class MetricCollector:
     """
     Collect specified system metrics based on detected capabilities.
+
+    Each requested and supported metric is handled by a registered Collector
+    plugin. collect() runs every plugin; collect(due_only=True) runs only the
+    plugins whose interval has elapsed and fills the rest of the sample from
+    their last results.
     """
 
-    def __init__(self, metrics_to_collect: List[str], capabilities: Dict[str, bool]):
+    MAX_BACKOFF = 8
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        metrics_to_collect: List[str],
+        capabilities: Dict[str, bool],
+        cpu_sampling: str = "delta",
+        schedule: Optional[Dict[str, Dict]] = None,
+        base_interval: float = 10.0,
+        source: str = "auto",
+        on_failure: Optional[Callable[[str, Exception], None]] = None
+    ):
         """
         :param metrics_to_collect: List of metric names to collect (e.g., ["cpu", "memory", "disk"])
         :param capabilities: Dictionary of detected capabilities from SystemCapabilities.detect()
+        :param cpu_sampling: "delta" to measure CPU over the time since the previous collect()
+                             without sleeping, or "blocking" for two 0.5s cpu_percent() windows
+        :param schedule: Per-metric overrides, e.g. {"disk": {"interval": 300, "budget_ms": 50}}
+        :param base_interval: Interval (seconds) for plugins without their own
+        :param source: "auto" to read /proc and statvfs directly on Linux and psutil
+                       elsewhere, "procfs" to prefer the fast path, or "psutil"
+        :param on_failure: Called with (metric name, exception) when a plugin raises,
+                           e.g. to re-probe that capability
         """
         self.metrics_to_collect = metrics_to_collect
         self.capabilities = capabilities
+        self.cpu_sampling = cpu_sampling
+        self.base_interval = base_interval
+        self.on_failure = on_failure
+        self.plugins: Dict[str, Collector] = {}
+        self.state: Dict[str, Dict] = {}
+        self._cache: Dict[str, Dict] = {}
+        self.procfs = ProcfsReader() if source != "psutil" and ProcfsReader.available() else None
+
+        schedule = schedule or {}
+        for name in metrics_to_collect:
+            if name not in COLLECTORS or not capabilities.get(name, False):
+                continue
+            options = dict(schedule.get(name) or {})
+            if name == "cpu":
+                options["cpu_sampling"] = cpu_sampling
+            plugin = COLLECTORS[name](procfs=self.procfs, **options)
+            if plugin.interval is None:
+                plugin.interval = max(base_interval, plugin.default_interval or 0.0)
+            self.plugins[name] = plugin
+            self.state[name] = {
+                "next_due": 0.0, "backoff": 1, "runs": 0, "over_budget": 0, "failures": 0,
+                "last_ms": None,
+            }
+
+    def tick_interval(self) -> float:
+        """
+        Return the shortest plugin interval: how often the agent needs to wake up.
+        """
+        intervals = [plugin.interval for plugin in self.plugins.values()]
+        return min(intervals, default=self.base_interval)
 
-    def collect(self) -> Dict:
+    def _run(self, name: str, now: float):
+        """
+        Run one plugin, cache its result and schedule its next run, stretching the
+        interval (up to MAX_BACKOFF times) while runs exceed the plugin's budget.
+        """
+        plugin = self.plugins[name]
+        state = self.state[name]
+        start = time.monotonic()
+        try:
+            self._cache[name] = plugin.collect()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            self._cache.pop(name, None)
+            state["failures"] += 1
+            if self.on_failure is None:
+                raise
+            self.on_failure(name, err)
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        state["runs"] += 1
+        state["last_ms"] = round(elapsed_ms, 3)
+        if elapsed_ms > plugin.budget_ms:
+            state["over_budget"] += 1
+            state["backoff"] = min(state["backoff"] * 2, self.MAX_BACKOFF)
+        else:
+            state["backoff"] = 1
+        state["next_due"] = now + plugin.interval * state["backoff"]
+
+    def collect(self, due_only: bool = False, now: Optional[float] = None) -> Dict:
         """
         Gather the requested metrics and return them in a dictionary.
+
+        :param due_only: Only run plugins whose interval has elapsed and reuse the
+                         last values of the others
+        :param now: Monotonic time to schedule from; pass the tick deadline so plugin
+                    schedules stay in step with the agent's ticks
         """
         metrics: Dict = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "hostname": platform.node(),
         }
 
-        if "cpu" in self.metrics_to_collect and self.capabilities.get("cpu", False):
-            # Seed baseline for accurate readings
-            psutil.cpu_percent(interval=None)
-            metrics["cpu_total"] = psutil.cpu_percent(interval=0.5)
-            metrics["cpu_per_core"] = psutil.cpu_percent(interval=0.5, percpu=True)
-
-        if "memory" in self.metrics_to_collect and self.capabilities.get("memory", False):
-            mem = psutil.virtual_memory()
-            metrics["memory_percent"] = mem.percent
-            metrics["memory_used"] = mem.used
-            metrics["memory_total"] = mem.total
-
-        if "disk" in self.metrics_to_collect and self.capabilities.get("disk", False):
-            disk = psutil.disk_usage("/")
-            metrics["disk_percent"] = disk.percent
-            metrics["disk_used"] = disk.used
-            metrics["disk_total"] = disk.total
-
-        if "temperature" in self.metrics_to_collect and self.capabilities.get("temperature", False):
-            try:
-                temps = psutil.sensors_temperatures()
-                metrics["temperature"] = {
-                    name: [sensor.current for sensor in readings]
-                    for name, readings in temps.items()
-                }
-            except (AttributeError, NotImplementedError, psutil.Error):
-                pass
+        if now is None:
+            now = time.monotonic()
+        for name in list(self.plugins):
+            if name not in self.plugins:
+                continue  # disabled by on_failure
+            if not due_only or now >= self.state[name]["next_due"]:
+                self._run(name, now)
+            metrics.update(self._cache.get(name, {}))
 
-        if "battery" in self.metrics_to_collect and self.capabilities.get("battery", False):
-            try:
-                batt = psutil.sensors_battery()
-                if batt:
-                    metrics["battery_percent"] = batt.percent
-                    metrics["power_plugged"] = batt.power_plugged
-            except (AttributeError, NotImplementedError, psutil.Error):
-                pass
+        return metrics
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """
+        Return each plugin's last run time in ms (None until it has run).
+        """
+        return {name: state["last_ms"] for name, state in self.state.items()}
 
-        if "gpu" in self.metrics_to_collect and self.capabilities.get("gpu", False):
-            metrics["gpu_status"] = "NVIDIA GPU detected"
+    def disable(self, name: str):
+        """
+        Stop collecting a metric, e.g. after a re-probe found it unsupported.
+        """
+        self.plugins.pop(name, None)
+        self.state.pop(name, None)
+        self._cache.pop(name, None)
 
-        return metrics
+    def close(self):
+        """
+        Release the files and processes kept open by the plugins and the procfs fast path.
+        """
+        for plugin in self.plugins.values():
+            plugin.close()
+        if self.procfs is not None:
+            self.procfs.close()
 
 
 class EdgeAgent:
@@ -184,7 +437,14 @@ class EdgeAgent:
         :param config: Configuration dictionary that must include "metrics_to_collect" key
         """
         capabilities = SystemCapabilities().detect()
-        self.collector = MetricCollector(config.get("metrics_to_collect", []), capabilities)
+        self.collector = MetricCollector(
+            config.get("metrics_to_collect", []),
+            capabilities,
+            cpu_sampling=config.get("cpu_sampling", "delta"),
+            schedule=config.get("collectors"),
+            base_interval=config.get("metrics_interval", 10),
+            source=config.get("metric_source", "auto")
+        )
 
     def run(self) -> Dict:
         """
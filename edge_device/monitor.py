@@ -8,14 +8,22 @@ and pushes them to a cloud endpoint.
 import time
 import os
 from datetime import datetime, timezone
+from urllib.parse import urljoin
 
 import requests
 
+from aggregation import WindowAggregator
 from config_loader import load_config
 from metrics import MetricCollector
 from logger import Logger
 from system_check import SystemCapabilities
 from device_identity import get_mac_based_device_id
+from payload_codec import encode_payload
+from scheduler import TickScheduler
+from sender import BackgroundSender, RetryableError
+from session import SessionEncoder
+from store_forward import Backfiller, StoreForwardSpool
+from telemetry import AgentTelemetry
 
 
 class MonitoringAgent:
@@ -42,20 +50,183 @@ class MonitoringAgent:
             "interval": config.get("metrics_interval", 10),
             "cloud_endpoint": config.get("cloud_endpoint"),
             "metrics_to_collect": config.get("metrics_to_collect", []),
+            "payload_encoding": config.get("payload_encoding", "json"),
+            "compression": config.get("compression", "none"),
+            "cpu_sampling": config.get("cpu_sampling", "delta"),
+            "metric_source": config.get("metric_source", "auto"),
+            "capabilities": config.get("capabilities", {}),
+            "collectors": config.get("collectors", {}),
+            "sender": config.get("sender", {}),
+            "scheduler": config.get("scheduler", {}),
+            "store_forward": config.get("store_forward", {}),
+            "aggregation": config.get("aggregation", {}),
+            "session": config.get("session", {}),
+            "logging": config.get("logging", {}),
+            "self_telemetry": config.get("self_telemetry", True),
         }
 
-        # Detect system capabilities once at startup
-        self.capabilities = SystemCapabilities().detect()
+        # Detect system capabilities once at startup (from the on-disk cache when
+        # it matches this kernel and boot); re-probed only when a collector fails
+        options = self.settings["capabilities"] or {}
+        self.detector = SystemCapabilities(
+            cache_path=options.get("cache_path"),
+            ttl=options.get("ttl", 24 * 3600),
+            probe_timeout=options.get("probe_timeout", 5.0)
+        )
+        self.capabilities = self.detector.detect()
 
         # ─── Logger setup ──────────────────────────────────────────────────────────
         os.makedirs("logs", exist_ok=True)
         log_path = os.path.join("logs", f"{self.identity['device_id']}.log")
-        self.logger = Logger(log_path, device_id=self.identity["device_id"], print_stdout=True)
+        options = self.settings["logging"] or {}
+        self.logger = Logger(
+            log_path,
+            device_id=self.identity["device_id"],
+            print_stdout=True,
+            queued=options.get("queued", False),
+            queue_size=options.get("queue_size", 10000),
+            batch_size=options.get("batch_size", 256),
+            flush_interval=options.get("flush_interval", 1.0),
+            fsync=options.get("fsync", False),
+            max_bytes=options.get("max_bytes", 1_000_000),
+            compress=options.get("compress", False),
+            total_bytes=options.get("total_bytes", 50_000_000)
+        )
 
         # Filter out any unsupported metrics and update settings in place
         self.settings["metrics_to_collect"] = self._filter_supported_metrics()
+        self._check_payload_encoding()
+
+        # One collector for the agent's lifetime so CPU deltas span the whole interval
+        # and each plugin keeps its own schedule
+        self.collector = MetricCollector(
+            self.settings["metrics_to_collect"],
+            self.capabilities,
+            cpu_sampling=self.settings["cpu_sampling"],
+            schedule=self.settings["collectors"],
+            base_interval=self.settings["interval"],
+            source=self.settings["metric_source"],
+            on_failure=self._on_collector_failure
+        )
+        if self.settings["cloud_endpoint"]:
+            self.settings["batch_endpoint"] = (self.settings["sender"] or {}).get(
+                "endpoint", self.settings["cloud_endpoint"].rstrip("/") + "/batch"
+            )
+        self.telemetry = AgentTelemetry() if self.settings["self_telemetry"] else None
+        self.session = self._build_session()
+        self.spool, self.backfiller = self._build_store_forward()
+        self.sender = self._build_sender()
+        self.aggregator = self._build_aggregator()
+        self.scheduler = None
         self._log_startup()
 
+    def _build_sender(self):
+        """
+        Create the background sender when settings['sender']['enabled'] is set.
+        Without it, each sample is pushed inline by _send_to_cloud.
+        :return: BackgroundSender or None
+        """
+        options = self.settings["sender"] or {}
+        if not options.get("enabled") or not self.settings["cloud_endpoint"]:
+            return None
+        return BackgroundSender(
+            self._push_batch,
+            queue_size=options.get("queue_size", 1000),
+            batch_size=options.get("batch_size", 50),
+            base_delay=options.get("base_delay", 1.0),
+            max_delay=options.get("max_delay", 60.0),
+            log=self.logger.log,
+            overflow=self.spool.append if self.spool is not None else None,
+            spill_after=options.get("spill_after", 1)
+        )
+
+    def _build_session(self):
+        """
+        Create the session encoder when settings['session']['enabled'] is set:
+        static fields are registered once at session.endpoint (defaults to
+        /sessions on the cloud_endpoint host) and left out of later pushes.
+        :return: SessionEncoder or None
+        """
+        options = self.settings["session"] or {}
+        if not options.get("enabled") or not self.settings["cloud_endpoint"]:
+            return None
+        self.settings["session_endpoint"] = options.get(
+            "endpoint", urljoin(self.settings["cloud_endpoint"], "/sessions")
+        )
+        return SessionEncoder(self._register_session, log=self.logger.log)
+
+    def _register_session(self, descriptor):
+        """
+        POST the static fields to settings['session_endpoint'].
+        :param descriptor: Static payload fields
+        :return: Session ID assigned by the server
+        """
+        response = requests.post(
+            self.settings["session_endpoint"], timeout=5, **self._request_kwargs(descriptor)
+        )
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    def _compact(self, payload):
+        """
+        Strip the static fields from a payload when a session is in use.
+        :param payload: Full payload dictionary
+        :return: Payload to send
+        """
+        return self.session.compact(payload) if self.session is not None else payload
+
+    def _build_aggregator(self):
+        """
+        Create the windowed aggregator when settings['aggregation']['enabled'] is set:
+        samples are taken every metrics_interval, and one summary per
+        aggregation.window seconds is pushed.
+        :return: WindowAggregator or None
+        """
+        options = self.settings["aggregation"] or {}
+        if not options.get("enabled"):
+            return None
+        return WindowAggregator(
+            fields=options.get("fields"), window_seconds=options.get("window", 60)
+        )
+
+    def _build_store_forward(self):
+        """
+        Create the on-disk spool for undeliverable samples and its backfill thread
+        when settings['store_forward']['enabled'] is set.
+        :return: (StoreForwardSpool, Backfiller) or (None, None)
+        """
+        options = self.settings["store_forward"] or {}
+        if not options.get("enabled") or not self.settings["cloud_endpoint"]:
+            return None, None
+        spool = StoreForwardSpool(
+            options.get("directory", "spool"),
+            max_bytes=options.get("max_bytes", 64 * 1024 * 1024),
+            max_age=options.get("max_age", 7 * 24 * 3600),
+            segment_bytes=options.get("segment_bytes", 1024 * 1024),
+            fsync=options.get("fsync", False)
+        )
+        backfiller = Backfiller(
+            spool,
+            self._push_backfill,
+            batch_size=options.get("batch_size", 500),
+            rate=options.get("rate", 100),
+            retry_interval=options.get("retry_interval", 30.0),
+            live_idle=lambda: self.sender is None or self.sender.depth() == 0
+        )
+        return spool, backfiller
+
+    def _on_collector_failure(self, name, err):
+        """
+        Re-probe a capability after its collector raised, and stop collecting it
+        if the device no longer supports it.
+        :param name: Metric name of the failed collector
+        :param err: Exception raised by the collector
+        """
+        self.logger.log(f"Collector '{name}' failed: {err}; re-probing", level="WARN")
+        if not self.detector.reprobe([name]).get(name):
+            self.logger.log(f"⚠️ {name} is no longer supported; disabling it", level="WARN")
+            self.collector.disable(name)
+
     def _filter_supported_metrics(self):
         """
         Remove any requested metrics that the current device does not support.
@@ -68,6 +239,18 @@ class MonitoringAgent:
             self.logger.log(f"⚠️ Skipping unsupported metrics: {unsupported}", level="WARN")
         return [m for m in requested if self.capabilities.get(m)]
 
+    def _check_payload_encoding(self):
+        """
+        Fall back to plain JSON if the configured payload encoding or compression
+        is unknown or needs a package that is not installed.
+        """
+        try:
+            encode_payload({}, self.settings["payload_encoding"], self.settings["compression"])
+        except ValueError as err:
+            self.logger.log(f"⚠️ {err}; sending uncompressed JSON", level="WARN")
+            self.settings["payload_encoding"] = "json"
+            self.settings["compression"] = "none"
+
     def _log_startup(self):
         """
         Log a startup entry containing timestamp, device_id, device_type,
@@ -83,13 +266,19 @@ class MonitoringAgent:
         }
         self.logger.log(entry)
 
-    def _collect_and_log(self):
+    def _collect_and_log(self, tick=None):
         """
-        Collect metrics via MetricCollector, attach a heartbeat,
-        write the combined log entry, and then push raw metrics to cloud.
+        Run the collector plugins that are due, merge them with the last values
+        of the others, attach a heartbeat, write the combined log entry, and then
+        push raw metrics to cloud (or, with aggregation enabled, push one summary
+        per window). With self-telemetry on, the pushed sample also carries the
+        agent's own costs under `agent`.
+
+        :param tick: Monotonic deadline of the current tick, if driven by the scheduler
         """
-        collector = MetricCollector(self.settings["metrics_to_collect"], self.capabilities)
-        metrics = collector.collect()
+        start = time.perf_counter()
+        metrics = self.collector.collect(due_only=True, now=tick)
+        collect_ms = (time.perf_counter() - start) * 1000
         metrics["heartbeat"] = 1
 
         log_entry = {
@@ -100,15 +289,133 @@ class MonitoringAgent:
             "tags": self.identity["tags"],
         }
 
+        start = time.perf_counter()
         self.logger.log(log_entry)
+        log_ms = (time.perf_counter() - start) * 1000
         print(f"[{self.identity['device_id']}] Metrics collected at {log_entry['timestamp']}")
-        self._send_to_cloud(metrics)
+        if self.telemetry is not None:
+            metrics = {
+                **metrics,
+                "agent": self.telemetry.fields(self.collector.timings(), collect_ms, log_ms),
+            }
+        if self.aggregator is not None:
+            metrics = self.aggregator.add(metrics, now=tick)
+            if metrics is None:
+                return
+        if self.sender is not None:
+            self.sender.submit(self._build_payload(metrics))
+        else:
+            self._send_to_cloud(metrics)
+
+    def _build_payload(self, metrics):
+        """
+        Flatten metrics into a single payload including device_id/device_type/tags.
+        :param metrics: Dictionary of collected metrics
+        :return: Payload dictionary
+        """
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "device_id": self.identity["device_id"],
+            "device_type": self.identity["device_type"],
+            "tags": self.identity["tags"],
+            **metrics,
+        }
+
+    def _request_kwargs(self, payload, compression=None):
+        """
+        Encode a payload per settings['payload_encoding'] and settings['compression'].
+        :param payload: Payload dictionary or list of payloads
+        :param compression: Override for settings['compression']
+        :return: Keyword arguments for requests.post
+        """
+        compression = compression or self.settings["compression"]
+        if self.settings["payload_encoding"] == "json" and compression == "none":
+            return {"json": payload}
+        body, headers = encode_payload(payload, self.settings["payload_encoding"], compression)
+        return {"data": body, "headers": headers}
+
+    def _push_batch(self, batch, compression=None):
+        """
+        POST a list of payloads to settings['batch_endpoint'] for the background sender.
+        Transient failures (connection errors, timeouts, 429 and 5xx) raise
+        RetryableError; items the server rejected or failed to store, or sent
+        against a session it no longer knows, are returned so they are retried.
+
+        :param batch: List of payload dictionaries
+        :param compression: Override for settings['compression']
+        :return: Payloads to retry
+        """
+        try:
+            response = self._post(
+                self.settings["batch_endpoint"],
+                **self._request_kwargs([self._compact(p) for p in batch], compression)
+            )
+        except requests.RequestException as err:
+            raise RetryableError(str(err)) from err
+
+        if response.status_code == 409 and self.session is not None:
+            # Server restarted or evicted the session: register again and resend.
+            self.session.invalidate()
+            return batch
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(
+                f"HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        response.raise_for_status()
+
+        results = response.json().get("results", []) if response.status_code == 207 else []
+        invalid = [r for r in results if r.get("status") == "invalid"]
+        if invalid:
+            self.logger.log(f"Server rejected {len(invalid)} invalid samples", level="WARN")
+        if self.session is not None and any(r.get("status") == "unknown_session" for r in results):
+            self.session.invalidate()
+        return [
+            batch[r["index"]] for r in results
+            if r.get("status") in ("rejected", "failed", "unknown_session")
+        ]
+
+    def _post(self, url, **kwargs):
+        """
+        POST a push to the cloud, recording the attempt's latency for self-telemetry.
+        :return: requests.Response
+        """
+        start = time.perf_counter()
+        try:
+            return requests.post(url, timeout=5, **kwargs)
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record_push((time.perf_counter() - start) * 1000)
+
+    def _push_backfill(self, batch):
+        """
+        Replay a batch from the store-and-forward spool, compressed per
+        settings['store_forward']['compression'] (gzip by default).
+        Only the items the server rejected or failed to store are kept for a
+        later retry. A batch the server refuses outright (4xx other than 429)
+        is logged and treated as delivered so it cannot block the backlog.
+
+        :param batch: List of spooled payload dictionaries
+        :return: Payloads to keep in the spool, or None if the whole batch failed
+        """
+        compression = (self.settings["store_forward"] or {}).get("compression", "gzip")
+        try:
+            return self._push_batch(batch, compression)
+        except RetryableError:
+            return None
+        except requests.RequestException as err:
+            self.logger.log(f"Discarding {len(batch)} spooled samples: {err}", level="ERROR")
+            return []
 
     def _send_to_cloud(self, metrics, max_retries=3, retry_delay=2):
         """
-        Flatten metrics into a single JSON payload (including device_id/device_type/tags),
+        Flatten metrics into a single payload (including device_id/device_type/tags),
+        encode it per settings['payload_encoding'] and settings['compression'],
         then POST to self.settings['cloud_endpoint'] with up to max_retries.
-        Any requests-related failure is caught and logged.
+        Any requests-related failure is caught and logged; if every attempt fails the
+        sample goes to the store-and-forward spool, when enabled.
 
         :param metrics: Dictionary of collected metrics
         :param max_retries: Number of retry attempts if a push fails
@@ -118,33 +425,64 @@ class MonitoringAgent:
         if not endpoint:
             return
 
-        payload = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "device_id": self.identity["device_id"],
-            "device_type": self.identity["device_type"],
-            "tags": self.identity["tags"],
-            **metrics,
-        }
+        payload = self._build_payload(metrics)
 
         for attempt in range(1, max_retries + 1):
             try:
-                response = requests.post(endpoint, json=payload, timeout=5)
+                response = self._post(endpoint, **self._request_kwargs(self._compact(payload)))
+                if response.status_code == 409 and self.session is not None:
+                    self.session.invalidate()
                 response.raise_for_status()
                 return
             except requests.RequestException as err:
                 self.logger.log(f"Cloud push attempt {attempt} failed: {err}", level="ERROR")
                 if attempt < max_retries:
                     time.sleep(retry_delay * attempt)
+                elif self.spool is not None:
+                    self.spool.append([payload])
+                    self.logger.log("All cloud push attempts failed; sample spooled", level="ERROR")
                 else:
                     self.logger.log("All cloud push attempts failed", level="ERROR")
 
     def run(self):
         """
-        Enter an infinite loop: collect + log + send metrics, then sleep for self.settings["interval"] seconds.
+        Enter an infinite loop: wait for the next tick, then collect + log + send metrics.
+        Ticks come every self.settings["interval"] seconds (or the shortest collector
+        interval, if shorter) on fixed deadlines aligned to wall-clock boundaries, so
+        the time spent collecting and pushing does not make the period drift.
         """
-        while True:
-            self._collect_and_log()
-            time.sleep(self.settings["interval"])
+        options = self.settings["scheduler"] or {}
+        self.scheduler = TickScheduler(
+            min(self.settings["interval"], self.collector.tick_interval()),
+            align=options.get("align", True),
+            jitter=options.get("jitter", 0.0),
+            key=self.identity["device_id"],
+            late_after=options.get("late_after")
+        )
+        if self.sender is not None:
+            self.sender.start()
+        if self.backfiller is not None:
+            self.backfiller.start()
+        try:
+            while True:
+                missed = self.scheduler.stats["missed"]
+                tick = self.scheduler.wait()
+                if self.scheduler.stats["missed"] > missed:
+                    self.logger.log(
+                        f"Missed {self.scheduler.stats['missed'] - missed} ticks; "
+                        "collection is slower than the interval",
+                        level="WARN"
+                    )
+                self._collect_and_log(tick)
+        finally:
+            if self.backfiller is not None:
+                self.backfiller.stop()
+            if self.sender is not None:
+                self.sender.stop()
+            if self.spool is not None:
+                self.spool.close()
+            self.collector.close()
+            self.logger.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""
+payload_codec.py
+
+Encodes outgoing metric payloads as JSON or MessagePack, optionally
+compressed with gzip or zstd, and returns the matching HTTP headers.
+MessagePack and zstd need the optional msgpack and zstandard packages.
+"""
+
+import gzip
+import json
+from typing import Dict, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+}
+
+
+def encode_payload(
+    payload, encoding: str = "json", compression: str = "none"
+) -> Tuple[bytes, Dict]:
+    """
+    Serialize and optionally compress a payload for POSTing to the API server.
+
+    :param payload: JSON-serializable object (a metrics dict or a list of them)
+    :param encoding: "json" or "msgpack"
+    :param compression: "none", "gzip" or "zstd"
+    :return: (body bytes, headers dict)
+    """
+    if encoding == "msgpack":
+        if msgpack is None:
+            raise ValueError("payload_encoding 'msgpack' requires the msgpack package")
+        body = msgpack.packb(payload, use_bin_type=True)
+    elif encoding == "json":
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    else:
+        raise ValueError(f"Unknown payload_encoding: {encoding}")
+
+    headers = {"Content-Type": CONTENT_TYPES[encoding]}
+    if compression == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError("compression 'zstd' requires the zstandard package")
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+        headers["Content-Encoding"] = "zstd"
+    elif compression not in (None, "none"):
+        raise ValueError(f"Unknown compression: {compression}")
+    return body, headers
@@ -0,0 +1,145 @@
+"""
+procfs.py
+
+Linux fast path for the hot metrics. /proc/stat, /proc/meminfo and the
+thermal zone files are opened once and re-read in place with a positional
+read into a reused buffer, instead of psutil reopening and re-parsing them
+every cycle. Disk usage comes straight from os.statvfs(). Collectors fall
+back to psutil when this reader is unavailable or a read fails.
+"""
+
+import glob
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+MEMINFO_KEYS = (b"MemTotal:", b"MemFree:", b"MemAvailable:", b"Buffers:", b"Cached:")
+
+
+def _percent(used: int, total: int) -> float:
+    return round(used / total * 100, 1) if total else 0.0
+
+
+class ProcfsReader:
+    """
+    Reads CPU times, memory, disk and thermal zones directly from procfs/sysfs.
+
+    File descriptors stay open for the reader's lifetime; each read is a single
+    os.preadv() at offset 0 into a preallocated buffer, which the kernel
+    regenerates for these pseudo-files on every read.
+    """
+
+    def __init__(self, proc_root: str = "/proc", thermal_root: str = "/sys/class/thermal"):
+        """
+        :param proc_root: Mount point of procfs (overridable for tests)
+        :param thermal_root: Directory holding thermal_zone* entries
+        """
+        self.proc_root = proc_root
+        self.thermal_root = thermal_root
+        self._fds: Dict[str, int] = {}
+        self._buffer = bytearray(8192)
+        self._zones: Optional[List[Tuple[str, str]]] = None
+
+    @staticmethod
+    def available(proc_root: str = "/proc") -> bool:
+        """
+        Return True when running on Linux with a readable /proc/stat.
+        """
+        stat_path = os.path.join(proc_root, "stat")
+        return sys.platform.startswith("linux") and os.access(stat_path, os.R_OK)
+
+    def _read(self, path: str) -> bytes:
+        """
+        Return the current contents of a kept-open pseudo-file.
+        """
+        fd = self._fds.get(path)
+        if fd is None:
+            fd = self._fds[path] = os.open(path, os.O_RDONLY)
+        while True:
+            size = os.preadv(fd, [self._buffer], 0)
+            if size < len(self._buffer):
+                return bytes(memoryview(self._buffer)[:size])
+            # Buffer filled up (many cores): grow it and read again.
+            self._buffer = bytearray(len(self._buffer) * 2)
+
+    def cpu_times(self) -> List[Tuple[float, float]]:
+        """
+        Return (total, idle) jiffies for each core from /proc/stat, with the same
+        accounting as psutil: guest time excluded from total, iowait counted as idle.
+        """
+        times = []
+        for line in self._read(os.path.join(self.proc_root, "stat")).split(b"\n"):
+            if not line.startswith(b"cpu"):
+                break
+            if line[3:4] == b" ":
+                continue  # aggregate "cpu" line
+            fields = line.split(None, 9)
+            # user nice system idle iowait irq softirq steal [guest guest_nice]
+            values = [int(v) for v in fields[1:9]]
+            times.append((float(sum(values)), float(values[3] + values[4])))
+        if not times:
+            raise ValueError("no per-cpu lines in /proc/stat")
+        return times
+
+    def memory(self) -> Dict[str, float]:
+        """
+        Return memory_percent/memory_used/memory_total from /proc/meminfo, with
+        used = total - available as psutil.virtual_memory() computes it.
+        """
+        values = {}
+        for line in self._read(os.path.join(self.proc_root, "meminfo")).split(b"\n"):
+            key, _, rest = line.partition(b" ")
+            if key in MEMINFO_KEYS:
+                values[key] = int(rest.split()[0]) * 1024
+                if len(values) == len(MEMINFO_KEYS):
+                    break
+        total = values[b"MemTotal:"]
+        available = values.get(b"MemAvailable:") or (
+            values[b"MemFree:"] + values.get(b"Buffers:", 0) + values.get(b"Cached:", 0)
+        )
+        used = total - min(available, total)
+        return {"memory_percent": _percent(used, total), "memory_used": used, "memory_total": total}
+
+    @staticmethod
+    def disk(path: str = "/") -> Dict[str, float]:
+        """
+        Return disk_percent/disk_used/disk_total for the filesystem holding path,
+        computed from statvfs the way psutil.disk_usage() does.
+        """
+        st = os.statvfs(path)
+        total = st.f_blocks * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        return {"disk_percent": _percent(used, used + free), "disk_used": used, "disk_total": total}
+
+    def temperatures(self) -> Dict[str, List[float]]:
+        """
+        Return {zone type: [degrees C, ...]} from /sys/class/thermal/thermal_zone*/temp.
+        Empty when the device exposes no thermal zones.
+        """
+        if self._zones is None:
+            self._zones = []
+            for zone in sorted(glob.glob(os.path.join(self.thermal_root, "thermal_zone*"))):
+                try:
+                    with open(os.path.join(zone, "type"), "r", encoding="utf-8") as f:
+                        name = f.read().strip()
+                except OSError:
+                    name = os.path.basename(zone)
+                self._zones.append((name, os.path.join(zone, "temp")))
+
+        temps: Dict[str, List[float]] = {}
+        for name, path in self._zones:
+            try:
+                value = int(self._read(path)) / 1000.0
+            except (OSError, ValueError):
+                continue  # zone disabled or sensor not ready
+            temps.setdefault(name, []).append(value)
+        return temps
+
+    def close(self):
+        """
+        Close every kept-open file descriptor.
+        """
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
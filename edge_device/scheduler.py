@@ -0,0 +1,118 @@
+"""
+scheduler.py
+
+Drift-free tick scheduler for the agent loop. Ticks fire on fixed deadlines
+of the monotonic clock, aligned to wall-clock multiples of the interval (plus
+an optional stable per-device offset), so collection and push time never
+stretch the period and samples from a fleet line up.
+"""
+
+import math
+import time
+import zlib
+from typing import Callable, Optional
+
+
+class TickScheduler:
+    """
+    Sleep until fixed, evenly spaced deadlines.
+
+    Deadlines are computed as start + n * interval on the monotonic clock, so
+    they never drift with work done between ticks or with wall-clock steps
+    (NTP corrections). If a tick fires more than `late_after` seconds after its
+    deadline it is counted as late; whole intervals that passed without a tick
+    (e.g. a collection that took longer than the interval) are counted as
+    missed and skipped rather than fired back to back.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-instance-attributes
+    def __init__(
+        self,
+        interval: float,
+        align: bool = True,
+        jitter: float = 0.0,
+        key: Optional[str] = None,
+        late_after: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        :param interval: Tick period in seconds
+        :param align: Fire on wall-clock multiples of the interval (e.g. :00, :10, :20)
+        :param jitter: Maximum per-device offset in seconds added to every tick, to
+                       spread a fleet's pushes; the offset is derived from `key`, so it
+                       is stable across restarts
+        :param key: Identifier the jitter offset is derived from (the device_id)
+        :param late_after: Lateness in seconds after which a tick counts as late
+                           (defaults to 10% of the interval)
+        :param clock: Monotonic clock, replaceable for tests
+        :param wall_clock: Wall clock used only to pick the aligned starting point
+        :param sleep: Sleep function, replaceable for tests
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = float(interval)
+        self.align = align
+        self.offset = self.jitter_offset(key, min(jitter, self.interval)) if jitter else 0.0
+        self.late_after = late_after if late_after is not None else self.interval * 0.1
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.sleep = sleep
+
+        self._start: Optional[float] = None
+        self._index = 0
+        self.stats = {"ticks": 0, "late": 0, "missed": 0, "max_lateness_ms": 0.0}
+
+    @staticmethod
+    def jitter_offset(key: Optional[str], jitter: float) -> float:
+        """
+        Map a key to a stable offset in [0, jitter) seconds.
+        """
+        digest = zlib.crc32((key or "").encode("utf-8"))
+        return jitter * (digest / 2 ** 32)
+
+    def _first_deadline(self) -> float:
+        """
+        Return the monotonic time of the first tick: the next aligned wall-clock
+        boundary (plus offset), or now when alignment is disabled.
+        """
+        now = self.clock()
+        if not self.align:
+            return now + self.offset
+        wall = self.wall_clock()
+        boundary = math.ceil((wall - self.offset) / self.interval) * self.interval + self.offset
+        return now + (boundary - wall)
+
+    def next_deadline(self) -> float:
+        """
+        Return the monotonic deadline of the next tick.
+        """
+        if self._start is None:
+            self._start = self._first_deadline()
+        return self._start + self._index * self.interval
+
+    def wait(self) -> float:
+        """
+        Sleep until the next deadline and return it (monotonic seconds).
+        """
+        deadline = self.next_deadline()
+        remaining = deadline - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+
+        lateness = max(0.0, self.clock() - deadline)
+        missed = int(lateness // self.interval)
+        if missed:
+            # Skip the deadlines that already passed instead of firing a burst.
+            self.stats["missed"] += missed
+            deadline += missed * self.interval
+            lateness -= missed * self.interval
+        if lateness > self.late_after:
+            self.stats["late"] += 1
+        self.stats["ticks"] += 1
+        self.stats["max_lateness_ms"] = max(
+            self.stats["max_lateness_ms"], round(lateness * 1000, 3)
+        )
+        self._index += missed + 1
+        return deadline
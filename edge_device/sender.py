@@ -0,0 +1,225 @@
+"""
+sender.py
+
+Background sender that decouples metric collection from cloud pushes.
+Payloads are queued in a bounded in-memory buffer and shipped in batches
+from a daemon thread, retrying with jittered exponential backoff, so a slow
+or unreachable endpoint never delays the collection loop.
+"""
+
+import random
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class RetryableError(Exception):
+    """
+    Raised by a send function for failures worth retrying (timeouts,
+    connection errors, 429/5xx responses).
+    """
+
+    def __init__(self, message, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BackgroundSender:
+    """
+    Ships queued payloads in batches from a background thread.
+
+    The queue holds at most `queue_size` payloads; when it is full the oldest
+    one is dropped (or handed to `overflow`) so the freshest data stays in memory. `send_batch` is
+    called with a list of payloads and returns the payloads that should be
+    retried (empty when everything was accepted). It raises RetryableError to
+    retry the whole batch; any other exception drops the batch.
+
+    With an `overflow`, a batch still failing after `spill_after` retries is
+    handed to it together with everything queued, so an outage's samples are
+    persisted instead of waiting in memory. Until a push succeeds again, each
+    failing batch is handed over after a single attempt.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict]], List[Dict]],
+        queue_size: int = 1000,
+        batch_size: int = 50,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        log: Optional[Callable] = None,
+        overflow: Optional[Callable[[List[Dict]], None]] = None,
+        spill_after: int = 1
+    ):
+        """
+        :param send_batch: Function pushing a list of payloads, see class docstring
+        :param queue_size: Maximum number of payloads buffered in memory
+        :param batch_size: Maximum number of payloads per push
+        :param base_delay: First retry delay ceiling in seconds (doubles per failed attempt)
+        :param max_delay: Upper bound on the retry delay ceiling in seconds
+        :param log: Optional callable(message, level=...) for push errors
+        :param overflow: Optional callable receiving payloads that would otherwise be
+                         dropped (queue full, still queued at shutdown, or spilled during
+                         an outage), e.g. a disk spool
+        :param spill_after: Failed retries of one batch before it and the queue are spilled
+                            to overflow
+        """
+        self.send_batch = send_batch
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.log = log or (lambda message, level="INFO": None)
+        self.overflow = overflow
+        self.spill_after = spill_after
+
+        self._spilling = False
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            "queued": 0, "sent": 0, "dropped": 0, "overflowed": 0, "retries": 0,
+            "failed_batches": 0, "spills": 0,
+        }
+
+    def start(self):
+        """
+        Start the sender thread.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metric-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the sender thread, making one last attempt to push what is queued.
+        """
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, payload: Dict) -> bool:
+        """
+        Queue a payload for sending. Returns False if an older payload had to be dropped.
+        """
+        with self._cond:
+            dropped = len(self._queue) >= self.queue_size
+            if dropped:
+                self._drop([self._queue.popleft()])
+            self._queue.append(payload)
+            self.stats["queued"] += 1
+            self._cond.notify()
+        return not dropped
+
+    def depth(self) -> int:
+        """
+        Return the number of payloads waiting to be sent.
+        """
+        return len(self._queue)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Return a "full jitter" delay for the given retry attempt (starting at 0):
+        uniform between zero and base_delay * 2**attempt, capped at max_delay.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _take_batch(self) -> List[Dict]:
+        """
+        Wait for queued payloads and remove up to batch_size of them.
+        """
+        with self._cond:
+            while not self._queue and not self._stop.is_set():
+                self._cond.wait(1.0)
+            count = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _push(self, batch: List[Dict]) -> Tuple[List[Dict], Optional[float]]:
+        """
+        Send a batch once. Returns the payloads still pending and the
+        Retry-After hint (or None) for the next attempt.
+        """
+        try:
+            pending = self.send_batch(batch) or []
+        except RetryableError as err:
+            self.log(f"Cloud push of {len(batch)} samples failed: {err}", level="ERROR")
+            return batch, err.retry_after
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            self.stats["failed_batches"] += 1
+            self.log(f"Dropping {len(batch)} samples after push error: {err}", level="ERROR")
+            return [], None
+        self.stats["sent"] += len(batch) - len(pending)
+        return pending, None
+
+    def _run(self):
+        """
+        Thread loop: take a batch and push it until accepted or the sender stops.
+        """
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            attempt = 0
+            while batch and not self._stop.is_set():
+                batch, retry_after = self._push(batch)
+                if not batch:
+                    self._spilling = False
+                elif self.overflow is not None and (self._spilling or attempt >= self.spill_after):
+                    self._spill(batch)
+                    batch = []
+                else:
+                    self.stats["retries"] += 1
+                    delay = max(self.backoff_delay(attempt), retry_after or 0.0)
+                    attempt += 1
+                    self._stop.wait(delay)
+            if batch:
+                self._requeue(batch)
+
+        # On shutdown hand what is left to the overflow, or make one last attempt per batch.
+        while self._queue:
+            batch = self._take_batch()
+            if self.overflow is None:
+                batch, _ = self._push(batch)
+            self._drop(batch)
+
+    def _spill(self, batch: List[Dict]):
+        """
+        Hand a failing batch and everything queued behind it to the overflow.
+        """
+        with self._cond:
+            payloads = batch + list(self._queue)
+            self._queue.clear()
+        if not self._spilling:
+            self.log(f"Cloud unreachable; spooling {len(payloads)} queued samples", level="WARN")
+        self._spilling = True
+        self.stats["spills"] += 1
+        self._drop(payloads)
+
+    def _requeue(self, batch: List[Dict]):
+        """
+        Put an unsent batch back at the front of the queue, respecting queue_size.
+        """
+        with self._cond:
+            self._queue.extendleft(reversed(batch))
+            excess = len(self._queue) - self.queue_size
+            if excess > 0:
+                self._drop([self._queue.popleft() for _ in range(excess)])
+
+    def _drop(self, payloads: List[Dict]):
+        """
+        Hand payloads that leave the queue unsent to the overflow, or count them as dropped.
+        """
+        if not payloads:
+            return
+        if self.overflow is not None:
+            try:
+                self.overflow(payloads)
+                self.stats["overflowed"] += len(payloads)
+                return
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                self.log(f"Overflow of {len(payloads)} samples failed: {err}", level="ERROR")
+        self.stats["dropped"] += len(payloads)
@@ -0,0 +1,71 @@
+"""
+session.py
+
+Session-based delta encoding of pushes. The static part of the payload
+(device identity, tags, hostname and the memory/disk totals) is registered
+with the server once; every later payload carries only the session ID and
+the fields that change. The server rehydrates samples from its session cache.
+"""
+
+import threading
+from typing import Callable, Dict, Optional
+
+# Payload fields that are sent once at registration instead of with every sample.
+STATIC_FIELDS = ("device_id", "hostname", "device_type", "tags", "memory_total", "disk_total")
+
+
+class SessionEncoder:
+    """
+    Strips STATIC_FIELDS from payloads once a session is registered.
+
+    The session is (re-)registered lazily, from the pushing thread, whenever
+    there is none or the static fields change (e.g. a resized disk). After the
+    server reports the session as unknown (restart or eviction), `invalidate()`
+    makes the next push register again. While registration fails, payloads are
+    sent in full, so pushes never depend on the session endpoint.
+    """
+
+    def __init__(self, register: Callable[[Dict], str], log: Optional[Callable] = None):
+        """
+        :param register: Called with the static fields; returns the new session ID
+                         and raises on failure
+        :param log: Optional logger callable (message, level=...)
+        """
+        self.register = register
+        self.log = log
+        self.session_id: Optional[str] = None
+        self.descriptor: Optional[Dict] = None
+        self.stats = {"registrations": 0, "compacted": 0, "full": 0}
+        self._lock = threading.Lock()
+
+    def compact(self, payload: Dict) -> Dict:
+        """
+        Return the payload without its static fields, tagged with the session ID,
+        or the full payload when no session could be registered.
+        """
+        descriptor = {k: payload[k] for k in STATIC_FIELDS if k in payload}
+        with self._lock:
+            if self.session_id is None or descriptor != self.descriptor:
+                try:
+                    self.session_id = self.register(descriptor)
+                    self.descriptor = descriptor
+                    self.stats["registrations"] += 1
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    self.session_id = None
+                    if self.log:
+                        self.log(f"Session registration failed: {err}", level="WARN")
+            session_id = self.session_id
+            self.stats["full" if session_id is None else "compacted"] += 1
+
+        if session_id is None:
+            return payload
+        compact = {k: v for k, v in payload.items() if k not in STATIC_FIELDS}
+        compact["session_id"] = session_id
+        return compact
+
+    def invalidate(self):
+        """
+        Forget the current session so the next push registers a new one.
+        """
+        with self._lock:
+            self.session_id = None
@@ -0,0 +1,223 @@
+"""
+store_forward.py
+
+On-device store-and-forward spool for samples that could not be pushed.
+Samples are appended as JSON lines to small segment files (sequential
+writes, no per-sample fsync by default); the spool is capped by total bytes
+and by age, evicting the oldest segments first. A background Backfiller
+replays the backlog in large compressed batches once the endpoint is
+reachable again, rate-limited so live samples keep priority.
+
+The segment and checkpoint handling lives in segment_log.py, shared with the
+server's InfluxDB spool.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from segment_log import SegmentLog
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class StoreForwardSpool(SegmentLog):
+    """
+    Append-only spool of payloads split into segment files.
+
+    Payloads are appended to the newest segment. Readers consume from the
+    (segment, offset) position stored in checkpoint.json; after a batch is
+    delivered the checkpoint advances and drained segments are deleted. When
+    the spool would exceed `max_bytes`, or a segment was last written more
+    than `max_age` seconds ago, whole segments are evicted oldest first.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+        segment_bytes: int = 1024 * 1024,
+        fsync: bool = False,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        :param directory: Directory holding segment files and the checkpoint
+        :param max_bytes: Cap on the total size of all segments
+        :param max_age: Seconds after which an untouched segment is evicted
+        :param segment_bytes: Size at which a new segment is started; kept to at most a
+                              quarter of max_bytes so eviction stays fine-grained
+        :param fsync: fsync after every append (off by default to spare SD cards)
+        :param clock: Wall clock used for age eviction, replaceable for tests
+        """
+        super().__init__(directory, SEGMENT_SUFFIX, max(1, min(segment_bytes, max_bytes // 4)),
+                         fsync)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        self.stats = {"appended": 0, "evicted_segments": 0, "evicted_bytes": 0}
+
+    def _evict(self, segment_id: int):
+        """
+        Delete a segment that was not delivered and count what was lost.
+        """
+        self.stats["evicted_segments"] += 1
+        self.stats["evicted_bytes"] += self._remove_segment(segment_id)
+
+    def _evict_oldest(self) -> bool:
+        """
+        Evict the oldest segment; the active one is rolled first if it is the only one.
+        Returns False if there is nothing to evict.
+        """
+        segments = [s for s in self._segments() if s >= self.checkpoint[0]]
+        if not segments or (segments == [self._active_id] and self._active.tell() == 0):
+            return False
+        if segments[0] == self._active_id:
+            self._roll()
+        self._evict(segments[0])
+        return True
+
+    def _evict_expired(self):
+        """
+        Evict segments whose last write is older than max_age.
+        """
+        cutoff = self.clock() - self.max_age
+        for segment_id in self._segments():
+            if os.path.getmtime(self._segment_path(segment_id)) >= cutoff:
+                break
+            if segment_id == self._active_id:
+                if self._active.tell() == 0:
+                    break
+                self._roll()
+            self._evict(segment_id)
+
+    def append(self, payloads: List[Dict]):
+        """
+        Append payloads to the active segment, evicting the oldest data to stay
+        within max_bytes.
+        """
+        if not payloads:
+            return
+        data = "".join(
+            json.dumps(p, separators=(",", ":")) + "\n" for p in payloads
+        ).encode("utf-8")
+        with self._lock:
+            self._evict_expired()
+            while self._size + len(data) > self.max_bytes and self._evict_oldest():
+                pass
+            self._append(data)
+            self.stats["appended"] += len(payloads)
+
+    def read_batch(self, max_records: int) -> Tuple[List[Dict], Tuple[int, int]]:
+        """
+        Read up to max_records payloads from the checkpoint; torn or corrupt
+        lines are skipped.
+        :return: (payloads, position to pass to commit() once they are delivered)
+        """
+        with self._lock:
+            self._evict_expired()
+            return self._read(max_records, json.loads)
+
+
+class Backfiller:
+    """
+    Background thread replaying the spool in batches at a bounded rate.
+
+    `push_batch` receives a list of payloads and returns the ones that must be
+    retried (empty when all were accepted), or None when the whole batch
+    failed. Payloads to retry are appended to the spool again before the batch
+    is committed, so accepted payloads are never sent twice. Backfill only
+    runs while `live_idle()` is true (e.g. the live send queue is empty), so
+    replaying a backlog never delays fresh samples.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        spool: StoreForwardSpool,
+        push_batch: Callable[[List[Dict]], Optional[List[Dict]]],
+        batch_size: int = 500,
+        rate: float = 100.0,
+        retry_interval: float = 30.0,
+        idle_interval: float = 5.0,
+        live_idle: Optional[Callable[[], bool]] = None
+    ):
+        """
+        :param spool: StoreForwardSpool to drain
+        :param push_batch: Function delivering a batch, returning the payloads to retry
+                           or None on failure
+        :param batch_size: Maximum payloads per backfill push
+        :param rate: Maximum payloads per second replayed on average
+        :param retry_interval: Seconds to wait after a failed push
+        :param idle_interval: Seconds to wait when there is nothing to replay
+        :param live_idle: Optional callable returning False while live traffic is pending
+        """
+        self.spool = spool
+        self.push_batch = push_batch
+        self.batch_size = batch_size
+        self.rate = rate
+        self.retry_interval = retry_interval
+        self.idle_interval = idle_interval
+        self.live_idle = live_idle or (lambda: True)
+        self.stats = {"replayed": 0, "batches": 0, "failures": 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Start replaying in the background.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="spool-backfill", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the backfill thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def drain_once(self) -> int:
+        """
+        Push one batch from the spool.
+        :return: Number of payloads replayed, 0 if idle, or -1 on failure
+        """
+        if not self.live_idle():
+            return 0
+        records, position = self.spool.read_batch(self.batch_size)
+        if not records:
+            if position != self.spool.checkpoint:
+                self.spool.commit(position)  # only unreadable lines were left
+            return 0
+        retry = self.push_batch(records)
+        if retry is None or len(retry) >= len(records):
+            self.stats["failures"] += 1
+            return -1
+        if retry:
+            # Re-queued before the commit: a crash in between can only resend these.
+            self.spool.append(retry)
+        self.spool.commit(position)
+        replayed = len(records) - len(retry)
+        self.stats["replayed"] += replayed
+        self.stats["batches"] += 1
+        return replayed
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            replayed = self.drain_once()
+            if replayed == 0:
+                self._stop.wait(self.idle_interval)
+            elif replayed < 0:
+                self._stop.wait(self.retry_interval)
+            else:
+                # Pace batches so the backfill stays under `rate` payloads per second.
+                elapsed = time.monotonic() - start
+                self._stop.wait(max(0.0, replayed / self.rate - elapsed))
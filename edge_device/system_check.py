@@ -1,70 +1,212 @@
-import psutil
+"""
+system_check.py
+
+Detects which metrics this device can provide. Probes run concurrently with
+a timeout each, and results are cached on disk keyed by kernel release and
+boot ID, so an agent restarted on the same boot starts without re-probing
+(and without forking nvidia-smi).
+"""
+
+import json
+import os
+import platform
 import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import psutil
+
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
 
 
 class SystemCapabilities:
-    def __init__(self):
-        self.capabilities = {
-            "cpu": True,
-            "memory": True,
-            "disk": True,
-            "temperature": False,
-            "battery": False,
-            "gpu": False
+    """
+    Detect available system capabilities, such as CPU, memory, disk, temperature,
+    battery, and GPU support.
+    """
+
+    DEFAULTS = {
+        "cpu": True,
+        "memory": True,
+        "disk": True,
+        "temperature": False,
+        "battery": False,
+        "gpu": False,
+    }
+
+    def __init__(
+        self,
+        cache_path: Optional[str] = None,
+        ttl: float = 24 * 3600,
+        probe_timeout: float = 5.0
+    ):
+        """
+        :param cache_path: JSON file caching the last detection; None disables the cache
+        :param ttl: Seconds a cached detection stays valid for the same kernel and boot
+        :param probe_timeout: Seconds to wait for all probes before treating the
+                              unfinished ones as unsupported
+        """
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.probe_timeout = probe_timeout
+        self.capabilities: Dict[str, bool] = dict(self.DEFAULTS)
+        self.from_cache = False
+        self.probes = {
+            "cpu": self._check_cpu,
+            "memory": self._check_memory,
+            "disk": self._check_disk,
+            "temperature": self._check_temperature,
+            "battery": self._check_battery,
+            "gpu": self._check_gpu,
         }
 
-    def detect(self):
-        self._check_cpu()
-        self._check_memory()
-        self._check_disk()
-        self._check_temperature()
-        self._check_battery()
-        self._check_gpu()
+    def detect(self) -> Dict[str, bool]:
+        """
+        Return a dictionary indicating which metrics are supported, from the disk
+        cache when it is fresh and matches this kernel and boot, otherwise by probing.
+        """
+        cached = self._load_cache()
+        if cached is not None:
+            self.capabilities.update(cached)
+            self.from_cache = True
+            return self.capabilities
+        self.from_cache = False
+        return self.reprobe()
+
+    def reprobe(self, names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Run the given probes (all by default) concurrently, update the capabilities
+        in place and rewrite the cache. Used after a collector fails at runtime.
+        """
+        names = [n for n in (names or self.probes) if n in self.probes]
+        executor = ThreadPoolExecutor(max_workers=len(names) or 1, thread_name_prefix="probe")
+        futures = {name: executor.submit(self.probes[name]) for name in names}
+        deadline = time.monotonic() + self.probe_timeout
+        for name, future in futures.items():
+            try:
+                self.capabilities[name] = bool(
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Timed out or the probe itself raised.
+                self.capabilities[name] = False
+        # Do not wait for a hung probe; its thread finishes (or dies) on its own.
+        executor.shutdown(wait=False)
+        self._save_cache()
         return self.capabilities
 
-    def _check_cpu(self):
+    @staticmethod
+    def cache_key() -> Dict[str, Optional[str]]:
+        """
+        Identify the running kernel and boot; a cached detection is only reused
+        when both match.
+        """
         try:
-            psutil.cpu_percent()
-        except Exception:
-            self.capabilities["cpu"] = False
+            with open(BOOT_ID_PATH, "r", encoding="utf-8") as f:
+                boot_id = f.read().strip()
+        except OSError:
+            boot_id = None
+        return {"kernel": platform.release(), "boot_id": boot_id}
 
-    def _check_memory(self):
+    def _load_cache(self) -> Optional[Dict[str, bool]]:
+        """
+        Return cached capabilities if present, unexpired and for this kernel/boot.
+        """
+        if not self.cache_path:
+            return None
         try:
-            psutil.virtual_memory()
-        except Exception:
-            self.capabilities["memory"] = False
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("key") != self.cache_key():
+            return None
+        if time.time() - data.get("detected_at", 0) > self.ttl:
+            return None
+        capabilities = data.get("capabilities")
+        return capabilities if isinstance(capabilities, dict) else None
 
-    def _check_disk(self):
+    def _save_cache(self):
+        """
+        Atomically write the current capabilities to the cache file.
+        """
+        if not self.cache_path:
+            return
         try:
-            psutil.disk_usage("/")
-        except Exception:
-            self.capabilities["disk"] = False
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.cache_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "key": self.cache_key(),
+                    "detected_at": time.time(),
+                    "capabilities": self.capabilities,
+                }, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass  # caching is an optimisation only
 
-    def _check_temperature(self):
-        try:
-            temps = psutil.sensors_temperatures()
-            if temps and any(temps.values()):
-                self.capabilities["temperature"] = True
-        except Exception:
-            self.capabilities["temperature"] = False
+    @staticmethod
+    def _check_cpu() -> bool:
+        """
+        Verify that CPU utilization metrics can be retrieved.
+        """
+        psutil.cpu_times(percpu=True)
+        return True
 
-    def _check_battery(self):
-        try:
-            batt = psutil.sensors_battery()
-            if batt is not None:
-                self.capabilities["battery"] = True
-        except Exception:
-            self.capabilities["battery"] = False
+    @staticmethod
+    def _check_memory() -> bool:
+        """
+        Verify that memory utilization metrics can be retrieved.
+        """
+        psutil.virtual_memory()
+        return True
+
+    @staticmethod
+    def _check_disk() -> bool:
+        """
+        Verify that disk usage metrics can be retrieved.
+        """
+        psutil.disk_usage("/")
+        return True
 
-    def _check_gpu(self):
+    @staticmethod
+    def _check_temperature() -> bool:
+        """
+        Check if temperature sensors are available.
+        """
+        temps = psutil.sensors_temperatures()
+        return bool(temps and any(temps.values()))
+
+    @staticmethod
+    def _check_battery() -> bool:
+        """
+        Check if battery information is available.
+        """
+        return psutil.sensors_battery() is not None
+
+    def _check_gpu(self) -> bool:
+        """
+        Check if an NVIDIA GPU is available by running 'nvidia-smi -L', skipping
+        the fork entirely when nvidia-smi is not installed.
+        """
+        if shutil.which("nvidia-smi") is None:
+            return False
         try:
-            result = subprocess.run(["nvidia-smi"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode == 0:
-                self.capabilities["gpu"] = True
-        except FileNotFoundError:
-            self.capabilities["gpu"] = False
+            gpu_proc = subprocess.run(
+                ["nvidia-smi", "-L"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.probe_timeout,
+                check=False
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return gpu_proc.returncode == 0
 
 
 if __name__ == "__main__":
@@ -74,13 +216,7 @@ if __name__ == "__main__":
         print("Python 3 not found!")
         sys.exit(1)
 
-    try:
-        import psutil  # Reconfirm for CLI
-    except ImportError as e:
-        print(f"Missing Python dependency: {e}")
-        sys.exit(1)
-
     print("Python dependencies found.")
     detector = SystemCapabilities()
     print("Detected capabilities:")
-    print(detector.detect())
\ No newline at end of file
+    print(detector.detect())
@@ -0,0 +1,62 @@
+"""
+telemetry.py
+
+Agent self-telemetry: what the agent itself costs on the device. Each pushed
+sample carries a compact `agent` dict (per-collector run time, collection and
+logging time, latency of the last push, and the agent's own RSS and CPU),
+which the server writes as agent_* fields.
+"""
+
+import threading
+from typing import Dict, Optional
+
+import psutil
+
+
+class AgentTelemetry:
+    """
+    Tracks push latency across threads and builds the `agent` payload dict.
+    """
+
+    def __init__(self, process: Optional[psutil.Process] = None):
+        """
+        :param process: Process to report RSS and CPU for (defaults to this one)
+        """
+        self.process = process or psutil.Process()
+        # The first cpu_percent() call only starts the measurement window.
+        self.process.cpu_percent(None)
+        self.push_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_push(self, elapsed_ms: float):
+        """
+        Record the duration of one push attempt (inline, background or backfill).
+        """
+        with self._lock:
+            self.push_ms = round(elapsed_ms, 2)
+
+    def fields(
+        self, collector_ms: Dict[str, Optional[float]], collect_ms: float, log_ms: float
+    ) -> Dict:
+        """
+        Return the `agent` dict for the current sample.
+
+        :param collector_ms: Last run time of each collector plugin, in ms
+        :param collect_ms: Time spent in MetricCollector.collect this cycle
+        :param log_ms: Time spent in Logger.log this cycle
+        """
+        agent = {
+            f"collector_{name}_ms": ms for name, ms in collector_ms.items() if ms is not None
+        }
+        agent["collect_ms"] = round(collect_ms, 2)
+        agent["log_ms"] = round(log_ms, 2)
+        with self._lock:
+            if self.push_ms is not None:
+                agent["push_ms"] = self.push_ms
+        try:
+            with self.process.oneshot():
+                agent["rss_bytes"] = self.process.memory_info().rss
+                agent["cpu_percent"] = self.process.cpu_percent(None)
+        except psutil.Error:
+            pass
+        return agent
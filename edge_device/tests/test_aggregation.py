@@ -0,0 +1,70 @@
+"""
+test_aggregation.py
+
+Unit tests for windowed aggregation and the P-squared p95 estimator.
+"""
+
+import os
+import random
+import sys
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aggregation import P2Quantile, WindowAggregator
+
+
+def test_p2_estimates_p95_within_tolerance():
+    """
+    Verify the P-squared estimate tracks the true 95th percentile.
+    """
+    rng = random.Random(7)
+    values = [rng.uniform(0, 100) for _ in range(5000)]
+    estimator = P2Quantile(0.95)
+    for value in values:
+        estimator.add(value)
+    exact = sorted(values)[int(0.95 * len(values)) - 1]
+    assert abs(estimator.value() - exact) < 1.5
+
+
+def test_window_emits_one_summary_with_peaks():
+    """
+    Verify only the last sample of a window yields a payload, and that it keeps spikes.
+    """
+    aggregator = WindowAggregator(window_samples=4)
+    samples = [
+        {"cpu_total": 10.0, "cpu_per_core": [10.0], "memory_percent": 50.0,
+         "gpus": [{"index": 0, "utilization": 5.0}]},
+        {"cpu_total": 99.0, "cpu_per_core": [99.0], "memory_percent": 50.0,
+         "gpus": [{"index": 0, "utilization": 15.0}]},
+        {"cpu_total": 20.0, "cpu_per_core": [20.0], "memory_percent": 52.0},
+        {"cpu_total": 11.0, "cpu_per_core": [11.0], "memory_percent": 54.0},
+    ]
+    results = [aggregator.add(sample) for sample in samples]
+    assert results[:3] == [None, None, None]
+
+    payload = results[3]
+    assert payload["cpu_total"] == 11.0
+    assert payload["window_samples"] == 4
+    assert payload["summary"]["cpu_total"] == {"min": 10.0, "max": 99.0, "mean": 35.0, "p95": 99.0}
+    assert payload["summary"]["cpu_core_0"]["max"] == 99.0
+    assert payload["summary"]["gpu_0_utilization"]["mean"] == 10.0
+    assert aggregator.add(samples[0]) is None
+
+
+def test_window_closes_on_elapsed_time_not_sample_count():
+    """
+    Verify a time window spans window_seconds whatever the tick rate, including missed ticks.
+    """
+    aggregator = WindowAggregator(window_seconds=10)
+    # First window opens at t=0; ticks every 0.5s (a collector faster than metrics_interval).
+    results = [aggregator.add({"cpu_total": 1.0}, now=i * 0.5) for i in range(21)]
+    assert results[:20] == [None] * 20
+    assert results[20]["window_samples"] == 21
+
+    # Next window covers (10, 20]: only three ticks land in it because of missed ticks.
+    assert aggregator.add({"cpu_total": 2.0}, now=11.0) is None
+    assert aggregator.add({"cpu_total": 3.0}, now=15.0) is None
+    payload = aggregator.add({"cpu_total": 4.0}, now=20.0)
+    assert payload["window_samples"] == 3
+    assert payload["summary"]["cpu_total"]["max"] == 4.0
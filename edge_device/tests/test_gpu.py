@@ -0,0 +1,73 @@
+"""
+test_gpu.py
+
+Unit tests for the streaming GPU collector, driven by a fake nvidia-smi script.
+"""
+
+import os
+import sys
+import time
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from gpu import parse_line
+from metrics import MetricCollector
+
+FAKE_NVIDIA_SMI = """
+import sys, time
+while True:
+    print("0, 45, 10, 1024, 16384, 61, 70.5", flush=True)
+    print("1, 90, 55, 8000, 16384, 77, [N/A]", flush=True)
+    time.sleep(0.05)
+"""
+
+
+def test_parse_line_skips_unsupported_columns():
+    """
+    Verify CSV parsing, [N/A] handling and rejection of non-reading lines.
+    """
+    assert parse_line("1, 90, 55, 8000, 16384, 77, [N/A]\n") == {
+        "index": 1, "utilization": 90.0, "memory_utilization": 55.0,
+        "memory_used": 8000.0, "memory_total": 16384.0, "temperature": 77.0,
+    }
+    assert parse_line("NVIDIA-SMI has failed\n") is None
+
+
+def test_parse_lines_of_a_multi_gpu_stream():
+    """
+    Verify each line of a multi-GPU CSV block parses to its own reading.
+    """
+    output = (
+        "0, 45, 10, 1024, 16384, 61, 70.5\n"
+        "1, 90, 55, 8000, 16384, 77, [N/A]\n"
+        "\n"
+    )
+    readings = [parse_line(line) for line in output.splitlines(keepends=True)]
+    assert [r["index"] for r in readings if r is not None] == [0, 1]
+    assert readings[0]["power_draw"] == 70.5
+    assert readings[2] is None
+
+
+def test_streams_readings_from_one_process(tmp_path):
+    """
+    Verify the collector reads per-GPU values from a single long-lived process.
+    """
+    script = tmp_path / "fake_nvidia_smi.py"
+    script.write_text(FAKE_NVIDIA_SMI)
+    collector = MetricCollector(
+        ["gpu"], {"gpu": True},
+        schedule={"gpu": {"command": [sys.executable, str(script)], "loop_ms": 50}}
+    )
+    try:
+        deadline = time.monotonic() + 5
+        metrics = collector.collect()
+        while len(metrics.get("gpus", [])) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            metrics = collector.collect()
+        assert [gpu["index"] for gpu in metrics["gpus"]] == [0, 1]
+        assert metrics["gpus"][0]["power_draw"] == 70.5
+        assert "power_draw" not in metrics["gpus"][1]
+        assert collector.plugins["gpu"].stream.stats["starts"] == 1
+    finally:
+        collector.close()
@@ -0,0 +1,59 @@
+"""
+test_log_rotation.py
+
+Unit tests for compressed, size-budgeted log rotation and the log reader.
+"""
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from log_reader import iter_records
+from log_rotation import rotated_segments
+from logger import Logger
+
+
+def test_rotated_segments_are_compressed_and_read_back_in_order():
+    """
+    Verify rotated segments are gzipped and the reader streams every record oldest first.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "agent.log")
+        logger = Logger(log_path, device_id="dev", max_bytes=2000, compress=True,
+                        total_bytes=10_000_000)
+        for i in range(200):
+            logger.log({"message": "sample", "seq": i, "level": "WARN" if i % 50 == 0 else "INFO"})
+        logger.close()
+
+        segments = rotated_segments(log_path)
+        assert len(segments) > 3
+        assert all(path.endswith(".gz") for path in segments)
+        with gzip.open(segments[0], "rt", encoding="utf-8") as f:
+            assert json.loads(f.readline())["seq"] == 0
+
+        assert [r["seq"] for r in iter_records(log_path)] == list(range(200))
+        assert [r["seq"] for r in iter_records(log_path, level="WARN")] == [0, 50, 100, 150]
+
+
+def test_oldest_segments_deleted_beyond_total_budget():
+    """
+    Verify the live log plus compressed segments stay within total_bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "agent.log")
+        logger = Logger(log_path, device_id="dev", max_bytes=1000, compress=True, total_bytes=3000)
+        for i in range(500):
+            logger.log({"message": "sample", "seq": i})
+        logger.close()
+
+        segments = rotated_segments(log_path)
+        used = os.path.getsize(log_path) + sum(os.path.getsize(p) for p in segments)
+        assert used <= 3000
+        seqs = [r["seq"] for r in iter_records(log_path)]
+        assert seqs[-1] == 499 and seqs[0] > 0
+        assert seqs == list(range(seqs[0], 500))
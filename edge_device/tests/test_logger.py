@@ -8,6 +8,8 @@ import sys
 import os
 import json
 import tempfile
+import time
+from unittest.mock import patch
 from logger import Logger  # pylint: disable=import-error
 
 # Ensure the parent directory is on sys.path so we can import logger.py
@@ -34,4 +36,67 @@ def test_logger_writes_json_entry():
             assert log_data["level"] == "INFO"
             assert "timestamp" in log_data
     finally:
-        os.remove(log_path)
\ No newline at end of file
+        os.remove(log_path)
+
+def test_queued_logger_batches_entries_off_thread():
+    """
+    Verify that queued mode writes every entry through the writer thread in batches.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "agent.log")
+        logger = Logger(log_path, device_id="test-device", queued=True, flush_interval=0.05)
+        for i in range(100):
+            logger.log({"message": "sample", "seq": i})
+        logger.close()
+
+        with open(log_path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        assert [e["seq"] for e in entries] == list(range(100))
+        assert logger.stats["written"] == 100
+        assert logger.stats["batches"] < 100
+
+
+def test_queued_logger_drops_and_reports_when_full():
+    """
+    Verify that a full queue drops new entries, counts them, and notes the drop in the log.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "agent.log")
+        # Keep the writer thread idle so the queue fills up.
+        with patch.object(Logger, "_run", lambda self: None):
+            logger = Logger(log_path, queued=True, queue_size=3)
+        for i in range(5):
+            logger.log(f"entry {i}")
+        logger.close()
+
+        with open(log_path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        assert logger.stats["dropped"] == 2
+        assert [e["message"] for e in entries[:3]] == ["entry 0", "entry 1", "entry 2"]
+        assert entries[-1]["level"] == "WARN" and "dropped 2" in entries[-1]["message"]
+
+
+def test_queued_logger_survives_unserializable_entry():
+    """
+    Verify that an entry json cannot encode is counted as failed without
+    stopping the writer thread or losing the entries around it.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "agent.log")
+        logger = Logger(log_path, queued=True, flush_interval=0.05)
+        logger.log({"message": "before"})
+        logger.log({"message": "bad", "value": object()})
+        deadline = time.monotonic() + 5
+        while logger.stats["failed"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        logger.log("after")
+        while logger.stats["written"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert logger._thread.is_alive()  # pylint: disable=protected-access
+        logger.close()
+
+        with open(log_path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        assert [e["message"] for e in entries] == ["before", "after"]
+        assert logger.stats["failed"] == 1
+        assert logger.stats["written"] == 2
@@ -7,11 +7,17 @@ are collected as expected when the corresponding capability is present.
 
 import sys
 import os
+import time
 
 # Ensure import from project root
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from metrics import MetricCollector
+from collections import namedtuple
+from unittest.mock import patch
+
+import psutil
+
+from metrics import CpuSampler, MetricCollector
 from system_check import SystemCapabilities 
 
 capabilities = SystemCapabilities().detect()
@@ -50,4 +56,66 @@ def test_collect_disk_metrics():
     metrics = collector.collect()
     assert "disk_total" in metrics
     assert "disk_used" in metrics
-    assert "disk_percent" in metrics
\ No newline at end of file
+    assert "disk_percent" in metrics
+
+
+def test_delta_cpu_sampling_does_not_block():
+    """
+    Verify that delta CPU sampling returns immediately with a per-core list
+    matching the core count and values within 0-100 on consecutive calls.
+    """
+    collector = MetricCollector(["cpu"], capabilities, cpu_sampling="delta")
+    collector.collect()
+    start = time.monotonic()
+    metrics = collector.collect()
+    assert time.monotonic() - start < 0.25
+    assert len(metrics["cpu_per_core"]) == len(psutil.cpu_times(percpu=True))
+    assert 0.0 <= metrics["cpu_total"] <= 100.0
+    assert all(0.0 <= core <= 100.0 for core in metrics["cpu_per_core"])
+
+
+def test_cpu_sampler_uses_time_deltas():
+    """
+    Verify CpuSampler computes utilisation from the change in busy and idle time.
+    """
+    times = namedtuple("scputimes", "user system idle")
+    readings = iter([
+        [times(10.0, 0.0, 90.0), times(0.0, 0.0, 100.0)],
+        [times(40.0, 10.0, 150.0), times(0.0, 0.0, 200.0)],
+    ])
+    sampler = CpuSampler()
+    with patch("metrics.psutil.cpu_times", side_effect=lambda percpu: next(readings)):
+        assert sampler.sample() == (5.0, [10.0, 0.0])
+        # Core 0: 40 busy of 100; core 1 idle -> 40 of 200 overall.
+        assert sampler.sample() == (20.0, [40.0, 0.0])
+
+
+def test_due_only_collection_reuses_cached_values():
+    """
+    Verify that collect(due_only=True) only re-runs plugins whose interval has
+    elapsed and merges the cached values of the others into the sample.
+    """
+    collector = MetricCollector(
+        ["cpu", "disk"], capabilities,
+        schedule={"cpu": {"interval": 0}, "disk": {"interval": 3600}}
+    )
+    first = collector.collect(due_only=True)
+    with patch("metrics.psutil.disk_usage") as mock_disk:
+        second = collector.collect(due_only=True)
+    mock_disk.assert_not_called()
+    assert second["disk_total"] == first["disk_total"]
+    assert collector.state["cpu"]["runs"] == 2
+    assert collector.state["disk"]["runs"] == 1
+    assert collector.tick_interval() == 0
+
+
+def test_collector_over_budget_backs_off():
+    """
+    Verify that a plugin exceeding its cost budget has its next run pushed out.
+    """
+    collector = MetricCollector(["memory"], capabilities, schedule={"memory": {"budget_ms": -1}})
+    collector.collect(due_only=True)
+    state = collector.state["memory"]
+    assert state["over_budget"] == 1
+    assert state["backoff"] == 2
+    assert state["next_due"] - time.monotonic() > collector.base_interval
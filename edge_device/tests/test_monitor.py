@@ -47,4 +47,81 @@ def test_collect_and_log(
     agent._collect_and_log() 
 
     mock_post.assert_called_once()
-    assert mock_logger().log.call_count >= 1
\ No newline at end of file
+    assert mock_logger().log.call_count >= 1
+
+@patch("monitor.MetricCollector")
+@patch("monitor.requests.post")
+@patch("monitor.Logger")
+@patch("monitor.get_mac_based_device_id", return_value="mock-device")
+@patch(
+    "system_check.SystemCapabilities.detect",
+    return_value={"cpu": True, "memory": True, "disk": True}
+)
+@patch("monitor.load_config")
+def test_collect_and_log_queues_for_background_sender(
+    mock_config,
+    _mock_detect,
+    _mock_id,
+    _mock_logger,
+    mock_post,
+    mock_collector,
+):
+    """Test that with the background sender enabled, collection only queues the sample."""
+    mock_config.return_value = {
+        "metrics_to_collect": ["cpu"],
+        "metrics_interval": 1,
+        "cloud_endpoint": "http://mock/metrics",
+        "sender": {"enabled": True},
+    }
+    mock_collector().collect.return_value = {"cpu_total": 5, "cpu_per_core": [5]}
+
+    agent = MonitoringAgent()
+    agent._collect_and_log()
+
+    mock_post.assert_not_called()
+    assert agent.sender.depth() == 1
+    assert agent.settings["batch_endpoint"] == "http://mock/metrics/batch"
+
+    mock_post.return_value.status_code = 200
+    assert agent._push_batch(agent.sender._take_batch()) == []
+    assert mock_post.call_args.args[0] == "http://mock/metrics/batch"
+
+@patch("monitor.MetricCollector")
+@patch("monitor.requests.post")
+@patch("monitor.Logger")
+@patch("monitor.get_mac_based_device_id", return_value="mock-device")
+@patch(
+    "system_check.SystemCapabilities.detect",
+    return_value={"cpu": True, "memory": True, "disk": True}
+)
+@patch("monitor.load_config")
+def test_push_batch_reregisters_unknown_session(
+    mock_config,
+    _mock_detect,
+    _mock_id,
+    _mock_logger,
+    mock_post,
+    _mock_collector,
+):
+    """Test that a 409 for an unknown session re-registers and returns the batch for retry."""
+    mock_config.return_value = {
+        "metrics_to_collect": ["cpu"],
+        "metrics_interval": 1,
+        "cloud_endpoint": "http://mock/metrics",
+        "sender": {"enabled": True},
+        "session": {"enabled": True},
+    }
+    mock_post.return_value.json.return_value = {"session_id": "s1"}
+    agent = MonitoringAgent()
+    assert agent.settings["session_endpoint"] == "http://mock/sessions"
+    batch = [agent._build_payload({"cpu_total": 5, "hostname": "h"})]
+
+    mock_post.return_value.status_code = 409
+    assert agent._push_batch(batch) == batch
+    sent = mock_post.call_args.kwargs["json"]
+    assert sent == [{"timestamp": batch[0]["timestamp"], "cpu_total": 5, "session_id": "s1"}]
+    assert agent.session.session_id is None
+
+    mock_post.return_value.status_code = 200
+    assert agent._push_batch(batch) == []
+    assert mock_post.call_args_list[-2].args[0] == "http://mock/sessions"
@@ -0,0 +1,47 @@
+"""
+test_payload_codec.py
+
+Unit tests for encode_payload to verify body encoding, compression and headers.
+"""
+
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from payload_codec import encode_payload, msgpack  # pylint: disable=wrong-import-position
+
+PAYLOAD = {"device_id": "edge-1", "cpu_total": 12.5, "cpu_per_core": [10.0, 15.0]}
+
+
+def test_json_gzip_round_trip():
+    """
+    Verify that gzip-compressed JSON decodes back to the original payload
+    and carries the matching Content-Type and Content-Encoding headers.
+    """
+    body, headers = encode_payload(PAYLOAD, "json", "gzip")
+    assert headers == {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(body)) == PAYLOAD
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack not installed")
+def test_msgpack_round_trip():
+    """
+    Verify that MessagePack bodies decode back to the original payload.
+    """
+    body, headers = encode_payload(PAYLOAD, "msgpack")
+    assert headers == {"Content-Type": "application/msgpack"}
+    assert msgpack.unpackb(body, raw=False) == PAYLOAD
+
+
+def test_unknown_encoding_rejected():
+    """
+    Verify that an unknown encoding raises ValueError so the agent can fall back to JSON.
+    """
+    with pytest.raises(ValueError):
+        encode_payload(PAYLOAD, "xml")
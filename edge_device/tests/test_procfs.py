@@ -0,0 +1,89 @@
+"""
+test_procfs.py
+
+Unit tests for the /proc fast-path reader and the psutil fallback.
+"""
+
+import os
+import sys
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import psutil
+import pytest
+
+from metrics import MemoryCollector, MetricCollector
+from procfs import ProcfsReader
+
+STAT = (
+    "cpu  30 0 10 160 0 0 0 0 5 0\n"
+    "cpu0 20 0 5 75 0 0 0 0 5 0\n"
+    "cpu1 10 0 5 85 0 0 0 0 0 0\n"
+    "intr 12345\n"
+)
+MEMINFO = (
+    "MemTotal:        1000 kB\n"
+    "MemFree:          200 kB\n"
+    "MemAvailable:     600 kB\n"
+    "Buffers:           50 kB\n"
+    "Cached:           100 kB\n"
+)
+
+
+@pytest.fixture(name="fake_root")
+def fixture_fake_root(tmp_path):
+    """A fake /proc and /sys/class/thermal tree."""
+    proc = tmp_path / "proc"
+    proc.mkdir()
+    (proc / "stat").write_text(STAT)
+    (proc / "meminfo").write_text(MEMINFO)
+    zone = tmp_path / "thermal" / "thermal_zone0"
+    zone.mkdir(parents=True)
+    (zone / "type").write_text("cpu-thermal\n")
+    (zone / "temp").write_text("47500\n")
+    return tmp_path
+
+
+def test_reads_cpu_memory_and_thermal(fake_root):
+    """
+    Verify parsing of /proc/stat, /proc/meminfo and thermal zones, and that
+    kept-open files are re-read with fresh contents.
+    """
+    reader = ProcfsReader(str(fake_root / "proc"), str(fake_root / "thermal"))
+    assert reader.cpu_times() == [(100.0, 75.0), (100.0, 85.0)]
+    assert reader.memory() == {
+        "memory_percent": 40.0, "memory_used": 400 * 1024, "memory_total": 1000 * 1024,
+    }
+    assert reader.temperatures() == {"cpu-thermal": [47.5]}
+
+    (fake_root / "thermal" / "thermal_zone0" / "temp").write_text("51000\n")
+    assert reader.temperatures() == {"cpu-thermal": [51.0]}
+    reader.close()
+
+
+def test_disk_matches_psutil():
+    """
+    Verify statvfs-based disk usage agrees with psutil.disk_usage().
+    """
+    usage = psutil.disk_usage("/")
+    fast = ProcfsReader.disk("/")
+    assert fast["disk_total"] == usage.total
+    assert abs(fast["disk_percent"] - usage.percent) < 1.0
+
+
+def test_collector_falls_back_to_psutil(tmp_path):
+    """
+    Verify a failing fast-path read switches the collector to psutil for good.
+    """
+    plugin = MemoryCollector(procfs=ProcfsReader(str(tmp_path)))
+    metrics = plugin.collect()
+    assert plugin.procfs is None
+    assert metrics["memory_total"] == psutil.virtual_memory().total
+
+
+def test_psutil_source_disables_fast_path():
+    """
+    Verify metric_source 'psutil' never creates a procfs reader.
+    """
+    assert MetricCollector(["cpu"], {"cpu": True}, source="psutil").procfs is None
@@ -0,0 +1,78 @@
+"""
+test_scheduler.py
+
+Unit tests for TickScheduler deadline alignment, drift and missed-tick accounting.
+"""
+
+import os
+import sys
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scheduler import TickScheduler
+
+
+class FakeClock:
+    """Monotonic and wall clocks that only advance when slept or told to."""
+
+    def __init__(self, wall=1000.3):
+        self.mono = 50.0
+        self.wall_offset = wall - self.mono
+
+    def monotonic(self):
+        return self.mono
+
+    def wall(self):
+        return self.mono + self.wall_offset
+
+    def sleep(self, seconds):
+        self.mono += seconds
+
+
+def make_scheduler(clock, interval=10, **kwargs):
+    return TickScheduler(
+        interval, clock=clock.monotonic, wall_clock=clock.wall, sleep=clock.sleep, **kwargs
+    )
+
+
+def test_ticks_align_to_wall_clock_and_do_not_drift():
+    """
+    Verify ticks land on wall-clock multiples of the interval even when work takes time.
+    """
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    for _ in range(5):
+        scheduler.wait()
+        assert round(clock.wall(), 6) % 10 == 0
+        clock.mono += 3.7  # simulated collection + push time
+    assert scheduler.stats["ticks"] == 5
+    assert scheduler.stats["late"] == 0
+    assert scheduler.stats["missed"] == 0
+
+
+def test_overrun_counts_missed_ticks_and_skips_them():
+    """
+    Verify that an overrunning cycle skips passed deadlines instead of bursting:
+    the most recent deadline fires (late) and the schedule stays on the grid.
+    """
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    first = scheduler.wait()
+    clock.mono += 25.0
+    second = scheduler.wait()
+    assert second - first == 20.0
+    assert scheduler.stats["missed"] == 1
+    assert scheduler.stats["late"] == 1
+    assert scheduler.wait() - first == 30.0
+    assert scheduler.stats["late"] == 1
+
+
+def test_jitter_offset_is_stable_per_device():
+    """
+    Verify the per-device offset is deterministic and within the jitter bound.
+    """
+    first = TickScheduler(10, jitter=4, key="device-a").offset
+    assert first == TickScheduler(10, jitter=4, key="device-a").offset
+    assert 0 <= first < 4
+    assert first != TickScheduler(10, jitter=4, key="device-b").offset
@@ -0,0 +1,104 @@
+"""
+test_sender.py
+
+Unit tests for BackgroundSender batching, bounded queueing and retry behaviour.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sender import BackgroundSender, RetryableError
+
+
+def test_batches_and_retries_until_accepted():
+    """
+    Verify queued payloads are pushed as one batch and retried after a transient failure.
+    """
+    calls = []
+    done = threading.Event()
+
+    def send_batch(batch):
+        calls.append(list(batch))
+        if len(calls) == 1:
+            raise RetryableError("connection refused")
+        done.set()
+        return []
+
+    sender = BackgroundSender(send_batch, batch_size=10, base_delay=0.01, max_delay=0.01)
+    for i in range(3):
+        sender.submit({"seq": i})
+    sender.start()
+    assert done.wait(2)
+    sender.stop()
+
+    assert calls[0] == calls[1] == [{"seq": 0}, {"seq": 1}, {"seq": 2}]
+    assert sender.stats["retries"] == 1
+    assert sender.stats["sent"] == 3
+
+
+def test_outage_spills_queue_to_overflow_after_first_retry():
+    """
+    Verify a batch failing its first retry is spooled with everything queued, and that
+    later failures spool after one attempt until a push succeeds.
+    """
+    attempts = []
+    spooled = []
+    outage = [True]
+
+    def send_batch(batch):
+        attempts.append(list(batch))
+        if outage[0]:
+            raise RetryableError("connection refused")
+        return []
+
+    sender = BackgroundSender(send_batch, batch_size=2, base_delay=0.01, max_delay=0.01,
+                              overflow=spooled.extend)
+    for i in range(3):
+        sender.submit({"seq": i})
+    sender.start()
+    deadline = time.monotonic() + 2
+    while len(spooled) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [p["seq"] for p in spooled] == [0, 1, 2]
+    assert len(attempts) == 2
+
+    sender.submit({"seq": 3})
+    while len(spooled) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spooled[-1] == {"seq": 3}
+    assert len(attempts) == 3
+
+    outage[0] = False
+    sender.submit({"seq": 4})
+    while sender.stats["sent"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sender.stop()
+    assert sender.stats["sent"] == 1
+    assert sender.stats["spills"] == 2
+    assert not sender._spilling
+
+
+def test_queue_drops_oldest_when_full():
+    """
+    Verify that a full queue keeps the most recent payloads.
+    """
+    sender = BackgroundSender(lambda batch: [], queue_size=2)
+    sender.submit({"seq": 0})
+    sender.submit({"seq": 1})
+    assert sender.submit({"seq": 2}) is False
+    assert sender.depth() == 2
+    assert sender.stats["dropped"] == 1
+    assert sender._take_batch() == [{"seq": 1}, {"seq": 2}]
+
+
+def test_backoff_delay_is_capped():
+    """
+    Verify jittered backoff never exceeds max_delay.
+    """
+    sender = BackgroundSender(lambda batch: [], base_delay=1.0, max_delay=4.0)
+    assert all(0 <= sender.backoff_delay(attempt) <= 4.0 for attempt in range(10))
@@ -0,0 +1,69 @@
+"""
+test_session.py
+
+Unit tests for SessionEncoder registration, compaction and re-registration.
+"""
+
+import os
+import sys
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from session import SessionEncoder
+
+PAYLOAD = {
+    "timestamp": "2025-06-02T00:00:00Z",
+    "device_id": "dev-1",
+    "device_type": "edge",
+    "tags": {"zone": "a"},
+    "hostname": "host",
+    "memory_total": 8192,
+    "disk_total": 65536,
+    "cpu_total": 12.5,
+    "memory_percent": 40.0,
+}
+
+
+def test_registers_once_and_strips_static_fields():
+    """
+    Verify the descriptor is registered once and later payloads carry only changing fields.
+    """
+    registered = []
+    encoder = SessionEncoder(lambda d: registered.append(d) or f"s{len(registered)}")
+
+    first = encoder.compact(PAYLOAD)
+    second = encoder.compact({**PAYLOAD, "cpu_total": 50.0})
+
+    assert registered == [{k: PAYLOAD[k] for k in (
+        "device_id", "hostname", "device_type", "tags", "memory_total", "disk_total"
+    )}]
+    assert first == {"timestamp": PAYLOAD["timestamp"], "cpu_total": 12.5,
+                     "memory_percent": 40.0, "session_id": "s1"}
+    assert second["cpu_total"] == 50.0 and second["session_id"] == "s1"
+
+
+def test_reregisters_after_invalidate_or_descriptor_change():
+    """
+    Verify a new session is registered when the server forgets it or the static fields change.
+    """
+    registered = []
+    encoder = SessionEncoder(lambda d: registered.append(d) or f"s{len(registered)}")
+    encoder.compact(PAYLOAD)
+
+    encoder.invalidate()
+    assert encoder.compact(PAYLOAD)["session_id"] == "s2"
+    assert encoder.compact({**PAYLOAD, "disk_total": 131072})["session_id"] == "s3"
+    assert encoder.stats["registrations"] == 3
+
+
+def test_sends_full_payload_while_registration_fails():
+    """
+    Verify payloads go out unchanged when the session endpoint is unavailable.
+    """
+    def register(_descriptor):
+        raise ConnectionError("refused")
+
+    encoder = SessionEncoder(register)
+    assert encoder.compact(PAYLOAD) == PAYLOAD
+    assert encoder.stats["full"] == 1
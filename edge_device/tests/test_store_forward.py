@@ -0,0 +1,134 @@
+"""
+test_store_forward.py
+
+Unit tests for the store-and-forward spool and its backfill loop.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from store_forward import Backfiller, StoreForwardSpool
+
+
+def test_spool_round_trip_survives_restart(tmp_path):
+    """
+    Verify payloads are read back in order, and the checkpoint persists across reopen.
+    """
+    spool = StoreForwardSpool(str(tmp_path))
+    spool.append([{"seq": i} for i in range(5)])
+    records, position = spool.read_batch(3)
+    assert [r["seq"] for r in records] == [0, 1, 2]
+    spool.commit(position)
+    spool.close()
+
+    reopened = StoreForwardSpool(str(tmp_path))
+    records, position = reopened.read_batch(10)
+    assert [r["seq"] for r in records] == [3, 4]
+    reopened.commit(position)
+    assert not reopened.has_pending()
+
+
+def test_spool_full_drain_starts_a_fresh_segment(tmp_path):
+    """
+    Verify a full drain moves the checkpoint to a new segment, so appends made
+    after it are read back after a restart.
+    """
+    spool = StoreForwardSpool(str(tmp_path))
+    spool.append([{"seq": 0}, {"seq": 1}])
+    _, position = spool.read_batch(10)
+    spool.commit(position)
+    assert spool.checkpoint == (position[0] + 1, 0)
+    assert spool.pending_bytes() == 0
+    spool.append([{"seq": 2}])
+    spool.close()
+
+    reopened = StoreForwardSpool(str(tmp_path))
+    records, _ = reopened.read_batch(10)
+    assert [r["seq"] for r in records] == [2]
+
+
+def test_spool_evicts_oldest_when_over_byte_cap(tmp_path):
+    """
+    Verify the byte cap is kept by evicting the oldest segments.
+    """
+    spool = StoreForwardSpool(str(tmp_path), max_bytes=400, segment_bytes=100)
+    for i in range(40):
+        spool.append([{"seq": i}])
+    assert spool.pending_bytes() <= 400
+    assert spool.stats["evicted_segments"] > 0
+    records, _ = spool.read_batch(100)
+    assert records[-1]["seq"] == 39
+    assert records[0]["seq"] > 0
+
+
+def test_spool_evicts_expired_segments(tmp_path):
+    """
+    Verify segments older than max_age are dropped.
+    """
+    now = [time.time()]
+    spool = StoreForwardSpool(str(tmp_path), max_age=60, clock=lambda: now[0])
+    spool.append([{"seq": 0}])
+    now[0] += 120
+    records, _ = spool.read_batch(10)
+    assert records == []
+    assert spool.stats["evicted_segments"] == 1
+    assert not spool.has_pending()
+
+
+def test_backfiller_commits_only_delivered_batches(tmp_path):
+    """
+    Verify a failed push leaves the backlog in place and a later push drains it.
+    """
+    spool = StoreForwardSpool(str(tmp_path))
+    spool.append([{"seq": i} for i in range(3)])
+    outcomes = [None, []]
+    pushed = []
+
+    def push(batch):
+        pushed.append(batch)
+        return outcomes.pop(0)
+
+    backfiller = Backfiller(spool, push, batch_size=10)
+    assert backfiller.drain_once() == -1
+    assert spool.has_pending()
+    assert backfiller.drain_once() == 3
+    assert not spool.has_pending()
+    assert pushed[0] == pushed[1]
+
+    paused = Backfiller(spool, push, live_idle=lambda: False)
+    spool.append([{"seq": 3}])
+    assert paused.drain_once() == 0
+
+
+def test_backfiller_keeps_only_unaccepted_items(tmp_path):
+    """
+    Verify that after a partly accepted push only the refused items stay in the spool.
+    """
+    spool = StoreForwardSpool(str(tmp_path))
+    spool.append([{"seq": i} for i in range(3)])
+    backfiller = Backfiller(spool, lambda batch: [batch[1]], batch_size=10)
+    assert backfiller.drain_once() == 2
+    records, _ = spool.read_batch(10)
+    assert records == [{"seq": 1}]
+
+    backfiller.push_batch = lambda batch: list(batch)
+    assert backfiller.drain_once() == -1
+    assert spool.read_batch(10)[0] == [{"seq": 1}]
+
+
+def test_segment_log_matches_the_server_copy():
+    """
+    Verify segment_log.py is byte-identical to the server bundle's copy.
+    """
+    here = os.path.join(os.path.dirname(__file__), "..")
+    server_copy = os.path.join(here, "..", "api_server", "segment_log.py")
+    if not os.path.exists(server_copy):
+        pytest.skip("api_server bundle not present")
+    with open(os.path.join(here, "segment_log.py"), "rb") as ours, open(server_copy, "rb") as theirs:
+        assert ours.read() == theirs.read()
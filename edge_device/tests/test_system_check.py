@@ -0,0 +1,86 @@
+"""
+test_system_check.py
+
+Unit tests for concurrent, cached capability detection.
+"""
+
+import json
+import os
+import sys
+import time
+from unittest.mock import patch
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from metrics import MetricCollector
+from system_check import SystemCapabilities
+
+
+def test_detect_reuses_cache_for_same_boot(tmp_path):
+    """
+    Verify a second detector on the same kernel/boot reads the cache instead of probing.
+    """
+    cache = str(tmp_path / "capabilities.json")
+    first = SystemCapabilities(cache_path=cache)
+    detected = dict(first.detect())
+    assert not first.from_cache
+
+    second = SystemCapabilities(cache_path=cache)
+    with patch.object(SystemCapabilities, "reprobe") as mock_reprobe:
+        assert second.detect() == detected
+    mock_reprobe.assert_not_called()
+    assert second.from_cache
+
+
+def test_cache_ignored_after_reboot_or_expiry(tmp_path):
+    """
+    Verify the cache is not used when the boot ID differs or the TTL has passed.
+    """
+    cache = tmp_path / "capabilities.json"
+    key = SystemCapabilities.cache_key()
+    entry = {"key": dict(key, boot_id="other-boot"), "detected_at": time.time(),
+             "capabilities": {"gpu": True}}
+    cache.write_text(json.dumps(entry))
+    assert SystemCapabilities(cache_path=str(cache))._load_cache() is None
+
+    entry.update(key=key, detected_at=time.time() - 100)
+    cache.write_text(json.dumps(entry))
+    assert SystemCapabilities(cache_path=str(cache), ttl=10)._load_cache() is None
+    assert SystemCapabilities(cache_path=str(cache), ttl=1000)._load_cache() == {"gpu": True}
+
+
+def test_hung_probe_times_out():
+    """
+    Verify a probe that does not finish in time is reported unsupported without blocking.
+    """
+    detector = SystemCapabilities(probe_timeout=0.2)
+    detector.probes["battery"] = lambda: time.sleep(2) or True
+    start = time.monotonic()
+    capabilities = detector.reprobe()
+    assert time.monotonic() - start < 1.0
+    assert capabilities["battery"] is False
+    assert capabilities["cpu"] is True
+
+
+def test_collector_failure_triggers_callback():
+    """
+    Verify a failing plugin reports through on_failure and can be disabled.
+    """
+    failures = []
+
+    def broken():
+        raise OSError("gone")
+
+    def on_failure(name, err):
+        failures.append((name, str(err)))
+        collector.disable(name)
+
+    collector = MetricCollector(["memory", "disk"], {"memory": True, "disk": True},
+                                on_failure=on_failure)
+    collector.plugins["memory"].collect = broken
+    metrics = collector.collect()
+    assert failures == [("memory", "gone")]
+    assert "memory_total" not in metrics
+    assert "disk_total" in metrics
+    assert "memory" not in collector.plugins
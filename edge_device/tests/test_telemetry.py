@@ -0,0 +1,32 @@
+"""
+test_telemetry.py
+
+Unit tests for the agent self-telemetry fields.
+"""
+
+import os
+import sys
+
+# Ensure import from project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from metrics import MetricCollector
+from telemetry import AgentTelemetry
+
+
+def test_fields_report_collectors_push_and_process_usage():
+    """
+    Verify the agent dict carries per-collector times, cycle costs, push latency and RSS/CPU.
+    """
+    collector = MetricCollector(["memory"], {"memory": True}, source="psutil")
+    collector.collect()
+    telemetry = AgentTelemetry()
+
+    agent = telemetry.fields(collector.timings(), collect_ms=1.234, log_ms=0.5)
+    assert agent["collector_memory_ms"] >= 0
+    assert agent["collect_ms"] == 1.23 and agent["log_ms"] == 0.5
+    assert "push_ms" not in agent
+    assert agent["rss_bytes"] > 0 and agent["cpu_percent"] >= 0
+
+    telemetry.record_push(12.345)
+    assert telemetry.fields({}, 0, 0)["push_ms"] == 12.35